@@ -0,0 +1,173 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+from dotenv import load_dotenv
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from app.models.user import User
+from app.models.user_profile import UserProfile
+
+load_dotenv()
+
+# Configuration; a TTL of 0 disables the cache
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+
+USER_COLUMNS = tuple(attr.key for attr in inspect(User).column_attrs)
+PROFILE_COLUMNS = tuple(attr.key for attr in inspect(UserProfile).column_attrs)
+
+Snapshot = Dict[str, Any]
+
+
+class PrincipalCache:
+    """
+    TTL/LRU cache of authenticated users, keyed by token subject
+
+    Holds a column snapshot of the user and their profile so that
+    authenticated requests skip the users lookup. ``get`` rebuilds a
+    detached User from the snapshot, which callers attach to their session
+    with ``merge(load=False)``; that issues no SQL and leaves the user and
+    profile updatable as usual. Entries are dropped when a User or
+    UserProfile is written through any session in this process. Other
+    worker processes only see the change once their entry expires, so the
+    TTL bounds how long a deactivated user or old profile can be served.
+    """
+
+    def __init__(self, max_entries: int = PRINCIPAL_CACHE_SIZE, ttl: float = PRINCIPAL_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[Snapshot, float]]" = OrderedDict()
+        # Subject cached for each user id, used for invalidation
+        self._user_keys: Dict[int, str] = {}
+        # Commits may run in the threadpool in DB_MODE=sync
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # Bumped on every invalidation so a lookup that raced a write is not cached
+        self.generation = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, subject: str) -> Optional[User]:
+        """Return a detached copy of the cached user, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    self._drop(subject)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(subject)
+            self.hits += 1
+        return self._restore(entry[0])
+
+    def set(self, subject: str, user: User, generation: Optional[int] = None) -> None:
+        """
+        Cache a user loaded with their profile
+
+        Pass the ``generation`` read before loading the user; if anything was
+        invalidated since, the row may predate that write and is not cached.
+        """
+        if not self.enabled:
+            return
+        snapshot = {
+            "user": {key: getattr(user, key) for key in USER_COLUMNS},
+            "profile": (
+                {key: getattr(user.profile, key) for key in PROFILE_COLUMNS}
+                if user.profile is not None else None
+            ),
+        }
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[subject] = (snapshot, time.monotonic() + self.ttl)
+            self._entries.move_to_end(subject)
+            self._user_keys[user.id] = subject
+            while len(self._entries) > self.max_entries:
+                evicted, (evicted_snapshot, _) = self._entries.popitem(last=False)
+                self._forget(evicted, evicted_snapshot["user"]["id"])
+                self.evictions += 1
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Drop the entry for a user, e.g. after their account or profile changed"""
+        with self._lock:
+            self.generation += 1
+            subject = self._user_keys.get(user_id)
+            if subject is not None:
+                self._drop(subject)
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._user_keys.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    def _drop(self, subject: str) -> None:
+        entry = self._entries.pop(subject, None)
+        if entry is not None:
+            self._forget(subject, entry[0]["user"]["id"])
+
+    def _forget(self, subject: str, user_id: int) -> None:
+        if self._user_keys.get(user_id) == subject:
+            del self._user_keys[user_id]
+
+    @staticmethod
+    def _restore(snapshot: Snapshot) -> User:
+        user = User(**snapshot["user"])
+        profile = UserProfile(**snapshot["profile"]) if snapshot["profile"] is not None else None
+        user.profile = profile
+        # Mark everything as loaded and unchanged, as if it had just been queried
+        make_transient_to_detached(user)
+        if profile is not None:
+            make_transient_to_detached(profile)
+        return user
+
+
+# Create a singleton instance
+principal_cache = PrincipalCache()
+
+
+def _changed_user_ids(session: Session) -> Set[int]:
+    user_ids = set()
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, User) and instance.id is not None:
+            user_ids.add(instance.id)
+        elif isinstance(instance, UserProfile) and instance.user_id is not None:
+            user_ids.add(instance.user_id)
+    return user_ids
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_changed_users(session, flush_context, instances):
+    if principal_cache.enabled:
+        session.info.setdefault("changed_user_ids", set()).update(_changed_user_ids(session))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session):
+    # After commit, so a concurrent request cannot re-cache the old row in between
+    for user_id in session.info.pop("changed_user_ids", ()):
+        principal_cache.invalidate_user(user_id)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_changed_users(session, previous_transaction):
+    session.info.pop("changed_user_ids", None)
@@ -0,0 +1,141 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Set
+from dotenv import load_dotenv
+from sqlalchemy import or_, select
+from starlette.concurrency import run_in_threadpool
+
+from app.database import SessionLocal
+from app.logger import get_logger
+from app.models.user import User
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+# Configuration
+# How often the map is reloaded, i.e. how long a revocation made by another worker takes to apply here
+TOKEN_VERSION_REFRESH_SECONDS = float(os.getenv("TOKEN_VERSION_REFRESH_SECONDS", "30"))
+# Past this age (e.g. the database has been unreachable) tokens are checked against the database again
+TOKEN_VERSION_MAX_STALENESS = float(
+    os.getenv("TOKEN_VERSION_MAX_STALENESS", str(TOKEN_VERSION_REFRESH_SECONDS * 4))
+)
+
+
+class TokenVersionMap:
+    """
+    In-memory revocation list for claims-only token verification
+
+    Tokens carry the user's ``token_version`` and ``is_active`` flag as of
+    issue time. Most users never have a token revoked, so the map only
+    holds the exceptions: users whose version is above 0 and users who are
+    inactive. It is reloaded from the database every ``refresh_seconds``;
+    revocations made in this process are applied immediately via
+    ``record``. Until the first load succeeds, or when the last one is
+    older than ``max_staleness``, ``fresh`` is False and callers should
+    verify against the database instead.
+    """
+
+    def __init__(
+        self,
+        refresh_seconds: float = TOKEN_VERSION_REFRESH_SECONDS,
+        max_staleness: float = TOKEN_VERSION_MAX_STALENESS
+    ):
+        self.refresh_seconds = refresh_seconds
+        self.max_staleness = max_staleness
+        self._versions: Dict[int, int] = {}
+        self._inactive: Set[int] = set()
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.loaded_at: Optional[float] = None
+        self.loads = 0
+        self.load_errors = 0
+        self.rejected = 0
+
+    @property
+    def fresh(self) -> bool:
+        return self.loaded_at is not None and time.monotonic() - self.loaded_at < self.max_staleness
+
+    def load(self) -> None:
+        """Reload versions and inactive users from the database (blocking)"""
+        with SessionLocal() as db:
+            rows = db.execute(
+                select(User.id, User.token_version, User.is_active)
+                .where(or_(User.token_version > 0, User.is_active.is_(False)))
+            ).all()
+        versions = {user_id: version for user_id, version, _ in rows if version > 0}
+        inactive = {user_id for user_id, _, is_active in rows if is_active is False}
+        with self._lock:
+            # Versions only go up; keep anything recorded here while the query ran
+            for user_id, version in self._versions.items():
+                if version > versions.get(user_id, 0):
+                    versions[user_id] = version
+            self._versions = versions
+            self._inactive = inactive
+            self.loaded_at = time.monotonic()
+            self.loads += 1
+
+    def is_current(self, user_id: int, version: int) -> bool:
+        """True unless the user's tokens have been revoked since ``version`` was issued"""
+        if version >= self._versions.get(user_id, 0):
+            return True
+        self.rejected += 1
+        return False
+
+    def is_active(self, user_id: int) -> bool:
+        return user_id not in self._inactive
+
+    def record(self, user_id: int, version: int, is_active: Optional[bool] = None) -> None:
+        """Apply a change made in this process without waiting for the next load"""
+        with self._lock:
+            if version > self._versions.get(user_id, 0):
+                self._versions[user_id] = version
+            if is_active is True:
+                self._inactive.discard(user_id)
+            elif is_active is False:
+                self._inactive.add(user_id)
+
+    async def start(self) -> None:
+        """Load the map, then keep reloading it in the background"""
+        await self._refresh()
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _refresh(self) -> None:
+        try:
+            await run_in_threadpool(self.load)
+        except Exception as e:
+            self.load_errors += 1
+            logger.error(f"Token version refresh failed: {str(e)}")
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            await self._refresh()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "fresh": self.fresh,
+            "age_seconds": round(time.monotonic() - self.loaded_at, 3) if self.loaded_at is not None else None,
+            "refresh_seconds": self.refresh_seconds,
+            "revoked_users": len(self._versions),
+            "inactive_users": len(self._inactive),
+            "loads": self.loads,
+            "load_errors": self.load_errors,
+            "rejected": self.rejected,
+        }
+
+
+# Create a singleton instance
+token_versions = TokenVersionMap()
@@ -1,15 +1,23 @@
+import uuid
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Dict, Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 import os
 from dotenv import load_dotenv
 
-from app.database import get_db
+from app.database import dialect_insert, get_db
+from app.models.refresh_token import UsedRefreshToken
 from app.models.user import User
+from app.logger import set_log_user
+from app.auth.principal_cache import principal_cache
+from app.auth.token_versions import token_versions
+from app.services.passwords import password_service
+from app.utils.loaders import AUTH_PROFILE_LOADER, eager_load
 
 # Load environment variables
 load_dotenv()
@@ -18,6 +26,7 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
 
 # OAuth2 setup for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/token")
@@ -26,42 +35,83 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/token")
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
 
 class TokenData(BaseModel):
     username: Optional[str] = None
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+class TokenPrincipal(BaseModel):
     """
-    Verify if the provided plain password matches the hashed password
+    The authenticated user as described by their token's claims
+
+    For routes that only need the caller's id and role flags; resolving it
+    does not touch the database.
     """
-    # Use passlib if available, otherwise use bcrypt directly
-    try:
-        from passlib.context import CryptContext
-        pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-        return pwd_context.verify(plain_password, hashed_password)
-    except Exception:
-        import bcrypt
-        if isinstance(plain_password, str):
-            plain_password = plain_password.encode('utf-8')
-        if isinstance(hashed_password, str):
-            hashed_password = hashed_password.encode('utf-8')
-        return bcrypt.checkpw(plain_password, hashed_password)
+    id: int
+    username: str
+    is_active: bool = True
+    is_superuser: bool = False
+    token_version: int = 0
+
+async def get_user(db: AsyncSession, username: str) -> Optional[User]:
+    """
+    Get a user by username from the database, with their profile loaded
+    """
+    result = await db.execute(
+        select(User).options(eager_load(User.profile, AUTH_PROFILE_LOADER)).filter(User.username == username)
+    )
+    return result.scalars().first()
 
-def get_user(db: Session, username: str) -> Optional[User]:
+async def get_principal(db: AsyncSession, username: str) -> Optional[User]:
     """
-    Get a user by username from the database
+    Get the user a token was issued to, from the principal cache when possible
+
+    A cached user is merged into ``db`` without a query, so routes can use
+    and update it (and its profile) exactly like a freshly loaded one.
     """
-    return db.query(User).filter(User.username == username).first()
+    cached = principal_cache.get(username)
+    if cached is not None:
+        return await db.merge(cached, load=False)
+    generation = principal_cache.generation
+    user = await get_user(db, username)
+    if user is not None:
+        principal_cache.set(username, user, generation)
+    return user
 
-def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
+async def authenticate_user(db: AsyncSession, username: str, password: str) -> Optional[User]:
     """
     Authenticate a user by username and password
+
+    A stored hash made with outdated bcrypt parameters is replaced with a
+    fresh one while the plain password is at hand.
     """
-    user = get_user(db, username)
-    if not user or not verify_password(password, user.hashed_password):
+    user = await get_user(db, username)
+    if not user:
+        return None
+    valid, new_hash = await password_service.verify_and_update(password, user.hashed_password)
+    if not valid:
         return None
+    if new_hash is not None:
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
+def token_claims(user: User) -> Dict[str, Any]:
+    """
+    Claims identifying a user in their tokens
+
+    ``uid``, ``su``, ``act`` and ``ver`` let requests be authorized from the
+    token alone; ``ver`` is checked against the token version map so that
+    bumping ``users.token_version`` revokes the token.
+    """
+    return {
+        "sub": user.username,
+        "uid": user.id,
+        "su": bool(user.is_superuser),
+        "act": bool(user.is_active),
+        "ver": user.token_version or 0,
+    }
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """
     Create a JWT access token
@@ -71,12 +121,91 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "typ": "access"})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
+    """
+    Create a long-lived JWT that can be exchanged once for new tokens at /auth/refresh
+    """
+    to_encode = data.copy()
+    expire = datetime.utcnow() + (expires_delta or timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
+    to_encode.update({"exp": expire, "typ": "refresh", "jti": uuid.uuid4().hex})
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+def create_tokens(user: User) -> Dict[str, str]:
+    """
+    Issue an access and refresh token pair for a user
+    """
+    claims = token_claims(user)
+    return {
+        "access_token": create_access_token(claims),
+        "refresh_token": create_refresh_token(claims),
+        "token_type": "bearer",
+    }
+
+def decode_token(token: str, token_type: str = "access") -> Dict[str, Any]:
+    """
+    Decode and validate a JWT of the given type, raising JWTError if invalid
+
+    Tokens issued before token types were added carry no ``typ`` and are
+    treated as access tokens.
+    """
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    if payload.get("typ", "access") != token_type or payload.get("sub") is None:
+        raise JWTError(f"Not a valid {token_type} token")
+    return payload
+
+async def consume_refresh_token(db: AsyncSession, payload: Dict[str, Any]) -> bool:
+    """
+    Mark a refresh token as used, returning False if it was used before
+
+    A second use means the token was copied, so every token issued to the
+    user is revoked and both holders have to log in again. Tokens without a
+    ``jti`` (issued before refresh tokens were single use) are rejected.
+    Commits the session.
+    """
+    jti = payload.get("jti")
+    if not jti:
+        return False
+    # Rows for expired tokens are no longer needed; the token itself is rejected
+    await db.execute(delete(UsedRefreshToken).where(UsedRefreshToken.expires_at < datetime.utcnow()))
+    inserted = (await db.execute(
+        dialect_insert(UsedRefreshToken.__table__)
+        .values(jti=jti, user_id=payload["uid"], expires_at=datetime.utcfromtimestamp(payload["exp"]))
+        .on_conflict_do_nothing(index_elements=["jti"])
+        .returning(UsedRefreshToken.__table__.c.jti)
+    )).first()
+    if inserted is None:
+        await db.rollback()
+        await revoke_tokens(db, payload["uid"])
+        return False
+    await db.commit()
+    return True
+
+async def revoke_tokens(db: AsyncSession, user_id: int) -> Optional[int]:
+    """
+    Revoke every token issued to a user so far, returning their new token version
+
+    Takes effect immediately in this process and within
+    TOKEN_VERSION_REFRESH_SECONDS in the others.
+    """
+    version = (await db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(token_version=User.token_version + 1)
+        .returning(User.token_version)
+    )).scalar()
+    if version is None:
+        return None
+    await db.commit()
+    token_versions.record(user_id, version)
+    principal_cache.invalidate_user(user_id)
+    return version
+
 async def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)
 ) -> User:
     """
     Get the current user from the provided JWT token
@@ -87,17 +216,18 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_data = TokenData(username=username)
+        payload = decode_token(token)
+        token_data = TokenData(username=payload["sub"])
     except JWTError:
         raise credentials_exception
     
-    user = get_user(db, username=token_data.username)
-    if user is None:
+    user = await get_principal(db, username=token_data.username)
+    version = payload.get("ver", 0)
+    if user is None or version < (user.token_version or 0) or not token_versions.is_current(user.id, version):
         raise credentials_exception
+    set_log_user(user.id)
+    # Lets the routing session keep this user's reads on the primary after they write
+    db.info["user_id"] = user.id
     return user
 
 async def get_current_active_user(
@@ -121,4 +251,70 @@ async def get_current_superuser(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
-    return current_user 
\ No newline at end of file
+    return current_user
+
+async def get_current_principal(
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)
+) -> TokenPrincipal:
+    """
+    Get the current user from the JWT claims, without loading the User row
+
+    Revocation and deactivation are checked against the token version map.
+    Tokens without a ``uid`` claim (issued before it was added), or a map
+    that has not been loaded recently, fall back to a database lookup.
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    try:
+        payload = decode_token(token)
+    except JWTError:
+        raise credentials_exception
+
+    if payload.get("uid") is not None and token_versions.fresh:
+        principal = TokenPrincipal(
+            id=payload["uid"],
+            username=payload["sub"],
+            is_active=payload.get("act", True) and token_versions.is_active(payload["uid"]),
+            is_superuser=payload.get("su", False),
+            token_version=payload.get("ver", 0),
+        )
+        if not token_versions.is_current(principal.id, principal.token_version):
+            raise credentials_exception
+    else:
+        user = await get_current_user(token, db)
+        principal = TokenPrincipal(
+            id=user.id,
+            username=user.username,
+            is_active=user.is_active,
+            is_superuser=user.is_superuser,
+            token_version=user.token_version or 0,
+        )
+    set_log_user(principal.id)
+    db.info["user_id"] = principal.id
+    return principal
+
+async def get_active_principal(
+    principal: TokenPrincipal = Depends(get_current_principal),
+) -> TokenPrincipal:
+    """
+    Get the current active user from the token claims
+    """
+    if not principal.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return principal
+
+async def get_superuser_principal(
+    principal: TokenPrincipal = Depends(get_active_principal),
+) -> TokenPrincipal:
+    """
+    Get the current superuser from the token claims - only allow superusers
+    """
+    if not principal.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    return principal
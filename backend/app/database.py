@@ -1,9 +1,20 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import HTTPConnection
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
 import os
 from dotenv import load_dotenv
 
+from app.utils.metrics import Histogram
+from app.utils.db_pool import TimedAsyncAdaptedQueuePool, TimedQueuePool
+from app.utils.db_routing import ReplicaState, RoutingSession
+
 # Load environment variables
 load_dotenv()
 
@@ -14,18 +25,319 @@ DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_PORT = os.getenv("DB_PORT", "5432")
 DB_NAME = os.getenv("DB_NAME", "mental_health_app")
 
-# Create PostgreSQL connection URL
-SQLALCHEMY_DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# "sync" (default) keeps psycopg2 and runs each request query in the threadpool; "async" opts in to AsyncSession with asyncpg
+DB_MODE = os.getenv("DB_MODE", "sync").lower()
+if DB_MODE not in ("async", "sync"):
+    raise ValueError(f"Unknown DB_MODE: {DB_MODE}")
+
+# Connection pool configuration, per engine and per worker process
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# Server-side limit for any single statement; 0 disables it
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+
+# Optional read replica; same credentials and database name as the primary
+DB_REPLICA_HOST = os.getenv("DB_REPLICA_HOST")
+DB_REPLICA_PORT = os.getenv("DB_REPLICA_PORT", DB_PORT)
+# How long a failed replica is skipped, and how long a user's reads stay on the primary after a write
+DB_REPLICA_RETRY_SECONDS = float(os.getenv("DB_REPLICA_RETRY_SECONDS", "30"))
+DB_REPLICA_STICKY_SECONDS = float(os.getenv("DB_REPLICA_STICKY_SECONDS", "5"))
+
+# A full SQLAlchemy URL overrides the DB_* settings, e.g. sqlite:///./local.db to run without a server
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+# Driver used for each supported database in sync and async mode
+SYNC_DRIVERS = {"postgresql": "postgresql+psycopg2", "sqlite": "sqlite+pysqlite"}
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+def with_driver(url: str, drivers: Dict[str, str]) -> str:
+    """Return ``url`` using the driver from ``drivers`` for its database"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in drivers:
+        raise ValueError(f"Unsupported database in DATABASE_URL: {backend}")
+    return parsed.set(drivername=drivers[backend]).render_as_string(hide_password=False)
+
+def with_host(url: str, host: str, port: str) -> str:
+    return make_url(url).set(host=host, port=int(port)).render_as_string(hide_password=False)
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# Create connection URLs
+_DATABASE_URL = DATABASE_URL or f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+SQLALCHEMY_DATABASE_URL = with_driver(_DATABASE_URL, SYNC_DRIVERS)
+SQLALCHEMY_ASYNC_DATABASE_URL = with_driver(_DATABASE_URL, ASYNC_DRIVERS)
+SQLALCHEMY_REPLICA_URL = (
+    with_host(SQLALCHEMY_DATABASE_URL, DB_REPLICA_HOST, DB_REPLICA_PORT)
+    if DB_REPLICA_HOST else None
+)
+SQLALCHEMY_ASYNC_REPLICA_URL = (
+    with_host(SQLALCHEMY_ASYNC_DATABASE_URL, DB_REPLICA_HOST, DB_REPLICA_PORT)
+    if DB_REPLICA_HOST else None
+)
+
+POOL_OPTIONS = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+    "pool_recycle": DB_POOL_RECYCLE,
+    "pool_pre_ping": DB_POOL_PRE_PING,
+}
+
+def statement_timeout_args(driver: str) -> Dict[str, Any]:
+    """connect_args that set statement_timeout on every new connection"""
+    if DB_STATEMENT_TIMEOUT_MS <= 0:
+        return {}
+    if driver == "asyncpg":
+        return {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+    return {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+
+def engine_options(url: str) -> Dict[str, Any]:
+    """
+    Pool and connection options for an engine on ``url``
+
+    The timed, sized pool and the statement timeout only apply to
+    PostgreSQL; SQLite keeps SQLAlchemy's default pool.
+    """
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "postgresql":
+        return {}
+    is_async = parsed.get_driver_name() == "asyncpg"
+    return {
+        "poolclass": TimedAsyncAdaptedQueuePool if is_async else TimedQueuePool,
+        "connect_args": statement_timeout_args(parsed.get_driver_name()),
+        **POOL_OPTIONS,
+    }
+
+# The sync engine is always available for scripts and the log writer thread
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(
+    SQLALCHEMY_ASYNC_DATABASE_URL,
+    **engine_options(SQLALCHEMY_ASYNC_DATABASE_URL)
+) if DB_MODE == "async" else None
+
+# Replica engine for the configured mode, if a replica is set up
+replica_engine = None
+if SQLALCHEMY_REPLICA_URL and DB_MODE == "async":
+    replica_engine = create_async_engine(
+        SQLALCHEMY_ASYNC_REPLICA_URL,
+        **engine_options(SQLALCHEMY_ASYNC_REPLICA_URL)
+    ).sync_engine
+elif SQLALCHEMY_REPLICA_URL:
+    replica_engine = create_engine(SQLALCHEMY_REPLICA_URL, **engine_options(SQLALCHEMY_REPLICA_URL))
+replica_state = ReplicaState(DB_REPLICA_RETRY_SECONDS, DB_REPLICA_STICKY_SECONDS)
+
+# Request sessions route between the primary and the replica
+routing_options = {
+    "primary": async_engine.sync_engine if async_engine is not None else engine,
+    "replica": replica_engine,
+    "replica_state": replica_state,
+}
+AsyncSessionLocal = (
+    async_sessionmaker(sync_session_class=RoutingSession, autoflush=False, expire_on_commit=False, **routing_options)
+    if async_engine is not None else None
+)
+RequestSessionLocal = sessionmaker(class_=RoutingSession, autoflush=False, expire_on_commit=False, **routing_options)
+
 Base = declarative_base()
 
+# Bucket bounds for connections checked out per request
+CHECKOUTS_PER_REQUEST_BUCKETS = (0, 1, 2, 3, 4, 8)
+
+# Pool counters, updated from SQLAlchemy pool events
+pool_counters: Dict[str, int] = {"connects": 0, "checkouts": 0, "checkins": 0}
+checkouts_per_request = Histogram(CHECKOUTS_PER_REQUEST_BUCKETS)
+
+class ThreadedSession:
+    """
+    AsyncSession-compatible wrapper around a synchronous Session
+
+    Used when DB_MODE=sync. Every call that talks to the database runs in
+    the threadpool, so routes written against the AsyncSession API work
+    unchanged and never block the event loop. Only the parts of the
+    AsyncSession API the application uses are provided.
+    """
+
+    # Fetch all rows inside the worker thread, as AsyncSession does
+    _execution_options = {"prebuffer_rows": True}
+
+    def __init__(self, sync_session: Session):
+        self.sync_session = sync_session
+
+    @property
+    def info(self) -> Dict[Any, Any]:
+        return self.sync_session.info
+
+    def add(self, instance) -> None:
+        self.sync_session.add(instance)
+
+    def add_all(self, instances) -> None:
+        self.sync_session.add_all(instances)
+
+    def _execute(self, statement, params=None, execution_options=None, **kwargs):
+        options = {**self._execution_options, **(execution_options or {})}
+        return self.sync_session.execute(statement, params, execution_options=options, **kwargs)
+
+    async def execute(self, statement, params=None, **kwargs):
+        return await run_in_threadpool(self._execute, statement, params, **kwargs)
+
+    async def scalar(self, statement, params=None, **kwargs):
+        return (await self.execute(statement, params, **kwargs)).scalar()
+
+    async def scalars(self, statement, params=None, **kwargs):
+        return (await self.execute(statement, params, **kwargs)).scalars()
+
+    async def get(self, entity, ident, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, entity, ident, **kwargs)
+
+    async def merge(self, instance, load: bool = True):
+        if not load:
+            # Copies state from an already loaded (e.g. cached) object; no database access
+            return self.sync_session.merge(instance, load=False)
+        return await run_in_threadpool(self.sync_session.merge, instance)
+
+    async def flush(self) -> None:
+        await run_in_threadpool(self.sync_session.flush)
+
+    async def commit(self) -> None:
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self) -> None:
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def refresh(self, instance, attribute_names=None) -> None:
+        await run_in_threadpool(self.sync_session.refresh, instance, attribute_names)
+
+    async def delete(self, instance) -> None:
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def close(self) -> None:
+        await run_in_threadpool(self.sync_session.close)
+
+def dialect_insert(table):
+    """INSERT for the configured database, with ON CONFLICT support"""
+    return postgresql.insert(table) if engine.dialect.name == "postgresql" else sqlite.insert(table)
+
+def new_session():
+    """Create a session for the configured DB_MODE"""
+    if AsyncSessionLocal is not None:
+        return AsyncSessionLocal()
+    return ThreadedSession(RequestSessionLocal())
+
+class LazySession:
+    """
+    Request-scoped session holder
+
+    Stored on the ASGI scope by DBSessionMiddleware. The session is only
+    created when something asks for it, so requests that never touch the
+    database (docs, CORS preflights, health checks) never check out a
+    connection.
+    """
+
+    def __init__(self, session_factory=new_session):
+        self._session_factory = session_factory
+        self._session = None
+        # Pool checkouts made while this request was active
+        self.checkouts = 0
+
+    @property
+    def opened(self) -> bool:
+        return self._session is not None
+
+    def get(self):
+        """Return the request's session, creating it on first use"""
+        if self._session is None:
+            self._session = self._session_factory()
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            session, self._session = self._session, None
+            await session.close()
+
+# Session holder for the request being handled, used to attribute pool checkouts
+current_session_holder: ContextVar[Optional[LazySession]] = ContextVar("current_session_holder", default=None)
+
+def _count_connect(dbapi_connection, connection_record):
+    pool_counters["connects"] += 1
+
+def _count_checkout(dbapi_connection, connection_record, connection_proxy):
+    pool_counters["checkouts"] += 1
+    holder = current_session_holder.get()
+    if holder is not None:
+        holder.checkouts += 1
+
+def _count_checkin(dbapi_connection, connection_record):
+    pool_counters["checkins"] += 1
+
+# Count on the engine requests actually use
+request_engine = async_engine.sync_engine if async_engine is not None else engine
+event.listen(request_engine, "connect", _count_connect)
+event.listen(request_engine, "checkout", _count_checkout)
+event.listen(request_engine, "checkin", _count_checkin)
+
+def pool_stats() -> Dict[str, Any]:
+    """Return pool occupancy, checkout waits and counters, and checkouts per request"""
+    pool = request_engine.pool
+    stats = {"mode": DB_MODE, "pool_recycle": DB_POOL_RECYCLE, "pool_pre_ping": DB_POOL_PRE_PING}
+    if hasattr(pool, "metrics"):
+        stats.update(pool.metrics())
+    stats.update(pool_counters)
+    stats["checkouts_per_request"] = checkouts_per_request.snapshot()
+    if request_engine is not engine and hasattr(engine.pool, "metrics"):
+        # The sync engine still serves the log writer and scripts
+        stats["sync_pool"] = engine.pool.metrics()
+    if replica_engine is not None:
+        stats["replica"] = replica_state.stats()
+        if hasattr(replica_engine.pool, "metrics"):
+            stats["replica"].update(replica_engine.pool.metrics())
+    return stats
+
 # Dependency
-def get_db():
-    db = SessionLocal()
+async def get_db(connection: HTTPConnection):
+    """
+    Yield the request's session
+
+    Reuses the request-scoped session from DBSessionMiddleware so that
+    everything in one request (auth dependencies, the route) shares a single
+    pooled connection. Falls back to a private session if the middleware is
+    not installed.
+    """
+    holder = connection.scope.get("state", {}).get("db_session")
+    if holder is not None:
+        yield holder.get()
+        return
+
+    db = new_session()
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        await db.close() 
+
+async def get_read_db(connection: HTTPConnection):
+    """
+    Yield a session for endpoints that only read
+
+    Without a replica this is just the request's session. With one it is a
+    separate session marked read-only, whose queries may be served by the
+    replica; the shared request session is left alone so other dependencies
+    keep writing to the primary. Statements that are not SELECTs, and reads
+    after a write in the request, still go to the primary.
+    """
+    if replica_engine is None:
+        async for db in get_db(connection):
+            yield db
+        return
+
+    async for request_db in get_db(connection):
+        db = new_session()
+        db.info["read_only"] = True
+        # The request session's user_id and write flag decide sticky reads
+        db.info["request_info"] = request_db.info
+        try:
+            yield db
+        finally:
+            await db.close()
@@ -1,12 +1,30 @@
+import os
 import sys
+import asyncio
+import json
+import threading
+import time
 import uuid
+from collections import deque
 from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional
+from dotenv import load_dotenv
 from loguru import logger
-from sqlalchemy.orm import Session
-from fastapi import Request
+from starlette.requests import HTTPConnection
 from contextvars import ContextVar
+from sqlalchemy import insert
 from sqlalchemy.exc import SQLAlchemyError
 
+load_dotenv()
+
+# Database log sink configuration
+DB_LOG_ENABLED = os.getenv("DB_LOG_ENABLED", "true").lower() in ("1", "true", "yes")
+DB_LOG_QUEUE_SIZE = int(os.getenv("DB_LOG_QUEUE_SIZE", "10000"))
+DB_LOG_BATCH_SIZE = int(os.getenv("DB_LOG_BATCH_SIZE", "200"))
+DB_LOG_FLUSH_INTERVAL = float(os.getenv("DB_LOG_FLUSH_INTERVAL", "1.0"))
+# What to do when the queue is full: "drop_newest" or "drop_oldest"
+DB_LOG_OVERFLOW = os.getenv("DB_LOG_OVERFLOW", "drop_newest")
+
 # Remove default handler
 logger.remove()
 
@@ -16,6 +34,12 @@ logger.add(sys.stderr, level="INFO")
 # Create a context variable to store request ID
 request_id_contextvar = ContextVar("request_id", default=None)
 
+# Severity order used to pick the level of a request's log row
+LOG_LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40, "CRITICAL": 50}
+
+# Messages kept per request row; long-lived websockets would otherwise grow without bound
+MAX_REQUEST_LOG_ENTRIES = 50
+
 def get_logger(name=None):
     """
     Returns a logger instance with the given name.
@@ -29,80 +53,290 @@ def get_logger(name=None):
     """
     return logger.bind(module=name)
 
+class RequestLogContext:
+    """
+    Log state for a single HTTP request or websocket connection
+
+    Held in a context variable for the lifetime of the request. Messages
+    logged while it is active are collected here and written together with
+    the request summary as one row when the response is sent or the
+    websocket closes.
+    """
+
+    def __init__(self, connection: HTTPConnection):
+        self.request_id = str(uuid.uuid4())
+        self.websocket = connection.scope["type"] == "websocket"
+        self.method = "WS" if self.websocket else connection.scope["method"]
+        self.path = connection.url.path
+        self.ip_address = connection.client.host if connection.client else None
+        self.user_agent = connection.headers.get("user-agent")
+        self.user_id: Optional[int] = None
+        self.level = "INFO"
+        self.entries: List[Dict[str, Any]] = []
+        self.dropped_entries = 0
+        self.started = time.perf_counter()
+
+    def use_route(self, scope: Dict[str, Any]) -> None:
+        """Log the matched route template; websocket URLs carry the access token"""
+        route = scope.get("route")
+        if route is not None and self.websocket:
+            self.path = getattr(route, "path", self.path)
+
+    def add(self, message: str, level: str, additional_data=None) -> None:
+        """Collect a message logged during the request"""
+        self.raise_level(level)
+        if len(self.entries) >= MAX_REQUEST_LOG_ENTRIES:
+            self.dropped_entries += 1
+            return
+        entry = {"level": level, "message": message}
+        if additional_data is not None:
+            entry["data"] = additional_data
+        self.entries.append(entry)
+
+    def raise_level(self, level: str) -> None:
+        if LOG_LEVELS.get(level, 0) > LOG_LEVELS.get(self.level, 0):
+            self.level = level
+
+    def to_row(self, status_code: int, error: Optional[BaseException] = None) -> Dict[str, Any]:
+        """Build the single log row summarising the request"""
+        duration = time.perf_counter() - self.started
+        if error is not None:
+            self.raise_level("ERROR")
+            message = f"{self.method} {self.path} failed in {duration:.3f}s: {str(error)}"
+        elif self.websocket:
+            message = f"{self.method} {self.path} closed with code {status_code} in {duration:.3f}s"
+        else:
+            if status_code >= 500:
+                self.raise_level("ERROR")
+            message = f"{self.method} {self.path} completed with status {status_code} in {duration:.3f}s"
+
+        details: Dict[str, Any] = {"status_code": status_code, "duration_ms": round(duration * 1000, 3)}
+        if self.entries:
+            details["entries"] = self.entries
+        if self.dropped_entries:
+            details["dropped_entries"] = self.dropped_entries
+        return {
+            "timestamp": datetime.utcnow(),
+            "level": self.level,
+            "message": message,
+            "method": self.method,
+            "path": self.path,
+            "ip_address": self.ip_address,
+            "user_agent": self.user_agent,
+            "request_id": self.request_id,
+            "user_id": self.user_id,
+            "additional_data": json.dumps(details, default=str),
+        }
+
+
+# Context for the request currently being handled, if any
+log_context_contextvar: ContextVar[Optional[RequestLogContext]] = ContextVar("log_context", default=None)
+
 class DBLogger:
-    """Handler for logging to database"""
-    
-    def __init__(self):
-        self.db = None
-    
-    def set_db(self, db: Session):
-        """Set the database session"""
-        self.db = db
-    
+    """
+    Buffered handler for logging to the database
+
+    log_to_db only appends a row to a bounded in-memory queue, so request
+    handling never waits on a log write. A background task drains the queue
+    in bulk inserts, either every ``flush_interval`` seconds or as soon as
+    ``batch_size`` rows are waiting. When the queue is full, rows are dropped
+    according to ``overflow`` and counted.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = DB_LOG_ENABLED,
+        max_queue: int = DB_LOG_QUEUE_SIZE,
+        batch_size: int = DB_LOG_BATCH_SIZE,
+        flush_interval: float = DB_LOG_FLUSH_INTERVAL,
+        overflow: str = DB_LOG_OVERFLOW
+    ):
+        if overflow not in ("drop_newest", "drop_oldest"):
+            raise ValueError(f"Unknown DB_LOG_OVERFLOW policy: {overflow}")
+        self.enabled = enabled
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        # Sync routes run in the threadpool, so the queue is guarded by a plain lock
+        self._queue: Deque[Dict[str, Any]] = deque()
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # Set by stop(); the writer finishes its current batch and exits rather than being cancelled mid-write
+        self._stopping = False
+        self._stats = {"queued": 0, "written": 0, "dropped": 0, "batches": 0, "failed_batches": 0}
+
     def log_to_db(self, message, level, request=None, user_id=None, additional_data=None):
-        """Log a message to the database"""
-        if not self.db:
-            logger.warning("Database session not available for logging")
+        """
+        Log a message to the database
+
+        Inside a request the message is attached to that request's log row;
+        outside one (background tasks, websockets) it is queued as its own row.
+        """
+        if not self.enabled:
             return
-        
+
+        context = log_context_contextvar.get()
+        if context is not None:
+            if user_id is not None:
+                context.user_id = user_id
+            context.add(message, level, additional_data)
+            return
+
         # Get request details if available
         method = None
         path = None
         ip_address = None
         user_agent = None
-        req_id = request_id_contextvar.get()
-        
+
         if request:
             method = request.method
             path = request.url.path
             ip_address = request.client.host if request.client else None
             user_agent = request.headers.get("user-agent")
-        
+
+        row = {
+            "timestamp": datetime.utcnow(),
+            "level": level,
+            "message": message,
+            "method": method,
+            "path": path,
+            "ip_address": ip_address,
+            "user_agent": user_agent,
+            "request_id": request_id_contextvar.get(),
+            "user_id": user_id,
+            "additional_data": additional_data,
+        }
+        self.enqueue(row)
+
+    def enqueue(self, row: Dict[str, Any]) -> None:
+        """Add a complete row to the write queue, applying the overflow policy"""
+        with self._lock:
+            if len(self._queue) >= self.max_queue:
+                self._stats["dropped"] += 1
+                if self.overflow == "drop_newest":
+                    return
+                self._queue.popleft()
+            self._queue.append(row)
+            self._stats["queued"] += 1
+            batch_ready = len(self._queue) >= self.batch_size
+
+        if batch_ready:
+            self._notify()
+
+    def _notify(self) -> None:
+        if self._loop is None or self._wakeup is None or self._loop.is_closed():
+            return
         try:
-            # Import here to avoid circular imports
-            from app.models.log import Log
-            
-            # Create log entry
-            log_entry = Log(
-                timestamp=datetime.utcnow(),
-                level=level,
-                message=message,
-                method=method,
-                path=path,
-                ip_address=ip_address,
-                user_agent=user_agent,
-                request_id=req_id,
-                user_id=user_id,
-                additional_data=additional_data
-            )
-            
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._wakeup.set()
+        else:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def start(self) -> None:
+        """Start the background writer on the running event loop"""
+        if self._task is None and self.enabled:
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background writer and write whatever is still queued"""
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while not self._stopping:
             try:
-                self.db.add(log_entry)
-                self.db.commit()
-            except SQLAlchemyError as e:
-                self.db.rollback()
-                logger.error(f"Failed to write log to database: {str(e)}")
-        except ImportError:
-            logger.warning("Log model not available")
-        except Exception as e:
-            logger.error(f"Logging error: {str(e)}")
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Database log writer error: {str(e)}")
+
+    async def flush(self) -> None:
+        """Write all queued rows in batches"""
+        while True:
+            batch = self._take()
+            if not batch:
+                return
+            await asyncio.to_thread(self._write, batch)
+
+    def _take(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            count = min(len(self._queue), self.batch_size)
+            return [self._queue.popleft() for _ in range(count)]
+
+    def _write(self, rows: List[Dict[str, Any]]) -> None:
+        """Insert a batch in one statement using a dedicated session"""
+        # Import here to avoid circular imports
+        from app.database import SessionLocal
+        from app.models.log import Log
+
+        db = SessionLocal()
+        try:
+            db.execute(insert(Log), rows)
+            db.commit()
+            with self._lock:
+                self._stats["written"] += len(rows)
+                self._stats["batches"] += 1
+        except SQLAlchemyError as e:
+            db.rollback()
+            with self._lock:
+                self._stats["failed_batches"] += 1
+                self._stats["dropped"] += len(rows)
+            logger.error(f"Failed to write {len(rows)} log rows to database: {str(e)}")
+        finally:
+            db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = len(self._queue)
+            counters = dict(self._stats)
+        return {
+            "enabled": self.enabled,
+            "pending": pending,
+            "max_queue": self.max_queue,
+            "batch_size": self.batch_size,
+            "flush_interval": self.flush_interval,
+            "overflow": self.overflow,
+            **counters,
+        }
 
 # Create a global DB logger instance
 db_logger = DBLogger()
 
-def log_request(request: Request, db: Session):
-    """Generate request ID and log the request"""
+def begin_request_log(connection: HTTPConnection) -> RequestLogContext:
+    """Start collecting log context for a request or websocket connection"""
+    context = RequestLogContext(connection)
+    log_context_contextvar.set(context)
+    request_id_contextvar.set(context.request_id)
+    return context
+
+def end_request_log(context: RequestLogContext, status_code: int, error: Optional[BaseException] = None):
+    """Queue the single log row for a finished request"""
     try:
-        # Generate a unique request ID
-        req_id = str(uuid.uuid4())
-        request_id_contextvar.set(req_id)
-        
-        # Set the database session
-        db_logger.set_db(db)
-        
-        # Log the request
-        message = f"Request: {request.method} {request.url.path}"
-        db_logger.log_to_db(message, "INFO", request)
+        if db_logger.enabled:
+            db_logger.enqueue(context.to_row(status_code, error))
     except Exception as e:
         logger.error(f"Failed to log request: {str(e)}")
-        # We don't want logging failures to crash the application 
\ No newline at end of file
+        # We don't want logging failures to crash the application
+
+def set_log_user(user_id: int):
+    """Record the authenticated user on the current request's log row"""
+    context = log_context_contextvar.get()
+    if context is not None:
+        context.user_id = user_id
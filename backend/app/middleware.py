@@ -1,68 +1,79 @@
-from fastapi import Request, Depends
-from starlette.middleware.base import BaseHTTPMiddleware
-from sqlalchemy.orm import Session
-from app.database import get_db
-from app.logger import log_request, logger, db_logger
-import time
-import asyncio
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.database import LazySession, current_session_holder, checkouts_per_request
+from app.logger import begin_request_log, end_request_log
+
+class DBLoggingMiddleware:
+    """
+    Middleware to write one database log row per request
+
+    Written as plain ASGI rather than BaseHTTPMiddleware so it adds no extra
+    task or response wrapping, and so websocket connections are logged too
+    (one row per connection, with the close code as the status).
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        # Request id, user and any messages logged by the handler are collected in a context variable
+        context = begin_request_log(HTTPConnection(scope))
+        status_code = None
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "websocket.close":
+                status_code = message.get("code", 1000)
+            await send(message)
+
+        async def receive_wrapper() -> Message:
+            nonlocal status_code
+            message = await receive()
+            if message["type"] == "websocket.disconnect" and status_code is None:
+                status_code = message.get("code", 1000)
+            return message
 
-class DBLoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        # Start timer
-        start_time = time.time()
-        
-        # Get DB connection from request state if available
-        # This is a workaround since middleware can't use Depends
-        db = None
-        
-        # Process the request
         try:
-            response = await call_next(request)
-            
-            # Try to get DB session
-            db = request.state.db if hasattr(request.state, "db") else None
-            
-            # Log after response to include duration
-            if db:
-                db_logger.set_db(db)
-                duration = time.time() - start_time
-                path = request.url.path
-                status_code = response.status_code
-                message = f"{request.method} {path} completed with status {status_code} in {duration:.3f}s"
-                db_logger.log_to_db(message, "INFO", request)
-                
-            return response
+            await self.app(scope, receive_wrapper if context.websocket else receive, send_wrapper)
         except Exception as e:
-            if db:
-                db_logger.set_db(db)
-                db_logger.log_to_db(f"Error processing request: {str(e)}", "ERROR", request)
+            context.use_route(scope)
+            end_request_log(context, 500, e)
             raise
 
-class DBSessionMiddleware(BaseHTTPMiddleware):
-    """Middleware to add DB session to request state for logging"""
-    
-    async def dispatch(self, request: Request, call_next):
-        # Create a new generator for each request
-        db_generator = get_db()
-        
+        # Log once the response has been sent; this only queues the row
+        context.use_route(scope)
+        end_request_log(context, status_code if status_code is not None else 500)
+
+class DBSessionMiddleware:
+    """
+    Middleware to provide a lazily opened DB session per request
+
+    A LazySession is stored in the scope state (request.state.db_session)
+    and handed out by get_db, so a request holds at most one connection.
+    The connection is only checked out if something in the request uses
+    it, and it is returned when the request or websocket finishes.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        holder = LazySession()
+        scope.setdefault("state", {})["db_session"] = holder
+        token = current_session_holder.set(holder)
         try:
-            # Get DB session
-            db = next(db_generator)
-            
-            # Add to request state
-            request.state.db = db
-            
-            try:
-                # Log the request
-                log_request(request, db)
-                
-                # Process the request
-                response = await call_next(request)
-                return response
-            finally:
-                # Close the DB session
-                db.close()
-        except Exception as e:
-            logger.error(f"Database session error: {str(e)}")
-            # Continue processing even if DB session fails
-            return await call_next(request) 
\ No newline at end of file
+            await self.app(scope, receive, send)
+        finally:
+            await holder.close()
+            current_session_holder.reset(token)
+            checkouts_per_request.observe(holder.checkouts)
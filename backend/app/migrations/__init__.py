@@ -0,0 +1,167 @@
+"""
+Versioned schema migrations
+
+Each module in ``app/migrations/versions`` is one migration, named
+``<version>_<description>.py`` and exposing ``upgrade(connection)``.
+Applied versions are recorded in the ``schema_migrations`` table, and every
+pending migration runs once, in version order, under an advisory lock so
+that several workers starting together do not race. A migration that sets
+``TRANSACTIONAL = False`` (needed for CREATE INDEX CONCURRENTLY) runs in
+autocommit mode and must be safe to re-run.
+"""
+import importlib
+import os
+import pkgutil
+import time
+from contextlib import contextmanager
+from typing import List, Optional, Set
+from dotenv import load_dotenv
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, create_engine, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.pool import NullPool
+from sqlalchemy.sql import func
+
+from app.database import SQLALCHEMY_DATABASE_URL
+from app.logger import get_logger
+from app.migrations import versions
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+# Apply pending migrations at startup; when false, startup fails until they are applied by hand
+DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "true").lower() in ("1", "true", "yes")
+
+# Arbitrary key for pg_advisory_lock, shared by every process running migrations
+MIGRATION_LOCK_KEY = 72_450_118
+
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String(255), nullable=False),
+    Column("applied_at", DateTime(timezone=True), server_default=func.now(), nullable=False),
+)
+
+
+class MigrationError(Exception):
+    """Raised when the schema is behind and cannot be brought up to date"""
+
+
+class Migration:
+    """A single versioned migration script"""
+
+    def __init__(self, version: int, name: str, module):
+        self.version = version
+        self.name = name
+        self.module = module
+        self.transactional = getattr(module, "TRANSACTIONAL", True)
+
+    def upgrade(self, connection: Connection) -> None:
+        self.module.upgrade(connection)
+
+    def __repr__(self) -> str:
+        return f"{self.version:04d}_{self.name}"
+
+
+def discover() -> List[Migration]:
+    """Load every migration script, ordered by version"""
+    migrations = {}
+    for info in pkgutil.iter_modules(versions.__path__):
+        prefix, _, name = info.name.partition("_")
+        if not prefix.isdigit():
+            continue
+        version = int(prefix)
+        if version in migrations:
+            raise MigrationError(f"Duplicate migration version {version}: {info.name}")
+        module = importlib.import_module(f"{versions.__name__}.{info.name}")
+        migrations[version] = Migration(version, name, module)
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def migration_engine() -> Engine:
+    """
+    Engine used for migrations
+
+    Separate from the request engine so DDL is not cut off by
+    DB_STATEMENT_TIMEOUT_MS and does not hold pooled connections.
+    """
+    return create_engine(SQLALCHEMY_DATABASE_URL, poolclass=NullPool)
+
+
+def applied_versions(connection: Connection) -> Set[int]:
+    if not inspect(connection).has_table(schema_migrations.name):
+        return set()
+    return set(connection.execute(select(schema_migrations.c.version)).scalars())
+
+
+def pending(engine: Engine) -> List[Migration]:
+    """Migrations that have not been applied yet"""
+    with engine.connect() as connection:
+        applied = applied_versions(connection)
+    return [migration for migration in discover() if migration.version not in applied]
+
+
+@contextmanager
+def migration_lock(engine: Engine):
+    """Hold a session-level advisory lock for the duration of the block (PostgreSQL only)"""
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        try:
+            yield
+        finally:
+            connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+
+
+def upgrade(engine: Engine, target: Optional[int] = None) -> List[Migration]:
+    """Apply pending migrations up to ``target`` (default: all) and return the ones applied"""
+    applied: List[Migration] = []
+    with migration_lock(engine):
+        with engine.begin() as connection:
+            schema_migrations.create(connection, checkfirst=True)
+        # Re-read under the lock; another worker may have just applied them
+        for migration in pending(engine):
+            if target is not None and migration.version > target:
+                break
+            started = time.perf_counter()
+            logger.info(f"Applying migration {migration}")
+            if migration.transactional:
+                with engine.begin() as connection:
+                    migration.upgrade(connection)
+                    _record(connection, migration)
+            else:
+                with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                    migration.upgrade(connection)
+                    _record(connection, migration)
+            logger.info(f"Applied migration {migration} in {time.perf_counter() - started:.2f}s")
+            applied.append(migration)
+    return applied
+
+
+def _record(connection: Connection, migration: Migration) -> None:
+    connection.execute(schema_migrations.insert().values(version=migration.version, name=migration.name))
+
+
+def check_schema(auto_migrate: bool = DB_AUTO_MIGRATE) -> None:
+    """
+    Startup check: make sure the schema is at the latest version
+
+    The common case costs a single query. Pending migrations are applied
+    when ``auto_migrate`` is set, otherwise startup is refused.
+    """
+    engine = migration_engine()
+    try:
+        missing = pending(engine)
+        if not missing:
+            return
+        if not auto_migrate:
+            raise MigrationError(
+                f"Database schema is missing migrations {', '.join(map(str, missing))}; "
+                "run `python -m app.migrations upgrade`"
+            )
+        upgrade(engine)
+    finally:
+        engine.dispose()
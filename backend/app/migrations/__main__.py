@@ -0,0 +1,33 @@
+"""
+Command line for schema migrations
+
+Run from the backend directory:
+    python -m app.migrations status
+    python -m app.migrations upgrade [--target VERSION]
+"""
+import argparse
+
+from app.migrations import discover, migration_engine, pending, upgrade
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", nargs="?", choices=("status", "upgrade"), default="status")
+    parser.add_argument("--target", type=int, help="stop after this version")
+    args = parser.parse_args()
+
+    engine = migration_engine()
+    try:
+        if args.command == "upgrade":
+            applied = upgrade(engine, target=args.target)
+            print(f"Applied {len(applied)} migration(s)" + (f": {', '.join(map(str, applied))}" if applied else ""))
+            return
+        missing = {migration.version for migration in pending(engine)}
+        for migration in discover():
+            print(f"{'pending' if migration.version in missing else 'applied':8} {migration}")
+    finally:
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
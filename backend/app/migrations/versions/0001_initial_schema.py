@@ -0,0 +1,19 @@
+"""
+Baseline schema
+
+Creates any table that does not exist yet from the models, which is what
+main.py used to do on import. Existing deployments already have these
+tables, so this is a no-op for them. Later migrations must not assume
+they run against the baseline alone: a fresh database gets the current
+models here, so schema changes should be written to be idempotent
+(IF NOT EXISTS and friends).
+"""
+from sqlalchemy.engine import Connection
+
+from app.database import Base
+# Register every model on Base.metadata
+from app.models import chat, coping, log, mood_history, relaxation, resource, user, user_profile, virtual_pet  # noqa: F401
+
+
+def upgrade(connection: Connection) -> None:
+    Base.metadata.create_all(bind=connection)
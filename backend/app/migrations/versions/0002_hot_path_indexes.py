@@ -0,0 +1,48 @@
+"""
+Indexes for the hot route filters
+
+- chat history and chat session seeding: chat_messages by user, newest first
+- mood history: mood_history by user within a time window
+- virtual pet chat history: virtual_pet_chats by pet, newest first
+- coping and relaxation listings filtered by tag (JSONB ``@>``)
+- case-insensitive title lookups when saving generated techniques
+
+Indexes are built CONCURRENTLY so writes to these tables are not blocked,
+which cannot run inside a transaction. A concurrent build that fails
+leaves an invalid index behind; it is dropped and rebuilt on the next run.
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+TRANSACTIONAL = False
+
+# (index name, table, definition, PostgreSQL only)
+INDEXES = [
+    ("ix_chat_messages_user_id_created_at", "chat_messages", "(user_id, created_at)", False),
+    ("ix_mood_history_user_id_timestamp", "mood_history", '(user_id, "timestamp")', False),
+    ("ix_virtual_pet_chats_pet_id_timestamp", "virtual_pet_chats", '(pet_id, "timestamp")', False),
+    ("ix_coping_methods_tags", "coping_methods", "USING gin (tags jsonb_path_ops)", True),
+    ("ix_relaxation_exercises_tags", "relaxation_exercises", "USING gin (tags jsonb_path_ops)", True),
+    ("ix_coping_methods_lower_title", "coping_methods", "(lower(title))", False),
+    ("ix_relaxation_exercises_lower_title", "relaxation_exercises", "(lower(title))", False),
+]
+
+
+def upgrade(connection: Connection) -> None:
+    postgres = connection.dialect.name == "postgresql"
+    for name, table, definition, postgres_only in INDEXES:
+        if not postgres:
+            if not postgres_only:
+                connection.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} {definition}"))
+            continue
+        _drop_if_invalid(connection, name)
+        connection.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} {definition}"))
+
+
+def _drop_if_invalid(connection: Connection, name: str) -> None:
+    valid = connection.execute(text(
+        "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = :name AND pg_table_is_visible(c.oid)"
+    ), {"name": name}).scalar()
+    if valid is False:
+        connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
@@ -0,0 +1,17 @@
+"""
+users.token_version
+
+Embedded in every JWT as ``ver``; bumping it revokes all tokens issued to
+the user before the bump. The default of 0 matches the version assumed
+for tokens issued before the column existed.
+"""
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+
+
+def upgrade(connection: Connection) -> None:
+    # Fresh databases already have the column from the baseline migration
+    columns = {column["name"] for column in inspect(connection).get_columns("users")}
+    if "token_version" not in columns:
+        # A constant default does not rewrite the table on PostgreSQL 11+
+        connection.execute(text("ALTER TABLE users ADD COLUMN token_version INTEGER NOT NULL DEFAULT 0"))
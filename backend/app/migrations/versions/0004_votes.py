@@ -0,0 +1,17 @@
+"""
+votes table
+
+Records which user voted on which coping method, relaxation exercise or
+resource link, so each user's vote is counted once. Counts from before
+this migration stay in the items' upvotes/downvotes columns and have no
+rows here.
+"""
+from sqlalchemy.engine import Connection
+
+# The votes table references users
+from app.models import user  # noqa: F401
+from app.models.vote import Vote
+
+
+def upgrade(connection: Connection) -> None:
+    Vote.__table__.create(bind=connection, checkfirst=True)
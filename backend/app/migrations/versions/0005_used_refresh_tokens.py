@@ -0,0 +1,15 @@
+"""
+used_refresh_tokens table
+
+Refresh tokens carry a ``jti`` and are single use: exchanging one records
+its jti here, and a jti seen twice means the token was replayed.
+"""
+from sqlalchemy.engine import Connection
+
+# The table references users
+from app.models import user  # noqa: F401
+from app.models.refresh_token import UsedRefreshToken
+
+
+def upgrade(connection: Connection) -> None:
+    UsedRefreshToken.__table__.create(bind=connection, checkfirst=True)
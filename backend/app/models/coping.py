@@ -1,7 +1,7 @@
 from sqlalchemy import Column, Integer, String, Text, ARRAY, DateTime, Table, ForeignKey
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
-from sqlalchemy.dialects.postgresql import JSONB
+from app.utils.db_types import PortableJSONB
 from app.database import Base
 
 class CopingMethod(Base):
@@ -10,7 +10,7 @@ class CopingMethod(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(255), unique=True, nullable=False)
     description = Column(Text, nullable=False)
-    tags = Column(JSONB, nullable=True)  # Store as a JSON array
+    tags = Column(PortableJSONB, nullable=True)  # Store as a JSON array
     upvotes = Column(Integer, default=0, nullable=False)
     downvotes = Column(Integer, default=0, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -0,0 +1,11 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from app.database import Base
+
+class UsedRefreshToken(Base):
+    __tablename__ = "used_refresh_tokens"
+
+    # jti of a refresh token already exchanged; presenting it again is a replay
+    jti = Column(String(32), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    # The token's own expiry; rows past it can be deleted since the token is rejected anyway
+    expires_at = Column(DateTime, nullable=False, index=True)
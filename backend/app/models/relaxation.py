@@ -1,6 +1,6 @@
 from sqlalchemy import Column, Integer, String, Text, DateTime
 from sqlalchemy.sql import func
-from sqlalchemy.dialects.postgresql import JSONB
+from app.utils.db_types import PortableJSONB
 from app.database import Base
 
 class RelaxationExercise(Base):
@@ -12,7 +12,7 @@ class RelaxationExercise(Base):
     instructions = Column(Text, nullable=False)
     duration_minutes = Column(Integer, nullable=True)
     difficulty_level = Column(String(50), nullable=True)  # "beginner", "intermediate", "advanced"
-    tags = Column(JSONB, nullable=True)  # Store as a JSON array
+    tags = Column(PortableJSONB, nullable=True)  # Store as a JSON array
     upvotes = Column(Integer, default=0, nullable=False)
     downvotes = Column(Integer, default=0, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
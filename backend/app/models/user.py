@@ -13,6 +13,8 @@ class User(Base, TimeStampMixin):
     hashed_password = Column(String)
     is_active = Column(Boolean, default=True)
     is_superuser = Column(Boolean, default=False)
+    # Part of every issued token; incrementing it revokes the user's existing tokens
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
     
     # Relationship with UserProfile
     profile = relationship("UserProfile", back_populates="user", uselist=False, cascade="all, delete-orphan") 
\ No newline at end of file
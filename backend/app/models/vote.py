@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from app.database import Base
+
+class Vote(Base):
+    __tablename__ = "votes"
+
+    # One row per user and item, so voting twice is a no-op
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    item_type = Column(String(50), primary_key=True)  # table of the item, e.g. "coping_methods"
+    item_id = Column(Integer, primary_key=True)
+    vote_type = Column(String(20), nullable=False)  # "upvote" or "downvote"
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
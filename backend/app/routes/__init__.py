@@ -8,6 +8,7 @@ from app.routes.coping import router as coping_router
 from app.routes.relaxation import router as relaxation_router
 from app.routes.resources import router as resources_router
 from app.routes.virtual_pets import router as virtual_pets_router
+from app.routes.admin import router as admin_router
 api_router = APIRouter()
 
 # Import and include other route modules here
@@ -41,3 +42,5 @@ api_router.include_router(resources_router, prefix="/resources", tags=["resource
 # Include virtual pet routes
 api_router.include_router(virtual_pets_router, prefix="/virtual-pets", tags=["virtual-pets"])
 
+# Include admin routes
+api_router.include_router(admin_router, prefix="/admin", tags=["admin"])
@@ -0,0 +1,125 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, Any, List
+
+from app.auth.utils import get_superuser_principal, revoke_tokens, TokenPrincipal
+from app.auth.token_versions import token_versions
+from app.services.ollama import OllamaService
+from app.services.llm_scheduler import llm_scheduler
+from app.services.ollama_balancer import ollama_balancer
+from app.services.chat_stream import stream_stats
+from app.services.greeting_cache import greeting_cache
+from app.auth.principal_cache import principal_cache
+from app.services.passwords import password_service
+from app.services.rate_limiter import rate_limiter
+from app.services.votes import vote_counter
+from app.logger import db_logger
+from app.database import get_db, pool_stats
+
+router = APIRouter()
+
+@router.get("/ollama/pool", response_model=Dict[str, Any])
+async def get_ollama_pool_stats(
+    current_user: TokenPrincipal = Depends(get_superuser_principal)  # Only superusers can access this endpoint
+):
+    """Get connection pool statistics for the shared Ollama HTTP client"""
+    return OllamaService.pool_stats()
+
+@router.get("/ollama/backends", response_model=List[Dict[str, Any]])
+async def get_ollama_backends(
+    current_user: TokenPrincipal = Depends(get_superuser_principal)  # Only superusers can access this endpoint
+):
+    """Get health, load and model inventory for each Ollama backend"""
+    return ollama_balancer.stats()
+
+@router.get("/ollama/models", response_model=Dict[str, Any])
+async def get_resident_models(
+    current_user: TokenPrincipal = Depends(get_superuser_principal)  # Only superusers can access this endpoint
+):
+    """Get the models resident on each Ollama backend and cold/warm time-to-first-token"""
+    return await OllamaService.resident_models()
+
+@router.get("/llm/scheduler", response_model=Dict[str, Any])
+async def get_llm_scheduler_stats(
+    current_user: TokenPrincipal = Depends(get_superuser_principal)  # Only superusers can access this endpoint
+):
+    """Get LLM admission queue depth and wait-time histograms"""
+    return llm_scheduler.stats()
+
+@router.get("/chat/streams", response_model=Dict[str, Any])
+async def get_chat_stream_stats(
+    current_user: TokenPrincipal = Depends(get_superuser_principal)  # Only superusers can access this endpoint
+):
+    """Get websocket chat streaming counters"""
+    return stream_stats()
+
+@router.get("/chat/greeting-cache", response_model=Dict[str, Any])
+async def get_greeting_cache_stats(
+    current_user: TokenPrincipal = Depends(get_superuser_principal)  # Only superusers can access this endpoint
+):
+    """Get hit/miss counters for the chat greeting cache"""
+    return greeting_cache.stats()
+
+@router.get("/auth/principal-cache", response_model=Dict[str, Any])
+async def get_principal_cache_stats(
+    current_user: TokenPrincipal = Depends(get_superuser_principal)  # Only superusers can access this endpoint
+):
+    """Get hit/miss and invalidation counters for the authenticated user cache"""
+    return principal_cache.stats()
+
+@router.get("/auth/passwords", response_model=Dict[str, Any])
+async def get_password_service_stats(
+    current_user: TokenPrincipal = Depends(get_superuser_principal)  # Only superusers can access this endpoint
+):
+    """Get queue occupancy, rehash counts and timing for password hashing"""
+    return password_service.stats()
+
+@router.get("/auth/token-versions", response_model=Dict[str, Any])
+async def get_token_version_stats(
+    current_user: TokenPrincipal = Depends(get_superuser_principal)  # Only superusers can access this endpoint
+):
+    """Get the size and age of the token revocation map"""
+    return token_versions.stats()
+
+@router.post("/users/{user_id}/revoke", response_model=Dict[str, Any])
+async def revoke_user_tokens(
+    user_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: TokenPrincipal = Depends(get_superuser_principal)  # Only superusers can access this endpoint
+):
+    """Revoke every access and refresh token issued to a user"""
+    version = await revoke_tokens(db, user_id)
+    if version is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    return {"user_id": user_id, "token_version": version}
+
+@router.get("/rate-limits", response_model=Dict[str, Any])
+async def get_rate_limit_stats(
+    current_user: TokenPrincipal = Depends(get_superuser_principal)  # Only superusers can access this endpoint
+):
+    """Get allowed/limited counts per rate policy and backend key counts"""
+    return rate_limiter.stats()
+
+@router.get("/votes", response_model=Dict[str, Any])
+async def get_vote_counter_stats(
+    current_user: TokenPrincipal = Depends(get_superuser_principal)  # Only superusers can access this endpoint
+):
+    """Get vote, duplicate and hot-item buffering counters"""
+    return vote_counter.stats()
+
+@router.get("/logs/sink", response_model=Dict[str, Any])
+async def get_log_sink_stats(
+    current_user: TokenPrincipal = Depends(get_superuser_principal)  # Only superusers can access this endpoint
+):
+    """Get queue depth and write/drop counters for the database log sink"""
+    return db_logger.stats()
+
+@router.get("/db/pool", response_model=Dict[str, Any])
+async def get_db_pool_stats(
+    current_user: TokenPrincipal = Depends(get_superuser_principal)  # Only superusers can access this endpoint
+):
+    """Get database pool occupancy, limits, checkout wait histogram and checkouts per request"""
+    return pool_stats()
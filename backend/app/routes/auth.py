@@ -1,35 +1,95 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from datetime import timedelta
+from jose import JWTError
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_db
+from app.models.user import User
 from app.auth.utils import (
     authenticate_user, 
-    create_access_token, 
+    consume_refresh_token,
+    create_tokens, 
+    decode_token,
+    get_current_principal,
+    revoke_tokens,
     Token, 
-    ACCESS_TOKEN_EXPIRE_MINUTES
+    TokenPrincipal
 )
+from app.services.passwords import PasswordServiceBusy
+from app.services.rate_limiter import LOGIN_IP_POLICY, LOGIN_USER_POLICY, limit_by_ip, limit_by_login
 
 router = APIRouter()
 
-@router.post("/token", response_model=Token)
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+@router.post(
+    "/token",
+    response_model=Token,
+    # Per IP first, so one client cannot lock other users out by exhausting their username buckets
+    dependencies=[Depends(limit_by_ip(LOGIN_IP_POLICY)), Depends(limit_by_login(LOGIN_USER_POLICY))]
+)
 async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Get an access token using username and password
     """
-    user = authenticate_user(db, form_data.username, form_data.password)
+    try:
+        user = await authenticate_user(db, form_data.username, form_data.password)
+    except PasswordServiceBusy as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "1"}
+        )
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+    return create_tokens(user)
+
+@router.post("/refresh", response_model=Token)
+async def refresh_access_token(
+    request: RefreshRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Exchange a refresh token for a new access and refresh token pair
+
+    The user is re-read from the database, so role changes, deactivation
+    and revocation all apply from the next refresh. Each refresh token
+    works once; presenting a used one revokes all of the user's tokens.
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
     )
-    return {"access_token": access_token, "token_type": "bearer"} 
\ No newline at end of file
+    try:
+        payload = decode_token(request.refresh_token, token_type="refresh")
+        user_id = int(payload["uid"])
+    except (JWTError, KeyError, TypeError, ValueError):
+        raise credentials_exception
+    user = await db.get(User, user_id)
+    if user is None or user.username != payload["sub"] or payload.get("ver", 0) != user.token_version:
+        raise credentials_exception
+    if not user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    if not await consume_refresh_token(db, payload):
+        raise credentials_exception
+    return create_tokens(user)
+
+@router.post("/revoke", status_code=status.HTTP_204_NO_CONTENT)
+async def revoke_own_tokens(
+    db: AsyncSession = Depends(get_db),
+    principal: TokenPrincipal = Depends(get_current_principal)
+):
+    """
+    Sign out everywhere: revoke every access and refresh token issued to the current user
+    """
+    await revoke_tokens(db, principal.id) 
\ No newline at end of file
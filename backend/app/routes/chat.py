@@ -1,16 +1,28 @@
 from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional, Dict, Any
 import json
-import asyncio
 import logging
+from contextlib import aclosing
 
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.models.user import User
 from app.models.chat import ChatMessage
 from app.schemas.chat import ChatMessageCreate, ChatMessage as ChatMessageSchema, ChatHistory
-from app.auth.utils import get_current_active_user
+from app.auth.utils import get_active_principal, TokenPrincipal
+from app.logger import set_log_user
 from app.services.ollama import OllamaService
+from app.services.conversation import ConversationWindow, CHAT_HISTORY_SEED_MESSAGES
+from app.services.llm_scheduler import llm_scheduler
+from app.services.greeting_cache import greeting_cache
+from app.services.chat_stream import (
+    WebSocketReader,
+    FrameCoalescer,
+    chat_stream_stats,
+    CHAT_COALESCE_MS,
+    CHAT_COALESCE_BYTES
+)
 from app.utils.prompt_manager import prompt_manager
 
 # Configure logging
@@ -22,25 +34,123 @@ router = APIRouter()
 # Store active WebSocket connections
 active_connections: Dict[int, WebSocket] = {}
 
-async def authenticate_websocket(websocket: WebSocket, token: str, db: Session) -> Optional[User]:
+def queue_position_sender(websocket: WebSocket, message_id: int):
+    """Build a callback that tells a queued client its position"""
+    async def send_position(position: int):
+        await websocket.send_text(json.dumps({
+            "message_id": message_id,
+            "type": "system",
+            "message": f"Server busy, position {position} in queue",
+            "position": position
+        }))
+    return send_position
+
+async def stream_reply(
+    websocket: WebSocket,
+    reader: WebSocketReader,
+    db: AsyncSession,
+    chat_message: ChatMessage,
+    prompt: str,
+    user_id: int,
+    first_message: bool,
+    label: str,
+    coalesce_ms: int = CHAT_COALESCE_MS,
+    coalesce_bytes: int = CHAT_COALESCE_BYTES,
+    **generate_kwargs
+) -> Optional[str]:
+    """
+    Stream a model reply for ``chat_message`` to the client and persist it
+    
+    Generation is cancelled as soon as the client disconnects; whatever was
+    produced up to that point is still saved before WebSocketDisconnect is
+    re-raised. Tokens are batched into frames by a FrameCoalescer.
+    Returns the full response, or None if generation failed.
+    """
+    parts: List[str] = []
+    coalescer = FrameCoalescer(websocket.send_text, chat_message.id, coalesce_ms, coalesce_bytes)
+    generation_stats: Dict[str, Any] = {}
+    
+    async def generate():
+        # Wait for the scheduler to admit the request, then stream the reply
+        async with llm_scheduler.slot(
+            user_id,
+            prompt,
+            first_message=first_message,
+            on_position=queue_position_sender(websocket, chat_message.id)
+        ):
+            stream = OllamaService.generate_stream(prompt=prompt, stats=generation_stats, **generate_kwargs)
+            try:
+                async with aclosing(stream):
+                    async for chunk in stream:
+                        parts.append(chunk)
+                        await coalescer.push(chunk)
+                # Send whatever is still buffered before the end frame
+                await coalescer.flush()
+            finally:
+                coalescer.cancel()
+                coalescer.record()
+    
+    chat_stream_stats["streams_started"] += 1
+    try:
+        await reader.run_unless_disconnected(generate())
+    except WebSocketDisconnect:
+        # Still save what we have
+        chat_stream_stats["streams_cancelled"] += 1
+        logger.info(f"Client disconnected during {label}, generation cancelled")
+        chat_message.response = "".join(parts)
+        await db.commit()
+        raise
+    except Exception as e:
+        chat_stream_stats["streams_failed"] += 1
+        logger.error(f"Error generating {label}: {str(e)}")
+        # Still save what we have
+        chat_message.response = "".join(parts)
+        await db.commit()
+        await websocket.send_text(json.dumps({
+            "message_id": chat_message.id,
+            "error": f"Error generating {label}: {str(e)}",
+            "type": "error"
+        }))
+        return None
+    
+    # Update the database with the full response
+    full_response = "".join(parts)
+    chat_message.response = full_response
+    await db.commit()
+    chat_stream_stats["streams_completed"] += 1
+    
+    # Send completion signal with streaming statistics
+    await websocket.send_text(json.dumps({
+        "message_id": chat_message.id,
+        "type": "end",
+        "frames": coalescer.frames_sent,
+        "tokens": generation_stats.get("eval_count", coalescer.tokens_received)
+    }))
+    return full_response
+
+async def authenticate_websocket(websocket: WebSocket, token: str, db: AsyncSession) -> Optional[User]:
     """Authenticate a WebSocket connection using JWT token"""
-    from app.auth.utils import jwt, SECRET_KEY, ALGORITHM, JWTError
+    from app.auth.utils import JWTError, decode_token, get_principal
+    from app.auth.token_versions import token_versions
     
     try:
         logger.info(f"Attempting to authenticate WebSocket with token: {token[:10]}...")
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            logger.warning("No username in token payload")
-            return None
+        payload = decode_token(token)
+        username: str = payload["sub"]
         
         logger.info(f"Looking up user: {username}")
-        user = db.query(User).filter(User.username == username).first()
+        user = await get_principal(db, username)
         if user is None or not user.is_active:
             logger.warning(f"User not found or inactive: {username}")
             return None
+        version = payload.get("ver", 0)
+        if version < (user.token_version or 0) or not token_versions.is_current(user.id, version):
+            logger.warning(f"Revoked token for user: {username}")
+            return None
         
         logger.info(f"Successfully authenticated user: {username}")
+        set_log_user(user.id)
+        db.info["user_id"] = user.id
         return user
     except JWTError as e:
         logger.error(f"JWT error: {str(e)}")
@@ -50,8 +160,19 @@ async def authenticate_websocket(websocket: WebSocket, token: str, db: Session)
         return None
 
 @router.websocket("/ws/{token}")
-async def websocket_chat(websocket: WebSocket, token: str, db: Session = Depends(get_db)):
-    """WebSocket endpoint for real-time chat with streaming responses"""
+async def websocket_chat(
+    websocket: WebSocket,
+    token: str,
+    coalesce_ms: int = CHAT_COALESCE_MS,
+    coalesce_bytes: int = CHAT_COALESCE_BYTES,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    WebSocket endpoint for real-time chat with streaming responses
+    
+    The optional ``coalesce_ms`` and ``coalesce_bytes`` query parameters
+    control how streamed tokens are batched into chunk frames.
+    """
     
     logger.info("New WebSocket connection attempt")
     
@@ -72,6 +193,10 @@ async def websocket_chat(websocket: WebSocket, token: str, db: Session = Depends
         active_connections[user.id] = websocket
         logger.info(f"User {user.username} connected via WebSocket")
         
+        # Watch for incoming messages and disconnects alongside streaming
+        reader = WebSocketReader(websocket)
+        reader.start()
+        
         # Send a welcome message
         await websocket.send_text(json.dumps({
             "type": "system",
@@ -82,15 +207,35 @@ async def websocket_chat(websocket: WebSocket, token: str, db: Session = Depends
         enhanced_prompt = prompt_manager.get_enhanced_prompt(user, "ai-chat")
         temperature = prompt_manager.get_temperature("ai-chat")
         
+        # Seed the conversation memory from the user's most recent messages
+        result = await db.execute(
+            select(ChatMessage).filter(
+                ChatMessage.user_id == user.id
+            ).order_by(
+                ChatMessage.created_at.desc()
+            ).limit(CHAT_HISTORY_SEED_MESSAGES)
+        )
+        recent_messages = result.scalars().all()
+        conversation = ConversationWindow.from_chat_messages(
+            reversed(recent_messages),
+            system_prompt=enhanced_prompt
+        )
+        
+        # Reuse a cached greeting when the profile and prompt are unchanged
+        greeting_key = greeting_cache.key(user, "ai-chat")
+        cached_greeting = greeting_cache.get(greeting_key)
+        
         # Create a greeting message in the database
         logger.info("Creating initial greeting message")
         greeting_message = ChatMessage(
             user_id=user.id,
-            message="[SYSTEM GREETING: " + enhanced_prompt[:50] + "...]"  # Include part of the prompt to identify it
+            message="[SYSTEM GREETING: " + enhanced_prompt[:50] + "...]",  # Include part of the prompt to identify it
+            response=cached_greeting,
+            message_metadata={"is_auto_greeting": True}
         )
         db.add(greeting_message)
-        db.commit()
-        db.refresh(greeting_message)
+        await db.commit()
+        await db.refresh(greeting_message)
         
         # Send message ID for the greeting
         await websocket.send_text(json.dumps({
@@ -98,50 +243,48 @@ async def websocket_chat(websocket: WebSocket, token: str, db: Session = Depends
             "type": "start"
         }))
         
-        # Generate AI response to the enhanced prompt
-        logger.info(f"Generating initial AI greeting using prompt: {enhanced_prompt[:50]}...")
-        full_response = ""
-        try:
-            # Stream the AI's greeting response
-            async for chunk in OllamaService.generate_stream(
-                prompt=enhanced_prompt,  # Send the enhanced prompt as the user message
-                system_prompt="",  # No additional system prompt needed
-                temperature=temperature
-            ):
-                full_response += chunk
-                # Send each chunk as it arrives
-                await websocket.send_text(json.dumps({
-                    "message_id": greeting_message.id,
-                    "chunk": chunk,
-                    "type": "chunk"
-                }))
-                await asyncio.sleep(0.01)  # Small delay for smoother streaming
-            
-            # Update the database with the full response
-            greeting_message.response = full_response
-            db.commit()
-            logger.info("Completed initial AI greeting")
-            
-            # Send completion signal
+        if cached_greeting is not None:
+            # Replay the cached greeting immediately without calling the model
+            logger.info("Replaying cached AI greeting")
             await websocket.send_text(json.dumps({
                 "message_id": greeting_message.id,
-                "type": "end"
+                "chunk": cached_greeting,
+                "type": "chunk"
             }))
-        except Exception as e:
-            logger.error(f"Error generating initial greeting: {str(e)}")
             await websocket.send_text(json.dumps({
                 "message_id": greeting_message.id,
-                "error": f"Error generating initial greeting: {str(e)}",
-                "type": "error"
+                "type": "end",
+                "cached": True
             }))
-            # Still save what we have
-            greeting_message.response = full_response
-            db.commit()
+            conversation.add_turn(None, cached_greeting)
+        else:
+            # Generate AI response to the enhanced prompt
+            logger.info(f"Generating initial AI greeting using prompt: {enhanced_prompt[:50]}...")
+            greeting = await stream_reply(
+                websocket,
+                reader,
+                db,
+                greeting_message,
+                enhanced_prompt,  # Send the enhanced prompt as the user message
+                user_id=user.id,
+                first_message=True,
+                label="initial greeting",
+                coalesce_ms=coalesce_ms,
+                coalesce_bytes=coalesce_bytes,
+                system_prompt="",  # No additional system prompt needed
+                temperature=temperature
+            )
+            if greeting:
+                greeting_cache.set(greeting_key, greeting)
+                conversation.add_turn(None, greeting)
+                logger.info("Completed initial AI greeting")
         
+        # The first user message of a session is scheduled ahead of ongoing conversations
+        first_message = True
         while True:
             # Receive message from WebSocket
             logger.info("Waiting for message...")
-            data = await websocket.receive_text()
+            data = await reader.receive_text()
             logger.info(f"Received message from user {user.username}")
             
             try:
@@ -169,8 +312,8 @@ async def websocket_chat(websocket: WebSocket, token: str, db: Session = Depends
                     message=message
                 )
                 db.add(db_message)
-                db.commit()
-                db.refresh(db_message)
+                await db.commit()
+                await db.refresh(db_message)
                 
                 # Send back the message ID so client can track this conversation
                 await websocket.send_text(json.dumps({
@@ -178,46 +321,29 @@ async def websocket_chat(websocket: WebSocket, token: str, db: Session = Depends
                     "type": "start"
                 }))
                 
-                # Get streaming response from Ollama - no system prompt needed now as the context is already established
+                # Get streaming response from Ollama - the enhanced prompt and earlier turns are sent as history
                 logger.info(f"Generating response from Ollama for message {db_message.id}")
-                full_response = ""
-                try:
-                    async for chunk in OllamaService.generate_stream(
-                        prompt=message,
-                        system_prompt="",  # No system prompt needed for subsequent messages
-                        temperature=temperature,
-                        top_p=top_p if top_p is not None else None,
-                        max_tokens=max_tokens if max_tokens is not None else None
-                    ):
-                        full_response += chunk
-                        # Send each chunk as it arrives
-                        await websocket.send_text(json.dumps({
-                            "message_id": db_message.id,
-                            "chunk": chunk,
-                            "type": "chunk"
-                        }))
-                        await asyncio.sleep(0.01)  # Small delay for smoother streaming
-                    
-                    # Update the database with the full response
-                    db_message.response = full_response
-                    db.commit()
+                full_response = await stream_reply(
+                    websocket,
+                    reader,
+                    db,
+                    db_message,
+                    message,
+                    user_id=user.id,
+                    first_message=first_message,
+                    label="response",
+                    coalesce_ms=coalesce_ms,
+                    coalesce_bytes=coalesce_bytes,
+                    system_prompt="",  # The enhanced prompt is the first history message
+                    temperature=temperature,
+                    top_p=top_p if top_p is not None else None,
+                    max_tokens=max_tokens if max_tokens is not None else None,
+                    history=conversation.messages(message)
+                )
+                first_message = False
+                if full_response is not None:
+                    conversation.add_turn(message, full_response)
                     logger.info(f"Completed response for message {db_message.id}")
-                    
-                    # Send completion signal
-                    await websocket.send_text(json.dumps({
-                        "message_id": db_message.id,
-                        "type": "end"
-                    }))
-                except Exception as e:
-                    logger.error(f"Error generating response: {str(e)}")
-                    await websocket.send_text(json.dumps({
-                        "message_id": db_message.id,
-                        "error": f"Error generating response: {str(e)}",
-                        "type": "error"
-                    }))
-                    # Still save what we have
-                    db_message.response = full_response
-                    db.commit()
                 
             except json.JSONDecodeError:
                 logger.error("Invalid JSON received")
@@ -238,19 +364,26 @@ async def websocket_chat(websocket: WebSocket, token: str, db: Session = Depends
             pass
         if 'user' in locals() and user and user.id in active_connections:
             del active_connections[user.id]
+    
+    finally:
+        if 'reader' in locals():
+            await reader.stop()
 
 @router.get("/history", response_model=List[ChatMessageSchema])
 async def get_chat_history(
     skip: int = 0,
     limit: int = 50,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    db: AsyncSession = Depends(get_read_db),
+    current_user: TokenPrincipal = Depends(get_active_principal)
 ):
     """Get the chat history for the current user"""
-    messages = db.query(ChatMessage).filter(
-        ChatMessage.user_id == current_user.id
-    ).order_by(
-        ChatMessage.created_at.desc()
-    ).offset(skip).limit(limit).all()
+    result = await db.execute(
+        select(ChatMessage).filter(
+            ChatMessage.user_id == current_user.id
+        ).order_by(
+            ChatMessage.created_at.desc()
+        ).offset(skip).limit(limit)
+    )
+    messages = result.scalars().all()
     
     return messages 
\ No newline at end of file
@@ -1,9 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
-from sqlalchemy.orm import Session
-from sqlalchemy import desc, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import desc, func, select
 from typing import List, Optional, Dict, Any
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.models.coping import CopingMethod
+from app.utils.db_types import json_array_contains
 from app.schemas.coping import (
     CopingMethodResponse, 
     CopingMethodList, 
@@ -12,23 +13,25 @@ from app.schemas.coping import (
     GenerateCopingMethodRequest
 )
 from app.services.gemini_service import gemini_service
-from app.auth.utils import get_current_user
+from app.auth.utils import get_current_user, get_current_principal, TokenPrincipal
 from app.models.user import User
 from app.logger import get_logger
+from app.services.rate_limiter import LLM_POLICY, VOTE_POLICY, limit_by_user
+from app.services.votes import VOTE_COLUMNS, VoteBusy, vote_counter
 from pydantic import BaseModel, Field
 
 logger = get_logger(__name__)
 router = APIRouter(tags=["coping"])
 
-@router.post("/auto-generate", response_model=CopingMethodList)
+@router.post("/auto-generate", response_model=CopingMethodList, dependencies=[Depends(limit_by_user(LLM_POLICY))])
 async def generate_coping_methods(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: TokenPrincipal = Depends(get_current_principal)
 ):
     """Generate new coping methods using AI and save them to the database without user input"""
     
     # Get existing titles to avoid duplicates
-    existing_titles = [title[0] for title in db.query(CopingMethod.title).all()]
+    existing_titles = [title[0] for title in (await db.execute(select(CopingMethod.title))).all()]
     
     # Generate new coping methods using Gemini API with default values
     generated_methods = await gemini_service.generate_coping_methods(
@@ -49,9 +52,9 @@ async def generate_coping_methods(
     for method in generated_methods:
         try:
             # Check if the title already exists (to be extra safe)
-            existing = db.query(CopingMethod).filter(
+            existing = (await db.execute(select(CopingMethod).filter(
                 func.lower(CopingMethod.title) == func.lower(method["title"])
-            ).first()
+            ))).scalars().first()
             
             if existing:
                 continue
@@ -64,12 +67,12 @@ async def generate_coping_methods(
                 downvotes=0
             )
             db.add(new_method)
-            db.commit()
-            db.refresh(new_method)
+            await db.commit()
+            await db.refresh(new_method)
             saved_methods.append(new_method)
         except Exception as e:
             logger.error(f"Error saving coping method: {str(e)}")
-            db.rollback()
+            await db.rollback()
     
     return CopingMethodList(methods=saved_methods)
 
@@ -80,16 +83,16 @@ async def list_coping_methods(
     sort_by: str = "created_at",  # Options: created_at, upvotes, downvotes
     order: str = "desc",
     tag: Optional[str] = None,
-    db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_current_user)
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Optional[TokenPrincipal] = Depends(get_current_principal)
 ):
     """Get a list of coping methods with pagination and sorting options"""
     
-    query = db.query(CopingMethod)
+    query = select(CopingMethod)
     
     # Filter by tag if provided
     if tag:
-        query = query.filter(CopingMethod.tags.contains([tag]))
+        query = query.filter(json_array_contains(CopingMethod.tags, tag))
     
     # Apply sorting
     if sort_by == "upvotes":
@@ -100,17 +103,17 @@ async def list_coping_methods(
         query = query.order_by(desc(CopingMethod.created_at) if order == "desc" else CopingMethod.created_at)
     
     # Apply pagination
-    methods = query.offset(skip).limit(limit).all()
+    methods = (await db.execute(query.offset(skip).limit(limit))).scalars().all()
     
     return CopingMethodList(methods=methods)
 
-@router.post("/vote", response_model=CopingMethodResponse)
+@router.post("/vote", response_model=CopingMethodResponse, dependencies=[Depends(limit_by_user(VOTE_POLICY))])
 async def vote_on_coping_method(
     vote_request: VoteRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: TokenPrincipal = Depends(get_current_principal)
 ):
-    """Upvote or downvote a coping method"""
+    """Upvote or downvote a coping method; voting again replaces the user's earlier vote"""
     
     # Get method_id from the request body
     if not hasattr(vote_request, 'method_id') or not vote_request.method_id:
@@ -119,33 +122,33 @@ async def vote_on_coping_method(
             detail="method_id is required in the request body"
         )
     
-    # Fetch the coping method
-    method = db.query(CopingMethod).filter(CopingMethod.id == vote_request.method_id).first()
-    if not method:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Coping method with ID {vote_request.method_id} not found"
-        )
-    
-    # Update the vote count
-    if vote_request.vote_type == "upvote":
-        method.upvotes += 1
-    elif vote_request.vote_type == "downvote":
-        method.downvotes += 1
-    else:
+    # Validate vote type
+    if vote_request.vote_type not in VOTE_COLUMNS:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Vote type must be either 'upvote' or 'downvote'"
         )
     
-    db.commit()
-    db.refresh(method)
+    # Record the user's vote (once per user) and update the counters atomically
+    try:
+        method = await vote_counter.vote(db, CopingMethod, vote_request.method_id, current_user.id, vote_request.vote_type)
+    except VoteBusy as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "1"}
+        )
+    if not method:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Coping method with ID {vote_request.method_id} not found"
+        )
     
-    return method
+    return vote_counter.response(CopingMethodResponse, method)
 
-@router.get("/personalized", response_model=CopingMethodList)
+@router.get("/personalized", response_model=CopingMethodList, dependencies=[Depends(limit_by_user(LLM_POLICY))])
 async def get_personalized_coping_techniques(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -185,7 +188,7 @@ async def get_personalized_coping_techniques(
     try:
         # Generate personalized coping techniques using gemini-2.0-flash model
         # Get existing coping strategy titles to avoid duplicates
-        existing_titles = [title[0] for title in db.query(CopingMethod.title).all()]
+        existing_titles = [title[0] for title in (await db.execute(select(CopingMethod.title))).all()]
         
         prompt_addition = f"The person is currently feeling {current_mood}."
         if concerns_list:
@@ -213,9 +216,9 @@ async def get_personalized_coping_techniques(
         for technique in generated_techniques:
             try:
                 # Check if the title already exists (to be extra safe)
-                existing = db.query(CopingMethod).filter(
+                existing = (await db.execute(select(CopingMethod).filter(
                     func.lower(CopingMethod.title) == func.lower(technique["title"])
-                ).first()
+                ))).scalars().first()
                 
                 if existing:
                     continue
@@ -228,12 +231,12 @@ async def get_personalized_coping_techniques(
                     downvotes=0
                 )
                 db.add(new_method)
-                db.commit()
-                db.refresh(new_method)
+                await db.commit()
+                await db.refresh(new_method)
                 saved_methods.append(new_method)
             except Exception as e:
                 logger.error(f"Error saving personalized coping method: {str(e)}")
-                db.rollback()
+                await db.rollback()
         
         return CopingMethodList(methods=saved_methods)
         
@@ -1,12 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime, timedelta
-from app.database import get_db
+from app.database import get_read_db
 from app.models.log import Log
-from app.models.user import User
-from app.auth.utils import get_current_superuser
+from app.auth.utils import get_superuser_principal, TokenPrincipal
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -26,7 +25,7 @@ class LogResponse(BaseModel):
     model_config = {"from_attributes": True}
 
 @router.get("/", response_model=List[LogResponse])
-def get_logs(
+async def get_logs(
     level: Optional[str] = None,
     path: Optional[str] = None,
     start_date: Optional[datetime] = None,
@@ -34,11 +33,11 @@ def get_logs(
     user_id: Optional[int] = None,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_superuser)  # Only superusers can access this endpoint
+    db: AsyncSession = Depends(get_read_db),
+    current_user: TokenPrincipal = Depends(get_superuser_principal)  # Only superusers can access this endpoint
 ):
     """Get logs with optional filtering - only accessible by superusers"""
-    query = db.query(Log)
+    query = select(Log)
     
     # Apply filters
     if level:
@@ -56,33 +55,35 @@ def get_logs(
     query = query.order_by(Log.timestamp.desc())
     
     # Paginate results
-    logs = query.offset(skip).limit(limit).all()
+    logs = (await db.execute(query.offset(skip).limit(limit))).scalars().all()
     
     return logs
 
 @router.get("/stats", response_model=dict)
-def get_log_stats(
+async def get_log_stats(
     days: int = Query(7, ge=1, le=30),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get log statistics for the specified number of days - publicly accessible"""
     # Calculate start date
     start_date = datetime.utcnow() - timedelta(days=days)
     
     # Get total count
-    total_count = db.query(Log).filter(Log.timestamp >= start_date).count()
+    total_count = await db.scalar(
+        select(func.count()).select_from(Log).filter(Log.timestamp >= start_date)
+    )
     
     # Get count by level
     level_counts = {}
     for level in ["INFO", "WARNING", "ERROR", "CRITICAL"]:
-        count = db.query(Log).filter(
+        count = await db.scalar(select(func.count()).select_from(Log).filter(
             Log.level == level,
             Log.timestamp >= start_date
-        ).count()
+        ))
         level_counts[level] = count
     
     # Get most accessed paths
-    path_query = db.query(
+    path_query = select(
         Log.path, 
         func.count(Log.id).label("count")
     ).filter(
@@ -94,7 +95,7 @@ def get_log_stats(
         func.count(Log.id).desc()
     ).limit(10)
     
-    top_paths = {path: count for path, count in path_query}
+    top_paths = {path: count for path, count in await db.execute(path_query)}
     
     return {
         "total_count": total_count,
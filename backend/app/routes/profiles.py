@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from datetime import datetime, timedelta
 
@@ -10,7 +11,7 @@ from app.models.mood_history import MoodHistory
 from app.schemas.user_profile import UserProfile as UserProfileSchema
 from app.schemas.user_profile import UserProfileCreate, UserProfileUpdate, MoodUpdate
 from app.schemas.mood_history import MoodHistoryList, MoodHistoryResponse, MoodForecast
-from app.auth.utils import get_current_active_user
+from app.auth.utils import get_current_active_user, get_active_principal, TokenPrincipal
 from app.services.gemini_service import gemini_service
 
 router = APIRouter()
@@ -18,7 +19,7 @@ router = APIRouter()
 @router.get("/me", response_model=UserProfileSchema)
 async def get_user_profile(
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get the current user's profile"""
     # Check if profile exists
@@ -26,8 +27,8 @@ async def get_user_profile(
         # Create an empty profile if it doesn't exist
         profile = UserProfile(user_id=current_user.id)
         db.add(profile)
-        db.commit()
-        db.refresh(profile)
+        await db.commit()
+        await db.refresh(profile)
         return profile
     
     return current_user.profile
@@ -36,7 +37,7 @@ async def get_user_profile(
 async def update_user_profile(
     profile_update: UserProfileUpdate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update the current user's profile"""
     # Check if profile exists
@@ -45,8 +46,8 @@ async def update_user_profile(
         profile_data = profile_update.model_dump(exclude_unset=True)
         profile = UserProfile(user_id=current_user.id, **profile_data)
         db.add(profile)
-        db.commit()
-        db.refresh(profile)
+        await db.commit()
+        await db.refresh(profile)
         
         # Record mood in history if it was set
         if profile_update.current_mood:
@@ -55,7 +56,7 @@ async def update_user_profile(
                 mood=profile_update.current_mood
             )
             db.add(mood_history_entry)
-            db.commit()
+            await db.commit()
         
         return profile
     
@@ -71,8 +72,8 @@ async def update_user_profile(
     for key, value in profile_data.items():
         setattr(profile, key, value)
     
-    db.commit()
-    db.refresh(profile)
+    await db.commit()
+    await db.refresh(profile)
     
     # Record mood change in history if the mood was updated
     if mood_updated:
@@ -81,7 +82,7 @@ async def update_user_profile(
             mood=profile.current_mood
         )
         db.add(mood_history_entry)
-        db.commit()
+        await db.commit()
     
     return profile
 
@@ -89,7 +90,7 @@ async def update_user_profile(
 async def update_mood(
     mood_update: MoodUpdate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update only the current mood of the user"""
     # Check if profile exists
@@ -97,14 +98,14 @@ async def update_mood(
         # Create a new profile with just the mood
         profile = UserProfile(user_id=current_user.id, current_mood=mood_update.current_mood)
         db.add(profile)
-        db.commit()
-        db.refresh(profile)
+        await db.commit()
+        await db.refresh(profile)
     else:
         # Update only the mood
         profile = current_user.profile
         profile.current_mood = mood_update.current_mood
-        db.commit()
-        db.refresh(profile)
+        await db.commit()
+        await db.refresh(profile)
     
     # Record this mood change in mood history
     mood_history_entry = MoodHistory(
@@ -112,25 +113,25 @@ async def update_mood(
         mood=mood_update.current_mood
     )
     db.add(mood_history_entry)
-    db.commit()
+    await db.commit()
     
     return profile
 
 @router.get("/me/mood-history", response_model=MoodHistoryList)
 async def get_mood_history(
     days: int = 7,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: TokenPrincipal = Depends(get_active_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """Get the user's mood history for the specified number of days (default: 7 days)"""
     # Calculate the date threshold
     cutoff_date = datetime.now() - timedelta(days=days)
     
     # Query mood history entries after the cutoff date
-    mood_entries = db.query(MoodHistory).filter(
+    mood_entries = (await db.execute(select(MoodHistory).filter(
         MoodHistory.user_id == current_user.id,
         MoodHistory.timestamp >= cutoff_date
-    ).order_by(MoodHistory.timestamp.desc()).all()
+    ).order_by(MoodHistory.timestamp.desc()))).scalars().all()
     
     return MoodHistoryList(history=mood_entries)
 
@@ -138,7 +139,7 @@ async def get_mood_history(
 async def get_mood_forecast(
     days: int = 7,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get AI-generated mood forecast based on user's mood history"""
     # Check if user has a profile and current mood
@@ -152,10 +153,10 @@ async def get_mood_forecast(
     cutoff_date = datetime.now() - timedelta(days=days)
     
     # Query mood history entries after the cutoff date
-    mood_entries = db.query(MoodHistory).filter(
+    mood_entries = (await db.execute(select(MoodHistory).filter(
         MoodHistory.user_id == current_user.id,
         MoodHistory.timestamp >= cutoff_date
-    ).order_by(MoodHistory.timestamp.desc()).all()
+    ).order_by(MoodHistory.timestamp.desc()))).scalars().all()
     
     # Convert mood entries to list of dictionaries
     mood_history = [
@@ -1,9 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
-from sqlalchemy.orm import Session
-from sqlalchemy import desc, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import desc, func, select
 from typing import List, Optional, Dict, Any
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.models.relaxation import RelaxationExercise
+from app.utils.db_types import json_array_contains
 from app.schemas.relaxation import (
     RelaxationExerciseResponse, 
     RelaxationExerciseList, 
@@ -12,19 +13,21 @@ from app.schemas.relaxation import (
     GenerateRelaxationExerciseRequest
 )
 from app.services.gemini_service import gemini_service
-from app.auth.utils import get_current_user
+from app.auth.utils import get_current_user, get_current_principal, TokenPrincipal
 from app.models.user import User
 from app.logger import get_logger
+from app.services.rate_limiter import LLM_POLICY, VOTE_POLICY, limit_by_user
+from app.services.votes import VOTE_COLUMNS, VoteBusy, vote_counter
 from pydantic import BaseModel, Field
 
 logger = get_logger(__name__)
 router = APIRouter(tags=["relaxation"])
 
-@router.post("/auto-generate", response_model=RelaxationExerciseList)
+@router.post("/auto-generate", response_model=RelaxationExerciseList, dependencies=[Depends(limit_by_user(LLM_POLICY))])
 async def generate_relaxation_exercises(
     generate_request: Optional[GenerateRelaxationExerciseRequest] = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: TokenPrincipal = Depends(get_current_principal)
 ):
     """Generate new relaxation exercises using AI and save them to the database"""
     
@@ -32,7 +35,7 @@ async def generate_relaxation_exercises(
         generate_request = GenerateRelaxationExerciseRequest()
     
     # Get existing titles to avoid duplicates
-    existing_titles = [title[0] for title in db.query(RelaxationExercise.title).all()]
+    existing_titles = [title[0] for title in (await db.execute(select(RelaxationExercise.title))).all()]
     
     # Generate new relaxation exercises using Gemini API
     generated_exercises = await gemini_service.generate_relaxation_exercises(
@@ -55,9 +58,9 @@ async def generate_relaxation_exercises(
     for exercise in generated_exercises:
         try:
             # Check if the title already exists (to be extra safe)
-            existing = db.query(RelaxationExercise).filter(
+            existing = (await db.execute(select(RelaxationExercise).filter(
                 func.lower(RelaxationExercise.title) == func.lower(exercise["title"])
-            ).first()
+            ))).scalars().first()
             
             if existing:
                 continue
@@ -73,12 +76,12 @@ async def generate_relaxation_exercises(
                 downvotes=0
             )
             db.add(new_exercise)
-            db.commit()
-            db.refresh(new_exercise)
+            await db.commit()
+            await db.refresh(new_exercise)
             saved_exercises.append(new_exercise)
         except Exception as e:
             logger.error(f"Error saving relaxation exercise: {str(e)}")
-            db.rollback()
+            await db.rollback()
     
     return RelaxationExerciseList(exercises=saved_exercises)
 
@@ -91,16 +94,16 @@ async def list_relaxation_exercises(
     tag: Optional[str] = None,
     difficulty: Optional[str] = None,
     max_duration: Optional[int] = None,
-    db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_current_user)
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Optional[TokenPrincipal] = Depends(get_current_principal)
 ):
     """Get a list of relaxation exercises with pagination, filtering and sorting options"""
     
-    query = db.query(RelaxationExercise)
+    query = select(RelaxationExercise)
     
     # Apply filters
     if tag:
-        query = query.filter(RelaxationExercise.tags.contains([tag]))
+        query = query.filter(json_array_contains(RelaxationExercise.tags, tag))
     
     if difficulty:
         query = query.filter(RelaxationExercise.difficulty_level == difficulty)
@@ -119,17 +122,17 @@ async def list_relaxation_exercises(
         query = query.order_by(desc(RelaxationExercise.created_at) if order == "desc" else RelaxationExercise.created_at)
     
     # Apply pagination
-    exercises = query.offset(skip).limit(limit).all()
+    exercises = (await db.execute(query.offset(skip).limit(limit))).scalars().all()
     
     return RelaxationExerciseList(exercises=exercises)
 
-@router.post("/vote", response_model=RelaxationExerciseResponse)
+@router.post("/vote", response_model=RelaxationExerciseResponse, dependencies=[Depends(limit_by_user(VOTE_POLICY))])
 async def vote_on_relaxation_exercise(
     vote_request: VoteRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: TokenPrincipal = Depends(get_current_principal)
 ):
-    """Upvote or downvote a relaxation exercise. Simple voting without user tracking"""
+    """Upvote or downvote a relaxation exercise; voting again replaces the user's earlier vote"""
     
     # Get exercise_id from the request body
     if not hasattr(vote_request, 'exercise_id') or not vote_request.exercise_id:
@@ -138,36 +141,33 @@ async def vote_on_relaxation_exercise(
             detail="exercise_id is required in the request body"
         )
     
-    # Fetch the relaxation exercise
-    exercise = db.query(RelaxationExercise).filter(RelaxationExercise.id == vote_request.exercise_id).first()
-    if not exercise:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Relaxation exercise with ID {vote_request.exercise_id} not found"
-        )
-    
     # Validate vote type
-    if vote_request.vote_type not in ["upvote", "downvote"]:
+    if vote_request.vote_type not in VOTE_COLUMNS:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Vote type must be either 'upvote' or 'downvote'"
         )
     
-    # Update the vote count
-    if vote_request.vote_type == "upvote":
-        exercise.upvotes += 1
-    else:  # downvote
-        exercise.downvotes += 1
-    
-    # Save changes
-    db.commit()
-    db.refresh(exercise)
+    # Record the user's vote (once per user) and update the counters atomically
+    try:
+        exercise = await vote_counter.vote(db, RelaxationExercise, vote_request.exercise_id, current_user.id, vote_request.vote_type)
+    except VoteBusy as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "1"}
+        )
+    if not exercise:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Relaxation exercise with ID {vote_request.exercise_id} not found"
+        )
     
-    return exercise
+    return vote_counter.response(RelaxationExerciseResponse, exercise)
 
-@router.get("/personalized", response_model=RelaxationExerciseList)
+@router.get("/personalized", response_model=RelaxationExerciseList, dependencies=[Depends(limit_by_user(LLM_POLICY))])
 async def get_personalized_relaxation_exercises(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -206,7 +206,7 @@ async def get_personalized_relaxation_exercises(
     
     try:
         # Get existing relaxation exercise titles to avoid duplicates
-        existing_titles = [title[0] for title in db.query(RelaxationExercise.title).all()]
+        existing_titles = [title[0] for title in (await db.execute(select(RelaxationExercise.title))).all()]
         
         # Construct prompt based on user's profile data
         prompt_addition = f"The person is currently feeling {current_mood}."
@@ -237,9 +237,9 @@ async def get_personalized_relaxation_exercises(
         for exercise in generated_exercises:
             try:
                 # Check if the title already exists (to be extra safe)
-                existing = db.query(RelaxationExercise).filter(
+                existing = (await db.execute(select(RelaxationExercise).filter(
                     func.lower(RelaxationExercise.title) == func.lower(exercise["title"])
-                ).first()
+                ))).scalars().first()
                 
                 if existing:
                     continue
@@ -255,12 +255,12 @@ async def get_personalized_relaxation_exercises(
                     downvotes=0
                 )
                 db.add(new_exercise)
-                db.commit()
-                db.refresh(new_exercise)
+                await db.commit()
+                await db.refresh(new_exercise)
                 saved_exercises.append(new_exercise)
             except Exception as e:
                 logger.error(f"Error saving personalized relaxation exercise: {str(e)}")
-                db.rollback()
+                await db.rollback()
         
         return RelaxationExerciseList(exercises=saved_exercises)
         
@@ -274,12 +274,12 @@ async def get_personalized_relaxation_exercises(
 @router.get("/{exercise_id}", response_model=RelaxationExerciseResponse)
 async def get_relaxation_exercise(
     exercise_id: int,
-    db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_current_user)
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Optional[TokenPrincipal] = Depends(get_current_principal)
 ):
     """Get a single relaxation exercise by ID"""
     
-    exercise = db.query(RelaxationExercise).filter(RelaxationExercise.id == exercise_id).first()
+    exercise = (await db.execute(select(RelaxationExercise).filter(RelaxationExercise.id == exercise_id))).scalars().first()
     if not exercise:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
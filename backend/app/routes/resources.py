@@ -1,10 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import desc, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import desc, func, select
 from typing import List, Optional
 
-from app.database import get_db
-from app.models.user import User
+from app.database import get_db, get_read_db
 from app.models.resource import ResourceLink
 from app.schemas.resource import (
     ResourceLinkCreate, 
@@ -12,8 +11,10 @@ from app.schemas.resource import (
     ResourceLinkList,
     ResourceLinkVote
 )
-from app.auth.utils import get_current_user
+from app.auth.utils import get_current_principal, TokenPrincipal
 from app.logger import get_logger
+from app.services.rate_limiter import VOTE_POLICY, limit_by_user
+from app.services.votes import VoteBusy, vote_counter
 
 logger = get_logger(__name__)
 router = APIRouter(tags=["resources"])
@@ -21,8 +22,8 @@ router = APIRouter(tags=["resources"])
 @router.post("/", response_model=ResourceLinkResponse)
 async def create_resource_link(
     resource: ResourceLinkCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: TokenPrincipal = Depends(get_current_principal)
 ):
     """Add a new resource link"""
     
@@ -41,11 +42,11 @@ async def create_resource_link(
     
     try:
         db.add(new_resource)
-        db.commit()
-        db.refresh(new_resource)
+        await db.commit()
+        await db.refresh(new_resource)
         return new_resource
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Error creating resource link: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -60,13 +61,13 @@ async def list_resource_links(
     search: Optional[str] = None,
     sort_by: str = "created_at",  # Options: created_at, upvotes, domain
     order: str = "desc",
-    db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_current_user)
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Optional[TokenPrincipal] = Depends(get_current_principal)
 ):
     """Get a list of resource links with filtering, searching and sorting"""
     
     # Base query
-    query = db.query(ResourceLink)
+    query = select(ResourceLink)
     
     # Apply domain filter
     if domain:
@@ -83,7 +84,7 @@ async def list_resource_links(
         )
     
     # Get total count for pagination
-    total = query.count()
+    total = (await db.execute(select(func.count()).select_from(query.subquery()))).scalar()
     
     # Apply sorting
     if sort_by == "upvotes":
@@ -94,54 +95,54 @@ async def list_resource_links(
         query = query.order_by(desc(ResourceLink.created_at) if order == "desc" else ResourceLink.created_at)
     
     # Apply pagination
-    resources = query.offset(skip).limit(limit).all()
+    resources = (await db.execute(query.offset(skip).limit(limit))).scalars().all()
     
     return ResourceLinkList(resources=resources, total=total)
 
-@router.post("/vote", response_model=ResourceLinkResponse)
+@router.post("/vote", response_model=ResourceLinkResponse, dependencies=[Depends(limit_by_user(VOTE_POLICY))])
 async def upvote_resource(
     vote_request: ResourceLinkVote,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: TokenPrincipal = Depends(get_current_principal)
 ):
-    """Upvote a resource link"""
+    """Upvote a resource link; each user's upvote counts once"""
     
-    # Fetch the resource
-    resource = db.query(ResourceLink).filter(ResourceLink.id == vote_request.resource_id).first()
+    # Record the user's upvote (once per user) and increment the counter atomically
+    try:
+        resource = await vote_counter.vote(db, ResourceLink, vote_request.resource_id, current_user.id, "upvote")
+    except VoteBusy as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "1"}
+        )
     if not resource:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Resource with ID {vote_request.resource_id} not found"
         )
     
-    # Increment upvotes
-    resource.upvotes += 1
-    
-    # Save changes
-    db.commit()
-    db.refresh(resource)
-    
-    return resource
+    return vote_counter.response(ResourceLinkResponse, resource)
 
 @router.get("/domains", response_model=List[str])
 async def list_domains(
-    db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_current_user)
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Optional[TokenPrincipal] = Depends(get_current_principal)
 ):
     """Get a list of all unique domains for filtering"""
     
-    domains = [domain[0] for domain in db.query(ResourceLink.domain).distinct().all()]
+    domains = [domain[0] for domain in (await db.execute(select(ResourceLink.domain).distinct())).all()]
     return domains
 
 @router.get("/{resource_id}", response_model=ResourceLinkResponse)
 async def get_resource(
     resource_id: int,
-    db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_current_user)
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Optional[TokenPrincipal] = Depends(get_current_principal)
 ):
     """Get a single resource link by ID"""
     
-    resource = db.query(ResourceLink).filter(ResourceLink.id == resource_id).first()
+    resource = (await db.execute(select(ResourceLink).filter(ResourceLink.id == resource_id))).scalars().first()
     if not resource:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
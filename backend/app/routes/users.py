@@ -1,39 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from app.database import get_db
 from app.models.user import User
 from app.schemas.user import UserCreate, User as UserSchema
-from app.auth.utils import get_current_superuser
-
-# Alternative imports for password hashing in case passlib fails
-import bcrypt
-from passlib.context import CryptContext
+from app.auth.utils import get_superuser_principal, TokenPrincipal
+from app.services.passwords import password_service, PasswordServiceBusy
+from app.utils.loaders import AUTH_PROFILE_LOADER, USER_LIST_PROFILE_LOADER, eager_load
 
 router = APIRouter()
 
-# Try using passlib first, if it fails use bcrypt directly
-try:
-    # Password hashing context
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-    def get_password_hash(password: str) -> str:
-        """Hash a password for storing."""
-        return pwd_context.hash(password)
-except Exception as e:
-    # Fallback to direct bcrypt usage
-    print(f"Falling back to direct bcrypt usage due to: {str(e)}")
-    
-    def get_password_hash(password: str) -> str:
-        """Hash a password using bcrypt directly."""
-        if isinstance(password, str):
-            password = password.encode('utf-8')
-        salt = bcrypt.gensalt()
-        hashed = bcrypt.hashpw(password, salt)
-        return hashed.decode('utf-8')
-
 @router.post("/", response_model=UserSchema, status_code=status.HTTP_201_CREATED)
-def create_user(user: UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
     # Prevent superuser creation through the API
     if user.is_superuser:
         raise HTTPException(
@@ -42,7 +21,7 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)):
         )
         
     # Check if user with this email already exists
-    db_user = db.query(User).filter(User.email == user.email).first()
+    db_user = (await db.execute(select(User).filter(User.email == user.email))).scalars().first()
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -50,16 +29,24 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)):
         )
     
     # Check if username is taken
-    db_user = db.query(User).filter(User.username == user.username).first()
+    db_user = (await db.execute(select(User).filter(User.username == user.username))).scalars().first()
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already taken"
         )
     
+    try:
+        hashed_password = await password_service.hash(user.password)
+    except PasswordServiceBusy as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "1"}
+        )
+    
     # Create new user with hashed password
     try:
-        hashed_password = get_password_hash(user.password)
         db_user = User(
             email=user.email,
             username=user.username,
@@ -69,40 +56,47 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)):
         )
         
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        # Load the (empty) profile so the response can be built without lazy loading
+        await db.refresh(db_user, ["profile"])
         
         return db_user
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error creating user: {str(e)}"
         )
 
 @router.get("/", response_model=List[UserSchema])
-def read_users(
+async def read_users(
     skip: int = 0, 
     limit: int = 100, 
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_superuser)  # Only superusers can access this endpoint
+    db: AsyncSession = Depends(get_db),
+    current_user: TokenPrincipal = Depends(get_superuser_principal)  # Only superusers can access this endpoint
 ):
     """
     Get all users - only accessible by superusers
     """
-    users = db.query(User).offset(skip).limit(limit).all()
+    result = await db.execute(
+        select(User).options(eager_load(User.profile, USER_LIST_PROFILE_LOADER)).order_by(User.id).offset(skip).limit(limit)
+    )
+    users = result.scalars().all()
     return users
 
 @router.get("/{user_id}", response_model=UserSchema)
-def read_user(
+async def read_user(
     user_id: int, 
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_superuser)  # Only superusers can access this endpoint
+    db: AsyncSession = Depends(get_db),
+    current_user: TokenPrincipal = Depends(get_superuser_principal)  # Only superusers can access this endpoint
 ):
     """
     Get user by ID - only accessible by superusers
     """
-    db_user = db.query(User).filter(User.id == user_id).first()
+    result = await db.execute(
+        select(User).options(eager_load(User.profile, AUTH_PROFILE_LOADER)).filter(User.id == user_id)
+    )
+    db_user = result.scalars().first()
     if db_user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime, timedelta
 
@@ -14,23 +15,24 @@ from app.schemas.virtual_pet import (
     ChatMessage,
     ChatHistory
 )
-from app.auth.utils import get_current_active_user
+from app.auth.utils import get_current_active_user, get_active_principal, TokenPrincipal
 from app.services.gemini_service import gemini_service
+from app.services.rate_limiter import LLM_POLICY, limit_by_user
 
 router = APIRouter()
 
 @router.post("/create", response_model=VirtualPetSchema)
 async def create_virtual_pet(
     pet_data: VirtualPetCreate,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: TokenPrincipal = Depends(get_active_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new virtual support animal"""
     # Check if user already has a pet with this name
-    existing_pet = db.query(VirtualPet).filter(
+    existing_pet = (await db.execute(select(VirtualPet).filter(
         VirtualPet.user_id == current_user.id,
         VirtualPet.name == pet_data.name
-    ).first()
+    ))).scalars().first()
     
     if existing_pet:
         raise HTTPException(
@@ -45,20 +47,20 @@ async def create_virtual_pet(
         name=pet_data.name
     )
     db.add(pet)
-    db.commit()
-    db.refresh(pet)
+    await db.commit()
+    await db.refresh(pet)
     
     return pet
 
 @router.get("/list", response_model=VirtualPetList)
 async def list_virtual_pets(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: TokenPrincipal = Depends(get_active_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """Get list of user's virtual pets"""
-    pets = db.query(VirtualPet).filter(
+    pets = (await db.execute(select(VirtualPet).filter(
         VirtualPet.user_id == current_user.id
-    ).all()
+    ))).scalars().all()
     
     return VirtualPetList(pets=pets)
 
@@ -66,15 +68,15 @@ async def list_virtual_pets(
 async def get_chat_history(
     pet_id: int,
     limit: int = 50,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: TokenPrincipal = Depends(get_active_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """Get chat history with a virtual pet"""
     # Verify pet exists and belongs to user
-    pet = db.query(VirtualPet).filter(
+    pet = (await db.execute(select(VirtualPet).filter(
         VirtualPet.id == pet_id,
         VirtualPet.user_id == current_user.id
-    ).first()
+    ))).scalars().first()
     
     if not pet:
         raise HTTPException(
@@ -83,30 +85,30 @@ async def get_chat_history(
         )
     
     # Get chat messages
-    messages = db.query(VirtualPetChat).filter(
+    messages = (await db.execute(select(VirtualPetChat).filter(
         VirtualPetChat.pet_id == pet_id
     ).order_by(
         VirtualPetChat.timestamp.desc()
-    ).limit(limit).all()
+    ).limit(limit))).scalars().all()
     
     # Reverse to get chronological order
     messages.reverse()
     
     return ChatHistory(messages=messages)
 
-@router.post("/{pet_id}/chat", response_model=ChatMessage)
+@router.post("/{pet_id}/chat", response_model=ChatMessage, dependencies=[Depends(limit_by_user(LLM_POLICY))])
 async def chat_with_pet(
     pet_id: int,
     message: VirtualPetMessage,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Send a message to a virtual pet and get their response"""
     # Verify pet exists and belongs to user
-    pet = db.query(VirtualPet).filter(
+    pet = (await db.execute(select(VirtualPet).filter(
         VirtualPet.id == pet_id,
         VirtualPet.user_id == current_user.id
-    ).first()
+    ))).scalars().first()
     
     if not pet:
         raise HTTPException(
@@ -115,11 +117,11 @@ async def chat_with_pet(
         )
     
     # Get recent chat history for context
-    recent_messages = db.query(VirtualPetChat).filter(
+    recent_messages = (await db.execute(select(VirtualPetChat).filter(
         VirtualPetChat.pet_id == pet_id
     ).order_by(
         VirtualPetChat.timestamp.desc()
-    ).limit(5).all()
+    ).limit(5))).scalars().all()
     
     chat_history = [
         {
@@ -141,8 +143,8 @@ async def chat_with_pet(
         is_user=True
     )
     db.add(user_message)
-    db.commit()
-    db.refresh(user_message)
+    await db.commit()
+    await db.refresh(user_message)
     
     # Generate pet's response
     try:
@@ -162,13 +164,13 @@ async def chat_with_pet(
             is_user=False
         )
         db.add(pet_message)
-        db.commit()
-        db.refresh(pet_message)
+        await db.commit()
+        await db.refresh(pet_message)
         
         return pet_message
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
@@ -0,0 +1,194 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+from fastapi import WebSocket, WebSocketDisconnect
+from dotenv import load_dotenv
+
+load_dotenv()
+
+T = TypeVar("T")
+
+# Default frame coalescing, overridable per connection
+CHAT_COALESCE_MS = int(os.getenv("CHAT_COALESCE_MS", "30"))
+CHAT_COALESCE_BYTES = int(os.getenv("CHAT_COALESCE_BYTES", "512"))
+MAX_COALESCE_MS = 1000
+MAX_COALESCE_BYTES = 65536
+
+# Process-wide counters for websocket chat streaming
+chat_stream_stats: Dict[str, int] = {
+    "streams_started": 0,
+    "streams_completed": 0,
+    "streams_cancelled": 0,
+    "streams_failed": 0,
+    "tokens_received": 0,
+    "frames_sent": 0,
+}
+
+
+class WebSocketReader:
+    """
+    Reads a websocket in a background task
+
+    Incoming text messages are queued for the handler, and a disconnect is
+    noticed as soon as it happens instead of on the next send or receive.
+    This lets the handler cancel work (such as an LLM stream) for a client
+    that has gone away.
+    """
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.disconnected = asyncio.Event()
+        self.close_code: Optional[int] = None
+        self._messages: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._read())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _read(self) -> None:
+        try:
+            while True:
+                message = await self.websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    self.close_code = message.get("code")
+                    break
+                if message.get("text") is not None:
+                    await self._messages.put(message["text"])
+                elif message.get("bytes") is not None:
+                    await self._messages.put(message["bytes"].decode("utf-8", errors="replace"))
+        except Exception:
+            # A broken transport counts as a disconnect
+            pass
+        finally:
+            self.disconnected.set()
+            self._messages.put_nowait(None)
+
+    async def receive_text(self) -> str:
+        """Return the next text message, raising WebSocketDisconnect once the client is gone"""
+        message = await self._messages.get()
+        if message is None:
+            # Leave the marker in place for any later caller
+            self._messages.put_nowait(None)
+            raise WebSocketDisconnect(code=self.close_code or 1000)
+        return message
+
+    async def run_unless_disconnected(self, coro: Awaitable[T]) -> T:
+        """Run ``coro``, cancelling it promptly if the client disconnects"""
+        task = asyncio.ensure_future(coro)
+        disconnect = asyncio.ensure_future(self.disconnected.wait())
+        try:
+            await asyncio.wait({task, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+        except BaseException:
+            task.cancel()
+            raise
+        finally:
+            disconnect.cancel()
+
+        if not task.done():
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+            raise WebSocketDisconnect(code=self.close_code or 1000)
+        return task.result()
+
+
+class FrameCoalescer:
+    """
+    Batches streamed tokens into websocket chunk frames
+
+    The first token is sent immediately so time-to-first-token is not
+    affected. After that, tokens are buffered and flushed when either
+    ``window_ms`` has passed since the last frame or the buffer reaches
+    ``max_bytes``, whichever comes first.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str], Awaitable[None]],
+        message_id: int,
+        window_ms: int = CHAT_COALESCE_MS,
+        max_bytes: int = CHAT_COALESCE_BYTES
+    ):
+        self._send = send
+        self.message_id = message_id
+        self.window = min(max(window_ms, 0), MAX_COALESCE_MS) / 1000
+        self.max_bytes = min(max(max_bytes, 1), MAX_COALESCE_BYTES)
+        self.tokens_received = 0
+        self.frames_sent = 0
+        self._buffer: List[str] = []
+        self._buffered_bytes = 0
+        self._last_flush = 0.0
+        self._timer: Optional[asyncio.Task] = None
+        # Keeps frames in order when the timer and a push flush at the same time
+        self._lock = asyncio.Lock()
+
+    async def push(self, chunk: str) -> None:
+        """Add a token, sending a frame if the batch is due"""
+        self.tokens_received += 1
+        self._buffer.append(chunk)
+        self._buffered_bytes += len(chunk.encode("utf-8"))
+
+        elapsed = time.monotonic() - self._last_flush
+        if not self.frames_sent or self._buffered_bytes >= self.max_bytes or elapsed >= self.window:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later(self.window - elapsed))
+
+    async def _flush_later(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        self._timer = None
+        try:
+            await self.flush()
+        except Exception:
+            # Send failures surface on the streaming path or through the reader
+            pass
+
+    async def flush(self) -> None:
+        """Send everything buffered as a single frame"""
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+            self._timer = None
+        if not self._buffer:
+            return
+
+        chunk = "".join(self._buffer)
+        self._buffer.clear()
+        self._buffered_bytes = 0
+        async with self._lock:
+            await self._send(json.dumps({
+                "message_id": self.message_id,
+                "chunk": chunk,
+                "type": "chunk"
+            }))
+        self.frames_sent += 1
+        self._last_flush = time.monotonic()
+
+    def cancel(self) -> None:
+        """Stop the pending timer without sending anything"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def record(self) -> None:
+        """Add this stream's counts to the process-wide counters"""
+        chat_stream_stats["tokens_received"] += self.tokens_received
+        chat_stream_stats["frames_sent"] += self.frames_sent
+
+
+def stream_stats() -> Dict[str, Any]:
+    """Return a snapshot of the chat streaming counters"""
+    return dict(chat_stream_stats)
@@ -0,0 +1,92 @@
+import math
+import os
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configuration
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "2048"))
+CHAT_HISTORY_MAX_TURNS = int(os.getenv("CHAT_HISTORY_MAX_TURNS", "50"))
+CHAT_HISTORY_SEED_MESSAGES = int(os.getenv("CHAT_HISTORY_SEED_MESSAGES", "10"))
+
+# Rough averages for llama-style BPE vocabularies on English text
+CHARS_PER_TOKEN = 4
+TOKENS_PER_MESSAGE = 4
+
+GREETING_PREFIX = "[SYSTEM GREETING"
+
+
+def count_tokens(text: Optional[str]) -> int:
+    """Approximate the number of tokens in a chat message without a tokenizer"""
+    if not text:
+        return TOKENS_PER_MESSAGE
+    return math.ceil(len(text) / CHARS_PER_TOKEN) + TOKENS_PER_MESSAGE
+
+
+def is_greeting(chat_message) -> bool:
+    """Check whether a ChatMessage row holds an automatic session greeting"""
+    metadata = chat_message.message_metadata or {}
+    return bool(metadata.get("is_auto_greeting")) or chat_message.message.startswith(GREETING_PREFIX)
+
+
+class ConversationWindow:
+    """
+    Per-connection chat memory sent to the model as ``history``
+
+    Turns are kept newest-last and trimmed from the oldest end so that the
+    system prompt, the retained turns and the next user prompt stay within
+    the token budget. Prompt size therefore stays bounded however long the
+    session runs.
+    """
+
+    def __init__(
+        self,
+        system_prompt: Optional[str] = None,
+        token_budget: int = CHAT_HISTORY_TOKEN_BUDGET,
+        max_turns: int = CHAT_HISTORY_MAX_TURNS
+    ):
+        self.system_prompt = system_prompt
+        self.token_budget = token_budget
+        # Each turn is (messages, token count)
+        self._turns: Deque[Tuple[List[Dict[str, str]], int]] = deque(maxlen=max_turns)
+
+    @classmethod
+    def from_chat_messages(cls, chat_messages: Iterable, system_prompt: Optional[str] = None, **kwargs) -> "ConversationWindow":
+        """Seed a window from ChatMessage rows in chronological order"""
+        window = cls(system_prompt=system_prompt, **kwargs)
+        for chat_message in chat_messages:
+            if not chat_message.response:
+                continue
+            user_message = None if is_greeting(chat_message) else chat_message.message
+            window.add_turn(user_message, chat_message.response)
+        return window
+
+    def add_turn(self, user_message: Optional[str], assistant_message: str) -> None:
+        """Append a completed exchange; greetings have no user message"""
+        messages = []
+        if user_message:
+            messages.append({"role": "user", "content": user_message})
+        messages.append({"role": "assistant", "content": assistant_message})
+        self._turns.append((messages, sum(count_tokens(m["content"]) for m in messages)))
+
+    def messages(self, next_prompt: str = "") -> List[Dict[str, str]]:
+        """Return the history to send alongside ``next_prompt``"""
+        remaining = self.token_budget - count_tokens(next_prompt)
+        system = []
+        if self.system_prompt:
+            system = [{"role": "system", "content": self.system_prompt}]
+            remaining -= count_tokens(self.system_prompt)
+
+        selected: List[List[Dict[str, str]]] = []
+        for messages, tokens in reversed(self._turns):
+            if tokens > remaining:
+                break
+            selected.append(messages)
+            remaining -= tokens
+
+        history = system
+        for messages in reversed(selected):
+            history.extend(messages)
+        return history
@@ -0,0 +1,82 @@
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from dotenv import load_dotenv
+
+from app.utils.prompt_manager import prompt_manager
+
+load_dotenv()
+
+# Configuration
+GREETING_CACHE_SIZE = int(os.getenv("GREETING_CACHE_SIZE", "1024"))
+GREETING_CACHE_TTL = float(os.getenv("GREETING_CACHE_TTL", "3600"))
+
+# Profile fields that feed into the enhanced chat prompt
+PROFILE_FIELDS = ("current_mood", "primary_concerns", "coping_strategies")
+
+
+class GreetingCache:
+    """
+    TTL/LRU cache of generated chat session greetings
+
+    Entries are keyed by a digest of the prompt version and the profile
+    fields used to build the enhanced prompt, so users with identical
+    context share a greeting and any profile or prompt change produces a
+    new key. There is no per-user invalidation: an entry is shared, so one
+    user's update must not evict it for others, and the updating user
+    already gets a fresh greeting under their new key. Entries for context
+    nobody has any more age out by TTL or LRU.
+    """
+
+    def __init__(self, max_entries: int = GREETING_CACHE_SIZE, ttl: float = GREETING_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(user, prompt_type: str = "ai-chat") -> str:
+        """Digest of the prompt version and the user's profile fields"""
+        profile = getattr(user, "profile", None)
+        fields = [getattr(profile, field, None) if profile else None for field in PROFILE_FIELDS]
+        payload = json.dumps([prompt_type, prompt_manager.get_prompt_version(prompt_type), fields])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return a cached greeting, or None if missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None or entry[1] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key: str, greeting: str) -> None:
+        """Store a greeting, evicting the least recently used entries when full"""
+        self._entries[key] = (greeting, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+# Create a singleton instance
+greeting_cache = GreetingCache()
@@ -0,0 +1,231 @@
+import asyncio
+import itertools
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+from dotenv import load_dotenv
+
+from app.services.conversation import count_tokens
+from app.utils.metrics import Histogram
+
+load_dotenv()
+
+# Configuration
+LLM_MAX_CONCURRENT = int(os.getenv("LLM_MAX_CONCURRENT", "4"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "64"))
+LLM_SHORT_PROMPT_TOKENS = int(os.getenv("LLM_SHORT_PROMPT_TOKENS", "64"))
+
+# Priority classes, lower is served first
+PRIORITY_FIRST_MESSAGE = 0
+PRIORITY_SHORT_PROMPT = 1
+PRIORITY_DEFAULT = 2
+
+QUEUE_DEPTH_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+PositionCallback = Callable[[int], Awaitable[None]]
+
+
+class SchedulerBusy(Exception):
+    """Raised when the wait queue is full"""
+
+
+class _Waiter:
+    __slots__ = ("user_id", "priority", "seq", "enqueued_at", "position", "reported", "granted", "wakeup")
+
+    def __init__(self, user_id: Hashable, priority: int, seq: int):
+        self.user_id = user_id
+        self.priority = priority
+        self.seq = seq
+        self.enqueued_at = time.monotonic()
+        self.position = 0
+        self.reported = 0
+        self.granted = False
+        self.wakeup = asyncio.Event()
+
+
+class LLMScheduler:
+    """
+    Admission control in front of the LLM backend
+
+    At most ``max_concurrent`` generations run at once. Further requests wait
+    in a bounded queue, where each user has their own FIFO and users are
+    served round-robin: every waiting user gets one turn per round, and a
+    user who starts waiting joins the next round. Within a round, first
+    messages of a session go ahead of short prompts, which go ahead of
+    everything else, so priority never lets one user's traffic starve
+    another's.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = LLM_MAX_CONCURRENT,
+        max_queue: int = LLM_MAX_QUEUE,
+        short_prompt_tokens: int = LLM_SHORT_PROMPT_TOKENS
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.short_prompt_tokens = short_prompt_tokens
+        self._active = 0
+        self._waiting = 0
+        # Per-user queues, and the round in which each user is next served
+        self._queues: "OrderedDict[Hashable, Deque[_Waiter]]" = OrderedDict()
+        self._rounds: Dict[Hashable, int] = {}
+        # Round of the most recently admitted waiter
+        self._round = 0
+        self._seq = itertools.count()
+        self._admitted = 0
+        self._rejected = 0
+        self._wait_time = Histogram()
+        self._queue_depth = Histogram(QUEUE_DEPTH_BUCKETS)
+
+    def priority(self, prompt: str, first_message: bool = False) -> int:
+        """Classify a request into a priority class"""
+        if first_message:
+            return PRIORITY_FIRST_MESSAGE
+        if count_tokens(prompt) <= self.short_prompt_tokens:
+            return PRIORITY_SHORT_PROMPT
+        return PRIORITY_DEFAULT
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        user_id: Hashable,
+        prompt: str,
+        first_message: bool = False,
+        on_position: Optional[PositionCallback] = None
+    ):
+        """Hold a generation slot for the duration of the block"""
+        await self.acquire(user_id, prompt, first_message, on_position)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(
+        self,
+        user_id: Hashable,
+        prompt: str,
+        first_message: bool = False,
+        on_position: Optional[PositionCallback] = None
+    ) -> None:
+        """Wait for a generation slot, reporting queue positions via ``on_position``"""
+        self._queue_depth.observe(self._waiting)
+        if self._active < self.max_concurrent and not self._waiting:
+            self._active += 1
+            self._admitted += 1
+            self._wait_time.observe(0.0)
+            return
+
+        if self._waiting >= self.max_queue:
+            self._rejected += 1
+            raise SchedulerBusy("Server busy, please try again shortly")
+
+        waiter = _Waiter(user_id, self.priority(prompt, first_message), next(self._seq))
+        self._enqueue(waiter)
+        self._update_positions()
+
+        try:
+            while True:
+                waiter.wakeup.clear()
+                if waiter.granted:
+                    return
+                if on_position is not None and waiter.reported != waiter.position:
+                    waiter.reported = waiter.position
+                    await on_position(waiter.position)
+                    continue
+                await waiter.wakeup.wait()
+        except BaseException:
+            if waiter.granted:
+                self.release()
+            else:
+                self._remove(waiter)
+                self._update_positions()
+            raise
+
+    def release(self) -> None:
+        """Give a slot back and admit the next waiters"""
+        self._active -= 1
+        granted = False
+        while self._active < self.max_concurrent and self._waiting:
+            waiter, self._round = self._pop_next(self._queues, self._rounds)
+            self._waiting -= 1
+            self._active += 1
+            self._admitted += 1
+            self._wait_time.observe(time.monotonic() - waiter.enqueued_at)
+            waiter.granted = True
+            waiter.wakeup.set()
+            granted = True
+        if granted:
+            self._update_positions()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return current load and queueing histograms"""
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "active": self._active,
+            "waiting": self._waiting,
+            "waiting_users": len(self._queues),
+            "admitted": self._admitted,
+            "rejected": self._rejected,
+            "queue_depth": self._queue_depth.snapshot(),
+            "wait_time_seconds": self._wait_time.snapshot(),
+        }
+
+    def _enqueue(self, waiter: _Waiter) -> None:
+        if waiter.user_id not in self._queues:
+            self._rounds[waiter.user_id] = self._round + 1
+        queue = self._queues.setdefault(waiter.user_id, deque())
+        # Keep each user's queue ordered by priority, FIFO within a class
+        index = len(queue)
+        while index and queue[index - 1].priority > waiter.priority:
+            index -= 1
+        queue.insert(index, waiter)
+        self._waiting += 1
+
+    def _remove(self, waiter: _Waiter) -> None:
+        queue = self._queues.get(waiter.user_id)
+        if queue is None or waiter not in queue:
+            return
+        queue.remove(waiter)
+        self._waiting -= 1
+        if not queue:
+            del self._queues[waiter.user_id]
+            del self._rounds[waiter.user_id]
+
+    @staticmethod
+    def _pop_next(queues: "OrderedDict[Hashable, Deque[_Waiter]]", rounds: Dict[Hashable, int]) -> Tuple[_Waiter, int]:
+        """
+        Take the next waiter and its round, and move its user to the next round
+
+        The earliest round goes first; within a round the best priority,
+        then the earliest arrival.
+        """
+        user_id = min(queues, key=lambda uid: (rounds[uid], queues[uid][0].priority, queues[uid][0].seq))
+        queue = queues[user_id]
+        waiter = queue.popleft()
+        served = rounds[user_id]
+        if queue:
+            rounds[user_id] = served + 1
+        else:
+            del queues[user_id]
+            del rounds[user_id]
+        return waiter, served
+
+    def _update_positions(self) -> None:
+        """Recompute projected queue positions and wake waiters whose position changed"""
+        queues = OrderedDict((user_id, deque(queue)) for user_id, queue in self._queues.items())
+        rounds = dict(self._rounds)
+        order: List[_Waiter] = []
+        while queues:
+            order.append(self._pop_next(queues, rounds)[0])
+        for position, waiter in enumerate(order, start=1):
+            if waiter.position != position:
+                waiter.position = position
+                waiter.wakeup.set()
+
+
+# Create a singleton instance
+llm_scheduler = LLMScheduler()
@@ -1,14 +1,28 @@
 import httpx
-import json
 import asyncio
+import time
+from contextlib import aclosing
 from typing import AsyncGenerator, Dict, Any, List, Optional
 import os
 from dotenv import load_dotenv
 
+from app.logger import get_logger
+from app.utils.ndjson import NDJSONDecoder
+from app.utils.metrics import Histogram
+from app.services.ollama_balancer import OllamaBackend, ollama_balancer
+
 load_dotenv()
 
-# Configuration
-OLLAMA_API_URL = os.getenv("OLLAMA_API_URL", "http://localhost:11434")
+logger = get_logger(__name__)
+
+# Connection pool shared by every chat stream in this process
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "100"))
+OLLAMA_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OLLAMA_MAX_KEEPALIVE_CONNECTIONS", "20"))
+OLLAMA_KEEPALIVE_EXPIRY = float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", "60"))
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "60"))
+OLLAMA_WRITE_TIMEOUT = float(os.getenv("OLLAMA_WRITE_TIMEOUT", "10"))
+OLLAMA_POOL_TIMEOUT = float(os.getenv("OLLAMA_POOL_TIMEOUT", "10"))
 DEFAULT_TOP_P = 0.9
 DEFAULT_MAX_TOKENS = 1000
 
@@ -17,26 +31,149 @@ DEFAULT_MAX_TOKENS = 1000
 DEFAULT_MODEL = "llama3.1"
 DEFAULT_TEMPERATURE = 0.7
 
+# Model residency - keep_alive is sent with every request and refreshed by the keeper
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_WARM_MODELS = [m.strip() for m in os.getenv("OLLAMA_WARM_MODELS", DEFAULT_MODEL).split(",") if m.strip()]
+OLLAMA_KEEPER_INTERVAL = float(os.getenv("OLLAMA_KEEPER_INTERVAL", "600"))
+# Loading a model from disk can take much longer than a normal read
+OLLAMA_WARMUP_TIMEOUT = float(os.getenv("OLLAMA_WARMUP_TIMEOUT", "300"))
+# A request whose load_duration exceeds this counts as a cold start
+OLLAMA_COLD_LOAD_SECONDS = float(os.getenv("OLLAMA_COLD_LOAD_SECONDS", "0.5"))
+
+# Fields of the final "done" record reported back to callers
+DONE_STATS_FIELDS = (
+    "total_duration",
+    "load_duration",
+    "prompt_eval_count",
+    "prompt_eval_duration",
+    "eval_count",
+    "eval_duration",
+)
+
 class OllamaService:
     """Service for interacting with Ollama models"""
     
+    # Process-wide HTTP client, opened on application startup
+    _client: Optional[httpx.AsyncClient] = None
+    _stats: Dict[str, int] = {
+        "requests": 0,
+        "active_streams": 0,
+        "connections_opened": 0,
+        "errors": 0,
+    }
+    # Time-to-first-token histograms per model, split into cold and warm starts
+    _ttft: Dict[str, Dict[str, Histogram]] = {}
+    _warmups: Dict[str, Dict[str, Any]] = {}
+    _keeper_task: Optional[asyncio.Task] = None
+    
+    @classmethod
+    async def startup(cls) -> None:
+        """Open the shared connection pool"""
+        if cls._client is None:
+            cls._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=OLLAMA_MAX_CONNECTIONS,
+                    max_keepalive_connections=OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=OLLAMA_KEEPALIVE_EXPIRY,
+                ),
+                timeout=httpx.Timeout(
+                    connect=OLLAMA_CONNECT_TIMEOUT,
+                    read=OLLAMA_READ_TIMEOUT,
+                    write=OLLAMA_WRITE_TIMEOUT,
+                    pool=OLLAMA_POOL_TIMEOUT,
+                ),
+            )
+            ollama_balancer.start(cls.get_client)
+    
+    @classmethod
+    async def start_keeper(cls) -> None:
+        """Preload the configured models and keep them resident"""
+        if cls._keeper_task is None and OLLAMA_WARM_MODELS:
+            cls._keeper_task = asyncio.create_task(cls._keep_warm())
+    
+    @classmethod
+    async def shutdown(cls) -> None:
+        """Close the shared connection pool"""
+        if cls._keeper_task is not None:
+            cls._keeper_task.cancel()
+            # Let a warm-up in progress unwind before its client is closed
+            try:
+                await cls._keeper_task
+            except asyncio.CancelledError:
+                pass
+            cls._keeper_task = None
+        await ollama_balancer.stop()
+        if cls._client is not None:
+            await cls._client.aclose()
+            cls._client = None
+    
+    @classmethod
+    async def get_client(cls) -> httpx.AsyncClient:
+        """Return the shared client, opening it lazily outside the app lifecycle"""
+        if cls._client is None:
+            await cls.startup()
+        return cls._client
+    
+    @classmethod
+    def is_retryable(cls, error: httpx.HTTPError) -> bool:
+        """Whether a failed request should eject its backend and move to another one"""
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code >= 500
+        return isinstance(error, httpx.TransportError)
+    
+    @classmethod
+    def pool_stats(cls) -> Dict[str, Any]:
+        """Return connection pool configuration and usage counters"""
+        stats: Dict[str, Any] = {
+            "open": cls._client is not None,
+            "max_connections": OLLAMA_MAX_CONNECTIONS,
+            "max_keepalive_connections": OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+            "keepalive_expiry": OLLAMA_KEEPALIVE_EXPIRY,
+            **cls._stats,
+        }
+        # httpx does not expose its pool publicly, so read it defensively
+        pool = getattr(getattr(cls._client, "_transport", None), "_pool", None)
+        connections = getattr(pool, "connections", None)
+        if connections is not None:
+            stats["connections"] = len(connections)
+            stats["idle_connections"] = sum(1 for conn in connections if conn.is_idle())
+        return stats
+    
+    @classmethod
+    async def _trace(cls, event_name: str, info: Dict[str, Any]) -> None:
+        """httpcore trace hook used to count new TCP connections"""
+        if event_name == "connection.connect_tcp.complete":
+            cls._stats["connections_opened"] += 1
+    
     @staticmethod
+    def _handle_record(chunk_data: Dict[str, Any], stats: Optional[Dict[str, Any]]) -> bool:
+        """Record final stats and report whether the record carries content"""
+        if chunk_data.get("done") and stats is not None:
+            stats.update({key: chunk_data[key] for key in DONE_STATS_FIELDS if key in chunk_data})
+        message = chunk_data.get("message")
+        return bool(message and message.get("content"))
+    
+    @classmethod
     async def generate_stream(
+        cls,
         prompt: str,
         model: str = DEFAULT_MODEL,
         system_prompt: Optional[str] = None,
         temperature: float = DEFAULT_TEMPERATURE,
         top_p: float = DEFAULT_TOP_P,
         max_tokens: int = DEFAULT_MAX_TOKENS,
-        history: Optional[List[Dict[str, str]]] = None
+        history: Optional[List[Dict[str, str]]] = None,
+        stats: Optional[Dict[str, Any]] = None
     ) -> AsyncGenerator[str, None]:
         """
         Generate a streaming response from Ollama models
+        
+        If a ``stats`` dict is given it is filled with the generation
+        statistics from Ollama's final ``done`` record (eval_count,
+        eval_duration, ...) once the stream completes.
         """
         if history is None:
             history = []
-            
-        url = f"{OLLAMA_API_URL}/api/chat"
         
         payload = {
             "model": model,
@@ -46,38 +183,162 @@ class OllamaService:
                 "temperature": temperature,
                 "top_p": top_p,
                 "num_predict": max_tokens
-            }
+            },
+            "keep_alive": OLLAMA_KEEP_ALIVE
         }
         
         if system_prompt:
             payload["system"] = system_prompt
-            
-        async with httpx.AsyncClient() as client:
-            async with client.stream("POST", url, json=payload, timeout=60.0) as response:
+        
+        # Route to the least loaded backend; if one fails before producing
+        # any output, eject it and retry the request on another backend
+        tried: List[OllamaBackend] = []
+        while True:
+            backend = ollama_balancer.choose(model, exclude=tried)
+            tried.append(backend)
+            produced = False
+            try:
+                with ollama_balancer.lease(backend):
+                    # aclosing makes sure the upstream HTTP stream is closed as soon as we stop
+                    async with aclosing(cls._stream_backend(backend, payload, stats)) as stream:
+                        async for content in stream:
+                            produced = True
+                            yield content
+                ollama_balancer.report_success(backend)
+                return
+            except httpx.HTTPError as e:
+                if not cls.is_retryable(e):
+                    raise
+                ollama_balancer.report_failure(backend, str(e))
+                if produced or len(tried) >= len(ollama_balancer.backends):
+                    raise
+    
+    @classmethod
+    async def _stream_backend(
+        cls,
+        backend: OllamaBackend,
+        payload: Dict[str, Any],
+        stats: Optional[Dict[str, Any]]
+    ) -> AsyncGenerator[str, None]:
+        """Stream a chat completion from a single backend"""
+        client = await cls.get_client()
+        cls._stats["requests"] += 1
+        cls._stats["active_streams"] += 1
+        started = time.monotonic()
+        first_token_at: Optional[float] = None
+        done_stats: Dict[str, Any] = {}
+        try:
+            async with client.stream(
+                "POST", f"{backend.url}/api/chat", json=payload, extensions={"trace": cls._trace}
+            ) as response:
                 response.raise_for_status()
                 
-                buffer = ""
-                async for chunk in response.aiter_text():
-                    try:
-                        # Process each chunk from Ollama's streaming API
-                        if chunk.strip():
-                            chunk_data = json.loads(chunk)
-                            if "message" in chunk_data and "content" in chunk_data["message"]:
-                                content = chunk_data["message"]["content"]
-                                yield content
-                            elif "done" in chunk_data and chunk_data["done"]:
-                                break
-                    except json.JSONDecodeError:
-                        # If we get an incomplete JSON, buffer it
-                        buffer += chunk
-                        try:
-                            chunk_data = json.loads(buffer)
-                            buffer = ""
-                            if "message" in chunk_data and "content" in chunk_data["message"]:
-                                content = chunk_data["message"]["content"]
-                                yield content
-                            elif "done" in chunk_data and chunk_data["done"]:
-                                break
-                        except json.JSONDecodeError:
-                            # Still incomplete, continue buffering
-                            continue 
\ No newline at end of file
+                decoder = NDJSONDecoder()
+                finished = False
+                async for chunk in response.aiter_bytes():
+                    for chunk_data in decoder.feed(chunk):
+                        if cls._handle_record(chunk_data, done_stats):
+                            if first_token_at is None:
+                                first_token_at = time.monotonic()
+                            yield chunk_data["message"]["content"]
+                        finished = finished or bool(chunk_data.get("done"))
+                    if finished:
+                        break
+                if not finished:
+                    for chunk_data in decoder.flush():
+                        if cls._handle_record(chunk_data, done_stats):
+                            if first_token_at is None:
+                                first_token_at = time.monotonic()
+                            yield chunk_data["message"]["content"]
+        except httpx.HTTPError:
+            cls._stats["errors"] += 1
+            raise
+        finally:
+            cls._stats["active_streams"] -= 1
+        
+        if stats is not None:
+            stats.update(done_stats)
+        if first_token_at is not None:
+            cls._record_ttft(payload["model"], first_token_at - started, done_stats)
+    
+    @classmethod
+    def _record_ttft(cls, model: str, ttft: float, done_stats: Dict[str, Any]) -> None:
+        """Record time-to-first-token, split by whether the model had to be loaded"""
+        cold = done_stats.get("load_duration", 0) / 1e9 >= OLLAMA_COLD_LOAD_SECONDS
+        histograms = cls._ttft.setdefault(model, {"cold": Histogram(), "warm": Histogram()})
+        histograms["cold" if cold else "warm"].observe(ttft)
+    
+    @classmethod
+    async def warm_up(cls, models: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Load models into memory on every healthy backend and refresh keep_alive
+        
+        An empty-prompt /api/generate call makes Ollama load the model without
+        generating anything.
+        """
+        client = await cls.get_client()
+        results = []
+        for backend in ollama_balancer.backends:
+            if not backend.healthy:
+                continue
+            for model in models or OLLAMA_WARM_MODELS:
+                started = time.monotonic()
+                try:
+                    response = await client.post(
+                        f"{backend.url}/api/generate",
+                        json={"model": model, "prompt": "", "keep_alive": OLLAMA_KEEP_ALIVE},
+                        timeout=OLLAMA_WARMUP_TIMEOUT,
+                    )
+                    response.raise_for_status()
+                    data = response.json()
+                except httpx.HTTPError as e:
+                    logger.warning(f"Failed to warm up {model} on {backend.url}: {str(e)}")
+                    results.append({"backend": backend.url, "model": model, "error": str(e)})
+                    continue
+                result = {
+                    "backend": backend.url,
+                    "model": model,
+                    "seconds": time.monotonic() - started,
+                    "load_seconds": data.get("load_duration", 0) / 1e9,
+                }
+                cls._warmups[f"{model}@{backend.url}"] = result
+                results.append(result)
+        return results
+    
+    @classmethod
+    async def _keep_warm(cls) -> None:
+        """Periodically re-load configured models so keep_alive never lapses"""
+        while True:
+            try:
+                await cls.warm_up()
+            except Exception as e:
+                logger.error(f"Model keeper error: {str(e)}")
+            await asyncio.sleep(OLLAMA_KEEPER_INTERVAL)
+    
+    @classmethod
+    async def resident_models(cls) -> Dict[str, Any]:
+        """Return the models currently loaded on each backend along with TTFT statistics"""
+        client = await cls.get_client()
+        backends = {}
+        for backend in ollama_balancer.backends:
+            try:
+                response = await client.get(f"{backend.url}/api/ps", timeout=ollama_balancer.probe_timeout)
+                response.raise_for_status()
+                backends[backend.url] = [
+                    {
+                        "name": entry.get("name"),
+                        "size_vram": entry.get("size_vram"),
+                        "expires_at": entry.get("expires_at"),
+                    }
+                    for entry in response.json().get("models", [])
+                ]
+            except httpx.HTTPError as e:
+                backends[backend.url] = {"error": str(e)}
+        return {
+            "backends": backends,
+            "warmups": list(cls._warmups.values()),
+            "time_to_first_token": {
+                model: {kind: histogram.snapshot() for kind, histogram in histograms.items()}
+                for model, histograms in cls._ttft.items()
+            },
+        }
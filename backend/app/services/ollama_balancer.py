@@ -0,0 +1,198 @@
+import asyncio
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+import httpx
+from dotenv import load_dotenv
+
+from app.logger import get_logger
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+# Configuration - OLLAMA_API_URLS is a comma separated list, OLLAMA_API_URL is kept for single-instance setups
+OLLAMA_API_URLS = [
+    url.strip().rstrip("/")
+    for url in (os.getenv("OLLAMA_API_URLS") or os.getenv("OLLAMA_API_URL", "http://localhost:11434")).split(",")
+    if url.strip()
+]
+OLLAMA_PROBE_INTERVAL = float(os.getenv("OLLAMA_PROBE_INTERVAL", "15"))
+OLLAMA_PROBE_TIMEOUT = float(os.getenv("OLLAMA_PROBE_TIMEOUT", "2"))
+OLLAMA_EJECT_BASE_SECONDS = float(os.getenv("OLLAMA_EJECT_BASE_SECONDS", "5"))
+OLLAMA_EJECT_MAX_SECONDS = float(os.getenv("OLLAMA_EJECT_MAX_SECONDS", "300"))
+
+
+class NoBackendAvailable(Exception):
+    """Raised when every Ollama backend has already been tried"""
+
+
+class OllamaBackend:
+    """Routing state for a single Ollama instance"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.healthy = True
+        self.failures = 0
+        self.ejected_until = 0.0
+        # Models pulled on the instance (/api/tags) and loaded in memory (/api/ps)
+        self.models: Set[str] = set()
+        self.loaded: Set[str] = set()
+        self.last_probe: Optional[float] = None
+        self.requests = 0
+        self.errors = 0
+
+    def affinity(self, model: str) -> int:
+        """Lower is better: model resident, model pulled, inventory unknown, model missing"""
+        if model in self.loaded:
+            return 0
+        if model in self.models:
+            return 1
+        if self.last_probe is None:
+            return 2
+        return 3
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "failures": self.failures,
+            "ejected_for": max(0.0, self.ejected_until - time.monotonic()) if not self.healthy else 0.0,
+            "models": sorted(self.models),
+            "loaded": sorted(self.loaded),
+        }
+
+
+class OllamaBalancer:
+    """
+    Least-outstanding-requests routing across several Ollama instances
+
+    Backends that already have the requested model resident are preferred,
+    based on periodic /api/tags and /api/ps probes. A backend that fails is
+    ejected with exponential backoff and only brought back by a successful
+    probe once its backoff has expired.
+    """
+
+    def __init__(
+        self,
+        urls: Iterable[str] = OLLAMA_API_URLS,
+        probe_interval: float = OLLAMA_PROBE_INTERVAL,
+        probe_timeout: float = OLLAMA_PROBE_TIMEOUT,
+        eject_base_seconds: float = OLLAMA_EJECT_BASE_SECONDS,
+        eject_max_seconds: float = OLLAMA_EJECT_MAX_SECONDS
+    ):
+        self.backends = [OllamaBackend(url) for url in urls]
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.eject_base_seconds = eject_base_seconds
+        self.eject_max_seconds = eject_max_seconds
+        self._probe_task: Optional[asyncio.Task] = None
+
+    def choose(self, model: str, exclude: Iterable[OllamaBackend] = ()) -> OllamaBackend:
+        """Pick the backend a new stream for ``model`` should go to"""
+        excluded = set(id(backend) for backend in exclude)
+        candidates = [backend for backend in self.backends if id(backend) not in excluded]
+        if not candidates:
+            raise NoBackendAvailable("No Ollama backend available")
+
+        healthy = [backend for backend in candidates if backend.healthy]
+        if not healthy:
+            # Everything is ejected; try the one that is due back first rather than failing outright
+            return min(candidates, key=lambda backend: backend.ejected_until)
+
+        return min(
+            healthy,
+            key=lambda backend: (backend.affinity(model), backend.outstanding, backend.requests)
+        )
+
+    @contextmanager
+    def lease(self, backend: OllamaBackend):
+        """Count a request as outstanding on ``backend`` while the block runs"""
+        backend.outstanding += 1
+        backend.requests += 1
+        try:
+            yield backend
+        finally:
+            backend.outstanding -= 1
+
+    def report_success(self, backend: OllamaBackend) -> None:
+        backend.failures = 0
+
+    def report_failure(self, backend: OllamaBackend, reason: str = "") -> None:
+        """Eject a backend with exponential backoff"""
+        backend.errors += 1
+        backend.failures += 1
+        backoff = min(self.eject_base_seconds * 2 ** (backend.failures - 1), self.eject_max_seconds)
+        backend.healthy = False
+        backend.ejected_until = time.monotonic() + backoff
+        logger.warning(f"Ejecting Ollama backend {backend.url} for {backoff:.0f}s: {reason}")
+
+    async def probe(self, client: httpx.AsyncClient) -> None:
+        """Refresh model inventory and health for every backend"""
+        await asyncio.gather(*(self._probe_backend(client, backend) for backend in self.backends))
+
+    async def _probe_backend(self, client: httpx.AsyncClient, backend: OllamaBackend) -> None:
+        try:
+            tags, ps = await asyncio.gather(
+                client.get(f"{backend.url}/api/tags", timeout=self.probe_timeout),
+                client.get(f"{backend.url}/api/ps", timeout=self.probe_timeout),
+            )
+            tags.raise_for_status()
+            ps.raise_for_status()
+        except httpx.HTTPError as e:
+            if backend.healthy or time.monotonic() >= backend.ejected_until:
+                self.report_failure(backend, f"probe failed: {str(e)}")
+            return
+
+        backend.models = self._model_names(tags.json())
+        backend.loaded = self._model_names(ps.json())
+        backend.last_probe = time.monotonic()
+        if not backend.healthy and backend.last_probe >= backend.ejected_until:
+            backend.healthy = True
+            logger.info(f"Ollama backend {backend.url} is back in rotation")
+
+    @staticmethod
+    def _model_names(data: Dict[str, Any]) -> Set[str]:
+        names = set()
+        for entry in data.get("models", []):
+            name = entry.get("name") or entry.get("model")
+            if name:
+                names.add(name)
+                # "llama3.1:latest" should also match requests for "llama3.1"
+                if name.endswith(":latest"):
+                    names.add(name[:-len(":latest")])
+        return names
+
+    def start(self, get_client: Callable[[], Awaitable[httpx.AsyncClient]]) -> None:
+        """Start the periodic probe loop"""
+        if self._probe_task is None:
+            self._probe_task = asyncio.create_task(self._probe_loop(get_client))
+
+    async def stop(self) -> None:
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            try:
+                await self._probe_task
+            except asyncio.CancelledError:
+                pass
+            self._probe_task = None
+
+    async def _probe_loop(self, get_client: Callable[[], Awaitable[httpx.AsyncClient]]) -> None:
+        while True:
+            try:
+                await self.probe(await get_client())
+            except Exception as e:
+                logger.error(f"Ollama probe loop error: {str(e)}")
+            await asyncio.sleep(self.probe_interval)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [backend.to_dict() for backend in self.backends]
+
+
+# Create a singleton instance
+ollama_balancer = OllamaBalancer()
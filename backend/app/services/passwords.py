@@ -0,0 +1,144 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+from dotenv import load_dotenv
+from passlib.context import CryptContext
+from passlib.exc import UnknownHashError
+
+from app.utils.metrics import Histogram
+
+load_dotenv()
+
+T = TypeVar("T")
+
+# Configuration
+# bcrypt cost factor; hashes made with any other cost are upgraded on the user's next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Threads doing bcrypt work, i.e. at most this many cores spent on hashing
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+# Operations allowed to wait for a thread before new ones are refused
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+
+
+class PasswordServiceBusy(Exception):
+    """Raised when the hashing queue is full"""
+
+
+class PasswordService:
+    """
+    bcrypt hashing and verification off the event loop
+
+    Uses one CryptContext for the life of the process and runs every hash
+    on its own small thread pool, so a burst of logins or sign-ups is
+    limited to ``workers`` cores and does not take threads from Starlette's
+    threadpool or stall the event loop. Up to ``max_queue`` operations may
+    wait for a thread; past that, calls fail fast with PasswordServiceBusy.
+    """
+
+    def __init__(
+        self,
+        rounds: int = BCRYPT_ROUNDS,
+        workers: int = PASSWORD_HASH_WORKERS,
+        max_queue: int = PASSWORD_HASH_MAX_QUEUE
+    ):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_queue = max_queue
+        # min/max pinned to the configured cost so verify_and_update flags any other cost for rehashing
+        self.context = CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__default_rounds=rounds,
+            bcrypt__min_rounds=rounds,
+            bcrypt__max_rounds=rounds,
+        )
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        # Submitted and not yet finished, counted until the thread is done even if the caller gave up
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._counts = {"hashes": 0, "verifications": 0, "failed_verifications": 0, "rehashes": 0, "rejected": 0}
+        self._queue_wait = Histogram()
+        self._duration = Histogram()
+
+    async def hash(self, password: str) -> str:
+        """Hash a password for storing"""
+        hashed = await self._run(self.context.hash, password)
+        self._counts["hashes"] += 1
+        return hashed
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        """Check a password against a stored hash"""
+        valid, _ = await self.verify_and_update(password, hashed_password)
+        return valid
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Check a password, returning ``(valid, new_hash)``
+
+        ``new_hash`` is set when the stored hash was made with different
+        cost parameters and should be replaced.
+        """
+        valid, new_hash = await self._run(self._verify_and_update, password, hashed_password)
+        self._counts["verifications"] += 1
+        if not valid:
+            self._counts["failed_verifications"] += 1
+        elif new_hash is not None:
+            self._counts["rehashes"] += 1
+        return valid, new_hash
+
+    def _verify_and_update(self, password: str, hashed_password: Optional[str]) -> Tuple[bool, Optional[str]]:
+        if not hashed_password:
+            return False, None
+        try:
+            return self.context.verify_and_update(password, hashed_password)
+        except (UnknownHashError, ValueError):
+            # A malformed stored hash never matches
+            return False, None
+
+    async def _run(self, fn: Callable[..., T], *args: Any) -> T:
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                self._counts["rejected"] += 1
+                raise PasswordServiceBusy("Server busy, please try again shortly")
+            self._pending += 1
+
+        submitted = time.perf_counter()
+
+        def timed() -> T:
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self._queue_wait.observe(started - submitted)
+                    self._duration.observe(time.perf_counter() - started)
+
+        future = self._executor.submit(timed)
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue occupancy, counters and wait/duration histograms"""
+        return {
+            "rounds": self.rounds,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "pending": self._pending,
+            **self._counts,
+            "queue_wait_seconds": self._queue_wait.snapshot(),
+            "duration_seconds": self._duration.snapshot(),
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Create a singleton instance
+password_service = PasswordService()
@@ -0,0 +1,239 @@
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict
+from dotenv import load_dotenv
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import OAuth2PasswordRequestForm
+
+from app.auth.utils import TokenPrincipal, get_current_principal
+from app.logger import get_logger
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+# Configuration
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+# Shared Redis (or Redis-compatible) backend for multi-worker deployments; empty keeps buckets in-process
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "")
+# Upper bound on in-process buckets; idle (full) buckets are dropped long before this
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# Policies as "<requests>/<seconds>": bursts of up to <requests>, refilled evenly over <seconds>
+RATE_LIMIT_LOGIN_IP = os.getenv("RATE_LIMIT_LOGIN_IP", "20/60")
+RATE_LIMIT_LOGIN_USER = os.getenv("RATE_LIMIT_LOGIN_USER", "5/60")
+RATE_LIMIT_LLM = os.getenv("RATE_LIMIT_LLM", "10/60")
+RATE_LIMIT_VOTE = os.getenv("RATE_LIMIT_VOTE", "30/60")
+
+
+class RatePolicy:
+    """A named token bucket: ``capacity`` requests at once, refilled at ``rate`` per second"""
+
+    def __init__(self, name: str, spec: str):
+        requests, _, seconds = spec.partition("/")
+        self.name = name
+        self.capacity = float(requests)
+        self.rate = self.capacity / float(seconds or 1)
+        if self.capacity <= 0 or self.rate <= 0:
+            raise ValueError(f"Invalid rate limit for {name}: {spec!r}")
+
+    @property
+    def idle_seconds(self) -> float:
+        """Time for an empty bucket to refill; a bucket idle this long is indistinguishable from a new one"""
+        return self.capacity / self.rate
+
+    def __repr__(self) -> str:
+        return f"{self.name}({self.capacity:g}/{self.idle_seconds:g}s)"
+
+
+LOGIN_IP_POLICY = RatePolicy("login_ip", RATE_LIMIT_LOGIN_IP)
+LOGIN_USER_POLICY = RatePolicy("login_user", RATE_LIMIT_LOGIN_USER)
+# One bucket per user across every endpoint that calls Gemini or Ollama
+LLM_POLICY = RatePolicy("llm", RATE_LIMIT_LLM)
+VOTE_POLICY = RatePolicy("vote", RATE_LIMIT_VOTE)
+
+
+class MemoryBackend:
+    """
+    Token buckets held in this process
+
+    Each key costs one ``[tokens, updated, full_at]`` entry, kept in
+    last-use order. A bucket that has refilled completely carries no
+    information, so entries at the old end are dropped once past their
+    ``full_at``; that check is amortised over ``take`` calls and keeps
+    memory proportional to the keys active within one refill period.
+    """
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+        self.evictions = 0
+        self.overflows = 0
+
+    async def take(self, key: str, policy: RatePolicy, cost: float = 1) -> float:
+        """Take ``cost`` tokens; return 0 if allowed, otherwise the seconds until they are available"""
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            tokens = policy.capacity
+        else:
+            tokens = min(policy.capacity, bucket[0] + (now - bucket[1]) * policy.rate)
+            self._buckets.move_to_end(key)
+
+        retry_after = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            retry_after = (cost - tokens) / policy.rate
+        self._buckets[key] = [tokens, now, now + (policy.capacity - tokens) / policy.rate]
+        self._evict(now)
+        return retry_after
+
+    def _evict(self, now: float) -> None:
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if bucket[2] <= now:
+                self.evictions += 1
+            elif len(self._buckets) > self.max_keys:
+                # Dropping a partly drained bucket gives its client a fresh one
+                self.overflows += 1
+            else:
+                break
+            del self._buckets[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "memory", "keys": len(self._buckets), "max_keys": self.max_keys, "evictions": self.evictions, "overflows": self.overflows}
+
+    async def close(self) -> None:
+        pass
+
+
+class RedisBackend:
+    """
+    Token buckets in Redis, shared by every worker
+
+    One hash per key, updated atomically by a Lua script using the Redis
+    server clock, and set to expire once the bucket would be full again.
+    Needs the ``redis`` package; any server that speaks the Redis protocol
+    and supports EVAL can stand in locally (e.g. ``redis-server`` or
+    ``valkey-server`` on localhost).
+    """
+
+    # KEYS[1] bucket; ARGV capacity, rate per second, cost. Returns {allowed, retry_after_ms}
+    SCRIPT = """
+    local capacity = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local cost = tonumber(ARGV[3])
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = capacity
+    if bucket[1] then
+        tokens = math.min(capacity, tonumber(bucket[1]) + (now - tonumber(bucket[2])) * rate)
+    end
+    local retry_after = 0
+    if tokens >= cost then
+        tokens = tokens - cost
+    else
+        retry_after = (cost - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+    redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+    return {retry_after == 0 and 1 or 0, math.ceil(retry_after * 1000)}
+    """
+
+    def __init__(self, client, prefix: str = "ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+        self._script = client.register_script(self.SCRIPT)
+        self.errors = 0
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisBackend":
+        import redis.asyncio as redis
+        return cls(redis.from_url(url))
+
+    async def take(self, key: str, policy: RatePolicy, cost: float = 1) -> float:
+        try:
+            allowed, retry_after_ms = await self._script(keys=[self.prefix + key], args=[policy.capacity, policy.rate, cost])
+        except Exception as e:
+            # An unreachable limiter should not take the endpoints down with it
+            self.errors += 1
+            logger.error(f"Rate limit backend error, allowing request: {str(e)}")
+            return 0.0
+        return 0.0 if allowed else max(retry_after_ms / 1000, 0.001)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "redis", "errors": self.errors}
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+class RateLimiter:
+    """Applies rate policies to keys and keeps per-policy counters"""
+
+    def __init__(self, backend, enabled: bool = RATE_LIMIT_ENABLED):
+        self.backend = backend
+        self.enabled = enabled
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    async def hit(self, policy: RatePolicy, key: str) -> None:
+        """Count a request against ``key``'s bucket, raising 429 with Retry-After if it is empty"""
+        if not self.enabled:
+            return
+        retry_after = await self.backend.take(f"{policy.name}:{key}", policy)
+        counts = self._counts.setdefault(policy.name, {"allowed": 0, "limited": 0})
+        if retry_after <= 0:
+            counts["allowed"] += 1
+            return
+        counts["limited"] += 1
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests, please try again later",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            **self.backend.stats(),
+            "policies": {
+                policy.name: {"capacity": policy.capacity, "per_second": round(policy.rate, 4), **self._counts.get(policy.name, {"allowed": 0, "limited": 0})}
+                for policy in (LOGIN_IP_POLICY, LOGIN_USER_POLICY, LLM_POLICY, VOTE_POLICY)
+            },
+        }
+
+    async def close(self) -> None:
+        await self.backend.close()
+
+
+# Create a singleton instance
+rate_limiter = RateLimiter(RedisBackend.from_url(RATE_LIMIT_REDIS_URL) if RATE_LIMIT_REDIS_URL else MemoryBackend())
+
+
+def client_ip(request: Request) -> str:
+    """The client address as seen by the server (run uvicorn with --proxy-headers behind a proxy)"""
+    return request.client.host if request.client else "unknown"
+
+
+def limit_by_ip(policy: RatePolicy) -> Callable:
+    """Dependency applying ``policy`` per client IP"""
+    async def dependency(request: Request) -> None:
+        await rate_limiter.hit(policy, f"ip:{client_ip(request)}")
+    return dependency
+
+
+def limit_by_user(policy: RatePolicy) -> Callable:
+    """Dependency applying ``policy`` per authenticated user"""
+    async def dependency(principal: TokenPrincipal = Depends(get_current_principal)) -> None:
+        await rate_limiter.hit(policy, f"user:{principal.id}")
+    return dependency
+
+
+def limit_by_login(policy: RatePolicy) -> Callable:
+    """Dependency applying ``policy`` per username submitted to the login form"""
+    async def dependency(form_data: OAuth2PasswordRequestForm = Depends()) -> None:
+        await rate_limiter.hit(policy, f"login:{form_data.username.lower()}")
+    return dependency
@@ -0,0 +1,244 @@
+import asyncio
+import os
+from collections import defaultdict
+from typing import Any, Dict, Optional, Set, Tuple, Type, TypeVar
+from dotenv import load_dotenv
+from pydantic import BaseModel
+from sqlalchemy import and_, select, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import dialect_insert, new_session
+from app.logger import get_logger
+from app.models.coping import CopingMethod
+from app.models.relaxation import RelaxationExercise
+from app.models.resource import ResourceLink
+from app.models.vote import Vote
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+T = TypeVar("T", bound=BaseModel)
+
+# Configuration
+# Votes an item must get within one flush interval for its counter updates to be buffered; 0 disables buffering
+VOTE_HOT_THRESHOLD = int(os.getenv("VOTE_HOT_THRESHOLD", "20"))
+# How often buffered counter increments are written, i.e. how far a hot item's stored counts may lag
+VOTE_FLUSH_SECONDS = float(os.getenv("VOTE_FLUSH_SECONDS", "2"))
+# Times a vote is retried after a lock timeout or similar contention error before giving up with VoteBusy
+VOTE_LOCK_RETRIES = int(os.getenv("VOTE_LOCK_RETRIES", "3"))
+
+# Counter column for each vote type
+VOTE_COLUMNS = {"upvote": "upvotes", "downvote": "downvotes"}
+
+VOTABLE = {model.__tablename__: model for model in (CopingMethod, RelaxationExercise, ResourceLink)}
+
+ItemKey = Tuple[str, int]
+
+
+class VoteBusy(Exception):
+    """Raised when a vote could not be written because the database stayed locked"""
+
+
+class VoteCounter:
+    """
+    Per-user vote recording and atomic counter maintenance
+
+    A vote is an ``INSERT ... ON CONFLICT DO NOTHING`` into ``votes`` (or,
+    for a changed vote, an UPDATE of the existing row) followed by a single
+    ``UPDATE ... SET upvotes = upvotes + 1 ... RETURNING`` on the item, in
+    one transaction. Repeat votes change nothing, and concurrent votes are
+    never lost because the increment happens in the database.
+
+    Items receiving at least ``hot_threshold`` votes in one flush interval
+    are treated as hot for the next one: their counter increments are
+    summed in memory and written every ``flush_seconds`` instead, so
+    concurrent voters stop queueing on the item's row lock. Vote rows are
+    still written immediately. Buffered increments not yet flushed are
+    lost if the process dies without shutting down.
+    """
+
+    def __init__(
+        self,
+        hot_threshold: int = VOTE_HOT_THRESHOLD,
+        flush_seconds: float = VOTE_FLUSH_SECONDS,
+        lock_retries: int = VOTE_LOCK_RETRIES
+    ):
+        self.hot_threshold = hot_threshold
+        self.flush_seconds = flush_seconds
+        self.lock_retries = lock_retries
+        self._pending: Dict[ItemKey, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        # Votes per item in the current interval, and the items that were hot in the previous one
+        self._window: Dict[ItemKey, int] = defaultdict(int)
+        self._hot: Set[ItemKey] = set()
+        self._task: Optional[asyncio.Task] = None
+        # Set by stop(); the flush loop exits after any flush in progress instead of being cancelled mid-write
+        self._stopping: Optional[asyncio.Event] = None
+        self._counts = {"votes": 0, "duplicates": 0, "changed": 0, "buffered": 0, "flushes": 0, "flush_errors": 0, "lock_retries": 0, "busy": 0}
+
+    @property
+    def buffering(self) -> bool:
+        return self.hot_threshold > 0
+
+    async def vote(self, db: AsyncSession, model, item_id: int, user_id: int, vote_type: str):
+        """
+        Record ``user_id``'s vote on an item and update its counters
+
+        Returns the item, or None (with nothing written) if it does not
+        exist. Counts on the returned item exclude buffered increments; see
+        ``response``. A transaction that fails on a locked database is
+        rolled back and retried up to ``lock_retries`` times, then VoteBusy
+        is raised with nothing written.
+        """
+        self._counts["votes"] += 1
+        for attempt in range(self.lock_retries + 1):
+            try:
+                return await self._vote(db, model, item_id, user_id, vote_type)
+            except OperationalError as e:
+                await db.rollback()
+                if attempt == self.lock_retries:
+                    self._counts["busy"] += 1
+                    logger.warning(f"Vote not recorded, database busy: {str(e)}")
+                    raise VoteBusy("Server busy, please try again shortly")
+                self._counts["lock_retries"] += 1
+                await asyncio.sleep(0.05 * (attempt + 1))
+
+    async def _vote(self, db: AsyncSession, model, item_id: int, user_id: int, vote_type: str):
+        item_type = model.__tablename__
+        column = VOTE_COLUMNS[vote_type]
+        key = (item_type, item_id)
+
+        inserted = (await db.execute(
+            dialect_insert(Vote.__table__)
+            .values(user_id=user_id, item_type=item_type, item_id=item_id, vote_type=vote_type)
+            .on_conflict_do_nothing(index_elements=["user_id", "item_type", "item_id"])
+            .returning(Vote.__table__.c.vote_type)
+        )).first()
+
+        deltas: Dict[str, int] = {}
+        if inserted is not None:
+            deltas[column] = 1
+        elif hasattr(model, "downvotes"):
+            # Switching between upvote and downvote moves the vote from one counter to the other
+            changed = (await db.execute(
+                update(Vote.__table__)
+                .where(and_(
+                    Vote.__table__.c.user_id == user_id,
+                    Vote.__table__.c.item_type == item_type,
+                    Vote.__table__.c.item_id == item_id,
+                    Vote.__table__.c.vote_type != vote_type,
+                ))
+                .values(vote_type=vote_type)
+                .returning(Vote.__table__.c.vote_type)
+            )).first()
+            if changed is not None:
+                deltas = {column: 1, VOTE_COLUMNS["downvote" if vote_type == "upvote" else "upvote"]: -1}
+                self._counts["changed"] += 1
+
+        if self.buffering:
+            self._window[key] += 1
+        buffered = bool(deltas) and key in self._hot
+        if deltas and not buffered:
+            item = (await db.execute(
+                update(model)
+                .where(model.id == item_id)
+                .values({name: getattr(model, name) + delta for name, delta in deltas.items()})
+                .returning(model)
+                .execution_options(synchronize_session=False)
+            )).scalars().first()
+        else:
+            item = (await db.execute(select(model).where(model.id == item_id))).scalars().first()
+
+        if item is None:
+            await db.rollback()
+            return None
+        await db.commit()
+
+        if not deltas:
+            self._counts["duplicates"] += 1
+        elif buffered:
+            # Only once the vote row is committed, so a failed vote is never counted
+            for name, delta in deltas.items():
+                self._pending[key][name] += delta
+            self._counts["buffered"] += 1
+        return item
+
+    def response(self, schema: Type[T], item) -> T:
+        """Serialize an item with its buffered, not yet flushed, increments added"""
+        result = schema.model_validate(item)
+        pending = self._pending.get((item.__tablename__, item.id))
+        if not pending:
+            return result
+        return result.model_copy(update={name: getattr(result, name) + delta for name, delta in pending.items()})
+
+    async def flush(self) -> None:
+        """Write buffered increments and start a new hot-item interval"""
+        self._hot = {key for key, votes in self._window.items() if votes >= self.hot_threshold}
+        self._window = defaultdict(int)
+        pending, self._pending = self._pending, defaultdict(lambda: defaultdict(int))
+        if not pending:
+            return
+
+        db = new_session()
+        try:
+            for (item_type, item_id), deltas in pending.items():
+                model = VOTABLE[item_type]
+                values = {name: getattr(model, name) + delta for name, delta in deltas.items() if delta}
+                if not values:
+                    # A vote and its reversal cancelled out
+                    continue
+                await db.execute(
+                    update(model)
+                    .where(model.id == item_id)
+                    .values(values)
+                    .execution_options(synchronize_session=False)
+                )
+            await db.commit()
+            self._counts["flushes"] += 1
+        except BaseException as e:
+            # Keep the increments for the next attempt, including when the flush is cancelled
+            for key, deltas in pending.items():
+                for name, delta in deltas.items():
+                    self._pending[key][name] += delta
+            if not isinstance(e, Exception):
+                raise
+            self._counts["flush_errors"] += 1
+            await db.rollback()
+            logger.error(f"Vote counter flush failed: {str(e)}")
+        finally:
+            await db.close()
+
+    def start(self) -> None:
+        """Start the periodic flush loop when buffering is enabled"""
+        if self.buffering and self._task is None:
+            self._stopping = asyncio.Event()
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        """Stop the flush loop and write anything still buffered"""
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def _flush_loop(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.flush_seconds)
+            except asyncio.TimeoutError:
+                await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hot_threshold": self.hot_threshold,
+            "flush_seconds": self.flush_seconds,
+            "hot_items": len(self._hot),
+            "pending_items": len(self._pending),
+            **self._counts,
+        }
+
+
+# Create a singleton instance
+vote_counter = VoteCounter()
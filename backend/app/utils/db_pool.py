@@ -0,0 +1,55 @@
+import time
+from typing import Any, Dict
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.utils.metrics import Histogram
+
+# Checkout waits are normally well under a millisecond, so the buckets start low
+CHECKOUT_WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0, 10.0, 30.0)
+
+
+class TimedPoolMixin:
+    """
+    Records how long each checkout waits for a connection
+
+    The wait covers queueing for a free connection and, when the pool has
+    to grow, opening a new one. Checkouts that give up after pool_timeout
+    are counted separately.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkout_wait = Histogram(CHECKOUT_WAIT_BUCKETS)
+        self.timeouts = 0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            self.checkout_wait.observe(time.perf_counter() - started)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return occupancy, limits and the checkout wait histogram"""
+        return {
+            "size": self.size(),
+            "max_overflow": self._max_overflow,
+            "timeout": self._timeout,
+            "checked_out": self.checkedout(),
+            "overflow": max(self.overflow(), 0),
+            "idle": self.checkedin(),
+            "timeouts": self.timeouts,
+            "checkout_wait_seconds": self.checkout_wait.snapshot(),
+        }
+
+
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+    """QueuePool with checkout wait metrics"""
+
+
+class TimedAsyncAdaptedQueuePool(TimedPoolMixin, AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool with checkout wait metrics"""
@@ -0,0 +1,152 @@
+import time
+from typing import Any, Dict, Optional
+from sqlalchemy import exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class ReplicaState:
+    """
+    Availability and routing counters for the read replica
+
+    A replica that fails to serve a query is taken out of rotation for
+    ``retry_seconds``; reads go to the primary until then. Users who wrote
+    recently are pinned to the primary for ``sticky_seconds`` so they read
+    their own writes despite replication lag.
+    """
+
+    def __init__(self, retry_seconds: float, sticky_seconds: float, max_tracked_writers: int = 10000):
+        self.retry_seconds = retry_seconds
+        self.sticky_seconds = sticky_seconds
+        self.max_tracked_writers = max_tracked_writers
+        self.down_until = 0.0
+        self._recent_writers: Dict[Any, float] = {}
+        self._stats = {"replica_reads": 0, "primary_reads": 0, "sticky_reads": 0, "fallbacks": 0}
+
+    def available(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+    def mark_down(self, reason: str) -> None:
+        self.down_until = time.monotonic() + self.retry_seconds
+        self._stats["fallbacks"] += 1
+        logger.warning(f"Read replica unavailable, using primary for {self.retry_seconds:.0f}s: {reason}")
+
+    def record_write(self, user_id: Any) -> None:
+        if user_id is None or self.sticky_seconds <= 0:
+            return
+        now = time.monotonic()
+        if len(self._recent_writers) >= self.max_tracked_writers:
+            cutoff = now - self.sticky_seconds
+            self._recent_writers = {uid: at for uid, at in self._recent_writers.items() if at > cutoff}
+        self._recent_writers[user_id] = now
+
+    def wrote_recently(self, user_id: Any) -> bool:
+        written_at = self._recent_writers.get(user_id)
+        return written_at is not None and time.monotonic() - written_at < self.sticky_seconds
+
+    def count(self, key: str) -> None:
+        self._stats[key] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "available": self.available(),
+            "down_for": max(0.0, self.down_until - time.monotonic()),
+            "sticky_users": sum(1 for uid in list(self._recent_writers) if self.wrote_recently(uid)),
+            **self._stats,
+        }
+
+
+def is_connection_error(error: BaseException) -> bool:
+    """True if the replica could not be reached, as opposed to rejecting the query"""
+    orig = getattr(error, "orig", None)
+    sqlstate = getattr(orig, "pgcode", None) or getattr(orig, "sqlstate", None)
+    # No SQLSTATE means the server never answered; class 08 and 57P are connection and shutdown errors
+    return sqlstate is None or sqlstate.startswith(("08", "57P"))
+
+
+class RoutingSession(Session):
+    """
+    Session that can send reads to a replica
+
+    Everything goes to the primary unless the session has been marked
+    read-only (``session.info["read_only"] = True``; get_read_db does this
+    on a session of its own, never the shared request session). Even then,
+    flushes and any statement that is not a SELECT go to the primary, as do
+    reads after a write in the session or its request session
+    (``info["request_info"]``) and reads by a user who wrote within the
+    sticky window. If the replica cannot be reached the statement is retried
+    on the primary, leaving the session's loaded objects as they were.
+    """
+
+    def __init__(self, primary: Engine, replica: Optional[Engine] = None, replica_state: Optional[ReplicaState] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.primary = primary
+        self.replica = replica
+        self.replica_state = replica_state
+
+    def _request_value(self, key: str) -> Any:
+        """``info[key]`` from this session, else from the request session it reads for"""
+        if key in self.info:
+            return self.info[key]
+        return self.info.get("request_info", {}).get(key)
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._flushing or (clause is not None and not clause.is_select):
+            self.info["wrote"] = True
+            if self.replica_state is not None:
+                self.replica_state.record_write(self._request_value("user_id"))
+            return self.primary
+
+        if self.replica is None or not self.info.get("read_only") or self._request_value("wrote"):
+            return self.primary
+
+        state = self.replica_state
+        if not state.available() or self.info.get("replica_failed"):
+            state.count("primary_reads")
+            return self.primary
+        if state.wrote_recently(self._request_value("user_id")):
+            state.count("sticky_reads")
+            return self.primary
+
+        state.count("replica_reads")
+        self.info["on_replica"] = True
+        return self.replica
+
+    def execute(self, *args, **kwargs):
+        self.info.pop("on_replica", None)
+        try:
+            return super().execute(*args, **kwargs)
+        except (exc.OperationalError, exc.InterfaceError, OSError) as e:
+            # Only retry a read whose replica connection failed; anything else is a real error
+            on_replica = self.info.pop("on_replica", False)
+            if not on_replica or self.info.get("wrote") or not is_connection_error(e):
+                raise
+            self.replica_state.mark_down(str(e))
+            self.info["replica_failed"] = True
+            self._discard_replica_connection()
+            return super().execute(*args, **kwargs)
+
+    def _discard_replica_connection(self) -> None:
+        """
+        Drop a failed replica connection from the session's transaction
+
+        Unlike rollback() this leaves the identity map alone, so objects the
+        caller already loaded are not expired. A connection that failed
+        before it was established was never added and there is nothing to do.
+        """
+        failed = set()
+        transaction = self.get_transaction()
+        while transaction is not None:
+            # SessionTransaction keeps each connection under both the engine and the Connection
+            for key, entry in list(transaction._connections.items()):
+                if entry[0].engine is self.replica:
+                    failed.add(entry[0])
+                    del transaction._connections[key]
+            transaction = transaction.parent
+        for connection in failed:
+            connection.invalidate()
+            connection.close()
@@ -0,0 +1,59 @@
+import json
+from typing import Any
+
+from sqlalchemy import JSON, Boolean, String, bindparam
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql import coercions, roles
+from sqlalchemy.sql.elements import ColumnElement
+from sqlalchemy.sql.visitors import InternalTraversal
+from sqlalchemy.types import TypeDecorator
+
+# JSONB on PostgreSQL, plain JSON elsewhere (SQLite for local runs and benchmarks)
+PortableJSONB = JSON().with_variant(JSONB(), "postgresql")
+
+
+class _ArrayElement(TypeDecorator):
+    """Bind type for json_array_contains: a one-element JSON array on PostgreSQL, the bare value elsewhere"""
+
+    impl = String
+    cache_ok = True
+
+    def process_bind_param(self, value: Any, dialect) -> Any:
+        if dialect.name == "postgresql":
+            return json.dumps([value])
+        return value
+
+
+class json_array_contains(ColumnElement):
+    """
+    True if the JSON array in ``column`` contains ``value``
+
+    Compiles to JSONB containment (``tags @> '["value"]'``) on PostgreSQL,
+    which the GIN indexes on the tag columns can serve, and to a
+    json_each() lookup on SQLite.
+    """
+
+    type = Boolean()
+    inherit_cache = True
+    _traverse_internals = [
+        ("column", InternalTraversal.dp_clauseelement),
+        ("value", InternalTraversal.dp_clauseelement),
+    ]
+
+    def __init__(self, column, value: Any):
+        self.column = coercions.expect(roles.ExpressionElementRole, column)
+        self.value = bindparam(None, value, type_=_ArrayElement(), unique=True)
+
+
+@compiles(json_array_contains, "postgresql")
+def _json_array_contains_postgresql(element, compiler, **kw):
+    return f"{compiler.process(element.column, **kw)} @> CAST({compiler.process(element.value, **kw)} AS JSONB)"
+
+
+@compiles(json_array_contains)
+def _json_array_contains_sqlite(element, compiler, **kw):
+    return (
+        f"EXISTS (SELECT 1 FROM json_each({compiler.process(element.column, **kw)}) "
+        f"WHERE json_each.value = {compiler.process(element.value, **kw)})"
+    )
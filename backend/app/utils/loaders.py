@@ -0,0 +1,38 @@
+import os
+from typing import Callable, Dict
+from dotenv import load_dotenv
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.interfaces import LoaderOption
+
+load_dotenv()
+
+LOADER_STRATEGIES: Dict[str, Callable[..., LoaderOption]] = {
+    "joined": joinedload,
+    "selectin": selectinload,
+}
+
+# Configuration
+# Loading a single user (auth, user detail): a LEFT JOIN returns user and profile in one statement
+AUTH_PROFILE_LOADER = os.getenv("AUTH_PROFILE_LOADER", "joined")
+# Listing users: one extra SELECT ... WHERE user_id IN (...) for the whole page keeps the user rows narrow
+USER_LIST_PROFILE_LOADER = os.getenv("USER_LIST_PROFILE_LOADER", "selectin")
+
+
+def eager_load(attribute, strategy: str) -> LoaderOption:
+    """
+    Loader option for ``attribute`` using the named strategy ("joined" or "selectin")
+
+    Relationships the response reads must be loaded up front: a lazy load
+    fails outright on an AsyncSession and costs a query per row in
+    DB_MODE=sync.
+    """
+    try:
+        return LOADER_STRATEGIES[strategy](attribute)
+    except KeyError:
+        raise ValueError(f"Unknown loader strategy {strategy!r}; expected one of {sorted(LOADER_STRATEGIES)}")
+
+
+# Fail at startup rather than on the first request
+for _strategy in (AUTH_PROFILE_LOADER, USER_LIST_PROFILE_LOADER):
+    if _strategy not in LOADER_STRATEGIES:
+        raise ValueError(f"Unknown loader strategy {_strategy!r}; expected one of {sorted(LOADER_STRATEGIES)}")
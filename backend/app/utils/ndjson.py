@@ -0,0 +1,42 @@
+import json
+from typing import Any, Dict, List
+
+
+class NDJSONDecoder:
+    """
+    Incremental decoder for newline-delimited JSON streams
+
+    Every incoming byte is scanned for newlines once. Each complete line is
+    parsed exactly once and a partial trailing line is held back until its
+    newline arrives, so chunk boundaries never cause objects to be dropped or
+    re-parsed.
+    """
+
+    def __init__(self):
+        # Pieces of the current, still incomplete line
+        self._pending: List[bytes] = []
+
+    def feed(self, data: bytes) -> List[Dict[str, Any]]:
+        """Add a chunk of bytes and return every object completed by it"""
+        if b"\n" not in data:
+            if data:
+                self._pending.append(data)
+            return []
+
+        lines = data.split(b"\n")
+        if self._pending:
+            self._pending.append(lines[0])
+            lines[0] = b"".join(self._pending)
+            self._pending.clear()
+
+        tail = lines.pop()
+        if tail:
+            self._pending.append(tail)
+
+        return [json.loads(line.decode()) for line in lines if line and not line.isspace()]
+
+    def flush(self) -> List[Dict[str, Any]]:
+        """Parse whatever is left once the stream has ended"""
+        line = b"".join(self._pending)
+        self._pending.clear()
+        return [json.loads(line.decode())] if line and not line.isspace() else []
@@ -1,3 +1,4 @@
+import hashlib
 import json
 import os
 from pathlib import Path
@@ -57,6 +58,19 @@ class PromptManager:
         temperature = prompt_data.get("temperature", 0.7)
         return prompt_text, temperature
     
+    def get_prompt_version(self, prompt_type: str = "default") -> str:
+        """
+        Get a version identifier for a prompt type
+        
+        Uses the explicit "version" field from the config when present,
+        otherwise a digest of the prompt text and temperature.
+        """
+        prompt_data = self._prompts.get(prompt_type, self._prompts.get("default", {}))
+        if "version" in prompt_data:
+            return str(prompt_data["version"])
+        prompt_text, temperature = self.get_prompt_data(prompt_type)
+        return hashlib.sha256(f"{temperature}:{prompt_text}".encode("utf-8")).hexdigest()[:16]
+    
     def get_enhanced_prompt(self, user: User, prompt_type: str = "default") -> str:
         """
         Enhance a system prompt with user profile data
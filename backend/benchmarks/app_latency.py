@@ -0,0 +1,154 @@
+"""
+In-process latency benchmark for the whole app on SQLite
+
+Boots the real FastAPI app (all middleware, auth, migrations) against a
+throwaway SQLite database via DATABASE_URL, creates a user, seeds content,
+then drives a set of read endpoints through httpx's ASGI transport and
+reports requests/s and latency percentiles per endpoint. No PostgreSQL,
+Ollama or network is needed, so it is quick enough to run before and
+after a change to the route, middleware or auth layers. SQLite timings are
+not PostgreSQL timings; compare runs with each other, not with production.
+
+Run from the backend directory:
+    python -m benchmarks.app_latency --requests 500 --concurrency 20
+    python -m benchmarks.app_latency --mode sync
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import httpx
+
+ENDPOINTS = [
+    "/",
+    "/api/profiles/me",
+    "/api/profiles/me/mood-history",
+    "/api/coping/list",
+    "/api/coping/list?tag=breathing",
+    "/api/relaxation/list?tag=breathing",
+    "/api/resources/",
+    "/api/chat/history",
+]
+
+
+def configure(args) -> None:
+    """Point the app at the benchmark database; must run before anything under app/ is imported"""
+    os.environ["DATABASE_URL"] = f"sqlite:///{args.db}"
+    os.environ["DB_MODE"] = args.mode
+    os.environ["DB_LOG_ENABLED"] = "true" if args.log_sink else "false"
+    os.environ["DB_AUTO_MIGRATE"] = "true"
+    # Nothing here talks to Ollama; do not start the warm-up keeper
+    os.environ["OLLAMA_WARM_MODELS"] = ""
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+
+def seed(items: int, user_id: int) -> None:
+    from app.database import SessionLocal
+    from app.models.coping import CopingMethod
+    from app.models.relaxation import RelaxationExercise
+    from app.models.resource import ResourceLink
+
+    tags = ["breathing", "grounding", "movement", "sleep", "social"]
+    with SessionLocal() as db:
+        for i in range(items):
+            item_tags = [tags[i % len(tags)], tags[(i + 1) % len(tags)]]
+            db.add(CopingMethod(title=f"Coping method {i}", description="Benchmark item", tags=item_tags))
+            db.add(RelaxationExercise(
+                title=f"Exercise {i}",
+                description="Benchmark item",
+                instructions="Breathe in, breathe out",
+                duration_minutes=5,
+                tags=item_tags,
+            ))
+            db.add(ResourceLink(user_id=user_id, domain="example.com", path=f"/{i}", title=f"Resource {i}"))
+        db.commit()
+
+
+async def login(client: httpx.AsyncClient, create: bool = True) -> Dict[str, Any]:
+    """Create (unless ``create`` is False) and log in the benchmark user, returning its id and auth headers"""
+    user = {"email": "bench@example.com", "username": "bench", "password": "benchmark-password"}
+    if create:
+        (await client.post("/api/users/", json=user)).raise_for_status()
+    response = await client.post("/api/auth/token", data={"username": user["username"], "password": user["password"]})
+    response.raise_for_status()
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    # The profile is created on first read; do that once rather than from concurrent requests
+    profile = await client.get("/api/profiles/me", headers=headers)
+    profile.raise_for_status()
+    return {"id": profile.json()["user_id"], "headers": headers}
+
+
+async def run_load(client: httpx.AsyncClient, path: str, headers: Dict[str, str], requests: int, concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            started = time.perf_counter()
+            response = await client.get(path, headers=headers)
+            latencies.append(time.perf_counter() - started)
+            errors += response.status_code >= 400
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests_per_second": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "errors": errors,
+    }
+
+
+async def main_async(args) -> Dict[str, Any]:
+    from main import app
+
+    # ASGITransport does not run lifespan events, so start the app by hand
+    await app.router.startup()
+    try:
+        results: Dict[str, Any] = {"mode": args.mode, "log_sink": args.log_sink}
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            user = await login(client)
+            seed(args.items, user["id"])
+            headers = user["headers"]
+            for path in ENDPOINTS:
+                # Warm up imports, statement caches and the connection pool before timing
+                await run_load(client, path, headers, min(50, args.requests), args.concurrency)
+                results[path] = await run_load(client, path, headers, args.requests, args.concurrency)
+        return results
+    finally:
+        await app.router.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500, help="timed requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--mode", choices=("async", "sync"), default="async", help="DB_MODE to run the app in")
+    parser.add_argument("--items", type=int, default=200, help="coping methods, exercises and resources to seed")
+    parser.add_argument("--log-sink", action="store_true", help="write request log rows to the database")
+    parser.add_argument("--db", help="SQLite file to use (default: a new temporary file)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.db is None:
+            args.db = os.path.join(tmp, "bench.db")
+        configure(args)
+        print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Event-loop lag benchmark for the database session modes
+
+Runs concurrent queries through three kinds of session while a ticker
+task measures how late the event loop wakes it up:
+    blocking - a plain synchronous Session called from coroutines, as the
+               routes did before (every query stalls the loop)
+    sync     - DB_MODE=sync: ThreadedSession, queries run in the threadpool
+    async    - DB_MODE=async: AsyncSession on asyncpg
+
+Long websocket chat streams share this loop, so lag here is added directly
+to token delivery. Needs a reachable PostgreSQL configured via DB_*; the
+query defaults to a short pg_sleep to stand in for real route queries.
+
+Run from the backend directory:
+    python -m benchmarks.db_event_loop --concurrency 20 --queries 20
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict, List
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import SQLALCHEMY_ASYNC_DATABASE_URL, SQLALCHEMY_DATABASE_URL, ThreadedSession
+
+TICK_SECONDS = 0.005
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+
+def pool_options(url: str, concurrency: int) -> Dict[str, Any]:
+    """Size the pool so every worker gets a connection (not applicable to SQLite)"""
+    if url.startswith("postgresql"):
+        return {"pool_size": concurrency}
+    return {}
+
+
+async def ticker(lags: List[float], stop: asyncio.Event) -> None:
+    """Record how much later than requested each sleep returns"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK_SECONDS)
+        lags.append(time.perf_counter() - started - TICK_SECONDS)
+
+
+async def run_mode(mode: str, args) -> Dict[str, Any]:
+    statement = text(args.query)
+    sync_engine = create_engine(args.sync_url, **pool_options(args.sync_url, args.concurrency))
+    async_engine = (
+        create_async_engine(args.async_url, **pool_options(args.async_url, args.concurrency))
+        if mode == "async" else None
+    )
+    sync_factory = sessionmaker(bind=sync_engine, expire_on_commit=False)
+    async_factory = async_sessionmaker(async_engine, expire_on_commit=False) if async_engine else None
+
+    async def worker():
+        for _ in range(args.queries):
+            if mode == "blocking":
+                with sync_factory() as session:
+                    session.execute(statement)
+            elif mode == "sync":
+                session = ThreadedSession(sync_factory())
+                try:
+                    await session.execute(statement)
+                finally:
+                    await session.close()
+            else:
+                async with async_factory() as session:
+                    await session.execute(statement)
+            # Yield so the ticker gets a chance to run between queries
+            await asyncio.sleep(0)
+
+    lags: List[float] = []
+    stop = asyncio.Event()
+    tick = asyncio.create_task(ticker(lags, stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await tick
+
+    sync_engine.dispose()
+    if async_engine is not None:
+        await async_engine.dispose()
+
+    return {
+        "queries_per_second": round(args.concurrency * args.queries / elapsed, 1),
+        "loop_lag_p50_ms": round(percentile(lags, 50) * 1000, 3),
+        "loop_lag_p99_ms": round(percentile(lags, 99) * 1000, 3),
+        "loop_lag_max_ms": round(max(lags, default=0.0) * 1000, 3),
+    }
+
+
+async def main_async(args) -> Dict[str, Any]:
+    return {mode: await run_mode(mode, args) for mode in args.modes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=20, help="Queries per worker")
+    parser.add_argument("--query", default="SELECT pg_sleep(0.01)")
+    parser.add_argument("--modes", nargs="+", default=["blocking", "sync", "async"], choices=["blocking", "sync", "async"])
+    parser.add_argument("--sync-url", default=SQLALCHEMY_DATABASE_URL)
+    parser.add_argument("--async-url", default=SQLALCHEMY_ASYNC_DATABASE_URL)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+EXPLAIN check for the hot route queries
+
+Builds the same statements the routes issue, runs EXPLAIN on each and
+checks that the planner uses the index added for it by migration 0002.
+Exits non-zero if any query does not.
+
+On a small development database a sequential scan is cheaper than any
+index, so by default sequential scans are disabled for the check; that
+verifies the index matches the query's shape. Pass --real-planner against
+a production-sized copy to see the plan the server would actually choose.
+Needs a migrated PostgreSQL configured via DB_*.
+
+Run from the backend directory:
+    python -m benchmarks.explain_indexes
+"""
+import argparse
+import json
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Set
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from app.database import engine
+from app.models.chat import ChatMessage
+from app.models.coping import CopingMethod
+from app.models.mood_history import MoodHistory
+from app.models.relaxation import RelaxationExercise
+from app.models.virtual_pet import VirtualPetChat
+from app.utils.db_types import json_array_contains
+# Relationship targets of the models above
+from app.models import user, user_profile  # noqa: F401
+
+
+class Explain(Executable, ClauseElement):
+    """EXPLAIN (FORMAT JSON) around a statement, keeping its bound parameters"""
+
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+def route_queries() -> List[Dict[str, Any]]:
+    """(route, statement, expected index) for each indexed query, mirroring the route code"""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=30)
+    return [
+        {
+            "route": "GET /api/chat/history",
+            "statement": select(ChatMessage).filter(ChatMessage.user_id == 1)
+                .order_by(ChatMessage.created_at.desc()).offset(0).limit(50),
+            "index": "ix_chat_messages_user_id_created_at",
+        },
+        {
+            "route": "WS /api/chat/ws/{token} (history seed)",
+            "statement": select(ChatMessage).filter(ChatMessage.user_id == 1)
+                .order_by(ChatMessage.created_at.desc()).limit(10),
+            "index": "ix_chat_messages_user_id_created_at",
+        },
+        {
+            "route": "GET /api/profiles/me/mood-history",
+            "statement": select(MoodHistory).filter(MoodHistory.user_id == 1, MoodHistory.timestamp >= cutoff)
+                .order_by(MoodHistory.timestamp.desc()),
+            "index": "ix_mood_history_user_id_timestamp",
+        },
+        {
+            "route": "GET /api/virtual-pets/{pet_id}/chat-history",
+            "statement": select(VirtualPetChat).filter(VirtualPetChat.pet_id == 1)
+                .order_by(VirtualPetChat.timestamp.desc()).limit(50),
+            "index": "ix_virtual_pet_chats_pet_id_timestamp",
+        },
+        {
+            "route": "GET /api/coping/list?tag=",
+            "statement": select(CopingMethod).filter(json_array_contains(CopingMethod.tags, "breathing"))
+                .order_by(CopingMethod.created_at.desc()),
+            "index": "ix_coping_methods_tags",
+        },
+        {
+            "route": "GET /api/relaxation/list?tag=",
+            "statement": select(RelaxationExercise).filter(json_array_contains(RelaxationExercise.tags, "breathing"))
+                .order_by(RelaxationExercise.created_at.desc()),
+            "index": "ix_relaxation_exercises_tags",
+        },
+        {
+            "route": "POST /api/coping/auto-generate (title dedup)",
+            "statement": select(CopingMethod).filter(func.lower(CopingMethod.title) == func.lower("Box Breathing")),
+            "index": "ix_coping_methods_lower_title",
+        },
+        {
+            "route": "POST /api/relaxation/auto-generate (title dedup)",
+            "statement": select(RelaxationExercise).filter(
+                func.lower(RelaxationExercise.title) == func.lower("Box Breathing")
+            ),
+            "index": "ix_relaxation_exercises_lower_title",
+        },
+    ]
+
+
+def plan_nodes(node: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def indexes_used(plan: Dict[str, Any]) -> Set[str]:
+    return {node["Index Name"] for node in plan_nodes(plan) if "Index Name" in node}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--real-planner", action="store_true", help="leave sequential scans enabled")
+    parser.add_argument("--verbose", action="store_true", help="print each plan")
+    args = parser.parse_args()
+
+    if engine.dialect.name != "postgresql":
+        sys.exit("The EXPLAIN check needs PostgreSQL")
+
+    failures = 0
+    with engine.connect() as connection:
+        if not args.real_planner:
+            connection.execute(text("SET enable_seqscan = off"))
+        for query in route_queries():
+            plan = connection.execute(Explain(query["statement"])).scalar()[0]["Plan"]
+            used = indexes_used(plan)
+            ok = query["index"] in used
+            failures += not ok
+            print(f"{'ok' if ok else 'FAIL':4}  {query['route']:45}  expected {query['index']}, used {', '.join(sorted(used)) or 'none'}")
+            if args.verbose or not ok:
+                print(json.dumps(plan, indent=2))
+        connection.rollback()
+
+    if failures:
+        sys.exit(f"{failures} route quer{'y' if failures == 1 else 'ies'} not using the expected index")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Offline stand-in for the Gemini-backed GeminiService
+
+install() swaps the generation methods on the shared gemini_service
+instance for canned responses with a configurable delay, so routes that
+call Gemini can be load-tested without an API key or quota.
+"""
+import asyncio
+import itertools
+from typing import Any, Dict, List, Optional
+
+from app.services.gemini_service import gemini_service
+
+_counter = itertools.count(1)
+
+
+class FakeGeminiService:
+    """Returns deterministic, well-formed results after ``latency`` seconds"""
+
+    def __init__(self, latency: float = 0.5):
+        self.latency = latency
+
+    async def generate_coping_methods(
+        self,
+        existing_titles: List[str],
+        count: int = 5,
+        prompt_addition: Optional[str] = None,
+        tags: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        await asyncio.sleep(self.latency)
+        return [
+            {
+                "title": f"Grounding technique {next(_counter)}",
+                "description": "Name five things you can see, four you can touch and three you can hear.",
+                "tags": tags or ["anxiety", "mindfulness"],
+            }
+            for _ in range(count)
+        ]
+
+    async def get_coping_suggestions_for_mood(
+        self,
+        current_mood: str,
+        concerns: Optional[List[str]] = None,
+        count: int = 3
+    ) -> List[Dict[str, Any]]:
+        return await self.generate_coping_methods([], count=count, tags=concerns)
+
+    async def generate_relaxation_exercises(
+        self,
+        existing_titles: List[str],
+        count: int = 5,
+        prompt_addition: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        difficulty: Optional[str] = None,
+        duration: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        await asyncio.sleep(self.latency)
+        return [
+            {
+                "title": f"Box breathing {next(_counter)}",
+                "description": "A slow, even breathing pattern that calms the nervous system.",
+                "instructions": "Breathe in for four counts, hold for four, out for four, hold for four.",
+                "duration_minutes": duration or 5,
+                "difficulty_level": difficulty or "beginner",
+                "tags": tags or ["stress", "breathing"],
+            }
+            for _ in range(count)
+        ]
+
+    async def generate_mood_forecast(
+        self,
+        mood_history: List[Dict[str, Any]],
+        current_mood: str
+    ) -> Dict[str, Any]:
+        await asyncio.sleep(self.latency)
+        forecast = {"predicted_mood": current_mood, "confidence": 0.5, "reasoning": "Recent moods are stable."}
+        return {"twelve_hours": forecast, "twenty_four_hours": forecast, "next_week": forecast}
+
+    async def generate_pet_response(
+        self,
+        animal_type: str,
+        pet_name: str,
+        user_message: str,
+        chat_history: Optional[List[Dict[str, Any]]] = None,
+        user_mood: Optional[str] = None
+    ) -> str:
+        await asyncio.sleep(self.latency)
+        return f"*{pet_name} nuzzles you gently*"
+
+
+def install(latency: float = 0.5) -> FakeGeminiService:
+    """Route every gemini_service call in this process to the fake provider"""
+    fake = FakeGeminiService(latency)
+    for name in (
+        "generate_coping_methods",
+        "get_coping_suggestions_for_mood",
+        "generate_relaxation_exercises",
+        "generate_mood_forecast",
+        "generate_pet_response",
+    ):
+        setattr(gemini_service, name, getattr(fake, name))
+    gemini_service.api_key = gemini_service.api_key or "fake"
+    return fake
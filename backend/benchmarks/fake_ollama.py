@@ -0,0 +1,136 @@
+"""
+Offline stand-in for an Ollama server
+
+Streams /api/chat responses as NDJSON with a configurable time-to-first-
+token, token rate and error injection, and answers the /api/generate,
+/api/tags and /api/ps calls the backend makes for warm-up and health
+checks. Start several on different ports to exercise load balancing.
+
+Run from the backend directory:
+    python -m benchmarks.fake_ollama --port 11434 --ttft 0.2 --tokens-per-second 50
+"""
+import argparse
+import asyncio
+import json
+import random
+from datetime import datetime, timedelta
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WORDS = (
+    "It sounds like you are carrying a lot right now. Taking a slow breath "
+    "and noticing what you feel can help. Would you like to talk about it?"
+).split()
+
+
+def create_app(
+    ttft: float = 0.2,
+    tokens_per_second: float = 50.0,
+    tokens: int = 200,
+    error_rate: float = 0.0,
+    stall_rate: float = 0.0,
+    model: str = "llama3.1:latest"
+) -> FastAPI:
+    """
+    Build the fake server
+
+    ``error_rate`` is the fraction of chat requests answered with a 500 and
+    ``stall_rate`` the fraction that stop streaming halfway without a done
+    record, mimicking a crashed runner.
+    """
+    app = FastAPI()
+    state = {"loaded": False, "active": 0}
+
+    def record(content: str = "", done: bool = False, **extra) -> bytes:
+        payload = {
+            "model": model,
+            "created_at": datetime.utcnow().isoformat() + "Z",
+            "message": {"role": "assistant", "content": content},
+            "done": done,
+            **extra,
+        }
+        return (json.dumps(payload) + "\n").encode()
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        if random.random() < error_rate:
+            return JSONResponse({"error": "injected failure"}, status_code=500)
+
+        num_predict = (body.get("options") or {}).get("num_predict") or tokens
+        count = min(tokens, num_predict)
+        stall = random.random() < stall_rate
+        load_duration = 0 if state["loaded"] else int(ttft * 1e9)
+        state["loaded"] = True
+
+        async def stream():
+            state["active"] += 1
+            try:
+                await asyncio.sleep(ttft)
+                for i in range(count):
+                    if stall and i == count // 2:
+                        return
+                    yield record(" " + WORDS[i % len(WORDS)] if i else WORDS[0])
+                    await asyncio.sleep(1 / tokens_per_second)
+                yield record(
+                    done=True,
+                    done_reason="stop",
+                    total_duration=int((ttft + count / tokens_per_second) * 1e9),
+                    load_duration=load_duration,
+                    prompt_eval_count=sum(len(m.get("content", "")) // 4 for m in body.get("messages", [])),
+                    eval_count=count,
+                    eval_duration=int(count / tokens_per_second * 1e9),
+                )
+            finally:
+                state["active"] -= 1
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        body = await request.json()
+        load_duration = 0 if state["loaded"] else int(ttft * 1e9)
+        if load_duration:
+            await asyncio.sleep(ttft)
+        state["loaded"] = True
+        return {"model": body.get("model", model), "response": "", "done": True, "load_duration": load_duration}
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": model, "model": model}]}
+
+    @app.get("/api/ps")
+    async def ps():
+        if not state["loaded"]:
+            return {"models": []}
+        expires_at = (datetime.utcnow() + timedelta(minutes=30)).isoformat() + "Z"
+        return {"models": [{"name": model, "model": model, "size_vram": 0, "expires_at": expires_at}]}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--ttft", type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--tokens", type=int, default=200, help="Tokens per response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with a 500")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="Fraction of streams cut off halfway")
+    args = parser.parse_args()
+
+    app = create_app(
+        ttft=args.ttft,
+        tokens_per_second=args.tokens_per_second,
+        tokens=args.tokens,
+        error_rate=args.error_rate,
+        stall_rate=args.stall_rate,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
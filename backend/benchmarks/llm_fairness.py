@@ -0,0 +1,98 @@
+"""
+Scheduler fairness check: long prompts are served under short-prompt load
+
+Drives app.services.llm_scheduler with simulated generations: --short-users
+users keep --in-flight short prompts queued at all times, while one more
+user sends --long-requests long prompts one after another. Short prompts
+outrank long ones, but only within a round-robin round, so each long
+prompt must be admitted within two rounds of arriving (the round in
+progress plus its own). Reports how many admissions went ahead of each
+long prompt and how long it waited, and exits non-zero if any long prompt
+waited longer than that bound or was never served.
+
+No database, network or LLM is needed. Run from the backend directory:
+    python -m benchmarks.llm_fairness --short-users 8 --concurrency 2
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import Any, Dict, List
+
+from app.services.llm_scheduler import LLMScheduler
+
+SHORT_PROMPT = "How are you?"
+
+
+async def short_user(scheduler: LLMScheduler, user_id: str, generation: float, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        async with scheduler.slot(user_id, SHORT_PROMPT):
+            await asyncio.sleep(generation)
+
+
+async def long_user(scheduler: LLMScheduler, args, long_prompt: str) -> List[Dict[str, Any]]:
+    results = []
+    for _ in range(args.long_requests):
+        admitted_before = scheduler.stats()["admitted"]
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(scheduler.acquire("long", long_prompt), args.timeout)
+        except asyncio.TimeoutError:
+            results.append({"served": False, "ahead": scheduler.stats()["admitted"] - admitted_before, "wait_ms": None})
+            continue
+        results.append({
+            "served": True,
+            "ahead": scheduler.stats()["admitted"] - admitted_before - 1,
+            "wait_ms": round((time.perf_counter() - started) * 1000, 3),
+        })
+        try:
+            await asyncio.sleep(args.generation)
+        finally:
+            scheduler.release()
+    return results
+
+
+async def main_async(args) -> Dict[str, Any]:
+    scheduler = LLMScheduler(max_concurrent=args.concurrency, max_queue=args.short_users * args.in_flight + 1)
+    long_prompt = " ".join(["word"] * (scheduler.short_prompt_tokens * 4))
+    stop = asyncio.Event()
+    workers = [
+        asyncio.create_task(short_user(scheduler, f"short-{user}", args.generation, stop))
+        for user in range(args.short_users)
+        for _ in range(args.in_flight)
+    ]
+    # Let the short-prompt queues fill before the long prompts arrive
+    await asyncio.sleep(args.generation * 5)
+    results = await long_user(scheduler, args, long_prompt)
+    stop.set()
+    await asyncio.gather(*workers)
+
+    # One round for the users already owed a turn, one more for its own round
+    bound = 2 * (args.short_users + 1)
+    return {
+        "bound": bound,
+        "long_requests": results,
+        "max_ahead": max((r["ahead"] for r in results), default=0),
+        "scheduler": {key: value for key, value in scheduler.stats().items() if key in ("admitted", "rejected")},
+        "ok": all(r["served"] and r["ahead"] <= bound for r in results),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--short-users", type=int, default=8)
+    parser.add_argument("--in-flight", type=int, default=2, help="short prompts each short user keeps queued")
+    parser.add_argument("--concurrency", type=int, default=2, help="scheduler max_concurrent")
+    parser.add_argument("--long-requests", type=int, default=20)
+    parser.add_argument("--generation", type=float, default=0.005, help="seconds each simulated generation takes")
+    parser.add_argument("--timeout", type=float, default=10.0, help="give up on a long prompt after this many seconds")
+    args = parser.parse_args()
+    result = asyncio.run(main_async(args))
+    print(json.dumps(result, indent=2))
+    if not result["ok"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
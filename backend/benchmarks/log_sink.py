@@ -0,0 +1,93 @@
+"""
+Benchmark for the buffered database log sink
+
+Serves a trivial route through the real logging middleware stack and
+measures requests/s and latency percentiles with the database log sink
+disabled and enabled. With the sink enabled, rows are written to the
+configured database by the background writer; if the database cannot be
+reached the failed batches are reported, but request latency should be
+unaffected either way.
+
+Run from the backend directory:
+    python -m benchmarks.log_sink --requests 5000 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict, List
+
+import httpx
+from fastapi import FastAPI
+
+from app.logger import db_logger
+from app.middleware import DBLoggingMiddleware, DBSessionMiddleware
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(DBSessionMiddleware)
+    app.add_middleware(DBLoggingMiddleware)
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+
+async def run_load(app: FastAPI, requests: int, concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    remaining = iter(range(requests))
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def worker():
+            for _ in remaining:
+                started = time.perf_counter()
+                response = await client.get("/ping")
+                latencies.append(time.perf_counter() - started)
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "requests_per_second": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+async def main_async(args) -> Dict[str, Any]:
+    app = build_app()
+    results = {}
+
+    db_logger.enabled = False
+    # Warm up imports and routing before timing
+    await run_load(app, min(200, args.requests), args.concurrency)
+    results["sink_off"] = await run_load(app, args.requests, args.concurrency)
+
+    db_logger.enabled = True
+    db_logger.start()
+    results["sink_on"] = await run_load(app, args.requests, args.concurrency)
+    await db_logger.stop()
+    results["sink_stats"] = db_logger.stats()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
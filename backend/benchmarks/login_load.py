@@ -0,0 +1,110 @@
+"""
+Login burst benchmark: bcrypt throughput vs chat streaming latency
+
+Runs a burst of password verifications (what POST /api/auth/token does)
+while simulated chat streams deliver a token every --token-interval
+seconds on the same event loop, and reports logins/s next to how late the
+streams' tokens were. Modes:
+    legacy     - as authenticate_user did before: a new CryptContext per
+                 call and bcrypt on the event loop
+    threadpool - a cached context run with run_in_threadpool, as the
+                 sign-up route did; shares Starlette's threadpool
+    service    - app.services.passwords: cached context on a bounded,
+                 dedicated executor
+
+No database or network is needed. Run from the backend directory:
+    python -m benchmarks.login_load --logins 200 --concurrency 50 --streams 20
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict, List
+
+from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
+
+from app.services.passwords import PasswordService
+
+PASSWORD = "correct horse battery staple"
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+
+async def stream(interval: float, lags: List[float], stop: asyncio.Event) -> None:
+    """Stand-in for a websocket chat stream: one token every ``interval`` seconds"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+
+async def run_mode(mode: str, hashed: str, args) -> Dict[str, Any]:
+    cached_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    service = PasswordService(rounds=args.rounds, workers=args.workers, max_queue=args.logins)
+
+    async def login() -> bool:
+        if mode == "legacy":
+            return CryptContext(schemes=["bcrypt"], deprecated="auto").verify(PASSWORD, hashed)
+        if mode == "threadpool":
+            return await run_in_threadpool(cached_context.verify, PASSWORD, hashed)
+        valid, _ = await service.verify_and_update(PASSWORD, hashed)
+        return valid
+
+    remaining = iter(range(args.logins))
+    login_times: List[float] = []
+
+    async def worker():
+        for _ in remaining:
+            started = time.perf_counter()
+            assert await login()
+            login_times.append(time.perf_counter() - started)
+            # Yield so the streams get a chance to run between logins
+            await asyncio.sleep(0)
+
+    lags: List[float] = []
+    stop = asyncio.Event()
+    streams = [asyncio.create_task(stream(args.token_interval, lags, stop)) for _ in range(args.streams)]
+    await asyncio.sleep(args.token_interval)
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await asyncio.gather(*streams)
+    service.shutdown()
+
+    return {
+        "logins_per_second": round(args.logins / elapsed, 1),
+        "login_p50_ms": round(percentile(login_times, 50) * 1000, 1),
+        "login_p99_ms": round(percentile(login_times, 99) * 1000, 1),
+        "token_lag_p50_ms": round(percentile(lags, 50) * 1000, 3),
+        "token_lag_p99_ms": round(percentile(lags, 99) * 1000, 3),
+        "token_lag_max_ms": round(max(lags, default=0.0) * 1000, 3),
+    }
+
+
+async def main_async(args) -> Dict[str, Any]:
+    hashed = CryptContext(schemes=["bcrypt"], bcrypt__rounds=args.rounds).hash(PASSWORD)
+    return {mode: await run_mode(mode, hashed, args) for mode in args.modes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50, help="logins in flight at once")
+    parser.add_argument("--streams", type=int, default=20, help="simulated chat streams")
+    parser.add_argument("--token-interval", type=float, default=0.025)
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost of the stored hash")
+    parser.add_argument("--workers", type=int, default=2, help="password service threads")
+    parser.add_argument("--modes", nargs="+", default=["legacy", "threadpool", "service"], choices=["legacy", "threadpool", "service"])
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
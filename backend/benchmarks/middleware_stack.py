@@ -0,0 +1,114 @@
+"""
+Benchmark for the request logging/session middleware stack
+
+Serves a trivial route behind three stacks and reports requests/s and
+p50/p99 latency for each:
+    none     - no middleware
+    legacy   - the previous BaseHTTPMiddleware versions, which open a
+               session for every request
+    asgi     - the current plain ASGI DBLoggingMiddleware/DBSessionMiddleware
+
+The database log sink is disabled so only middleware overhead is measured,
+and no query is issued, so no database is needed.
+
+Run from the backend directory:
+    python -m benchmarks.middleware_stack --requests 5000 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Callable, Dict, List
+
+import httpx
+from fastapi import FastAPI, Request
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.database import SessionLocal
+from app.logger import begin_request_log, db_logger, end_request_log
+from app.middleware import DBLoggingMiddleware, DBSessionMiddleware
+
+
+class LegacyLoggingMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        context = begin_request_log(request)
+        response = await call_next(request)
+        end_request_log(context, response.status_code)
+        return response
+
+
+class LegacySessionMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        db = SessionLocal()
+        request.state.db = db
+        try:
+            return await call_next(request)
+        finally:
+            db.close()
+
+
+def build_app(stack: str) -> FastAPI:
+    app = FastAPI()
+    if stack == "legacy":
+        app.add_middleware(LegacySessionMiddleware)
+        app.add_middleware(LegacyLoggingMiddleware)
+    elif stack == "asgi":
+        app.add_middleware(DBSessionMiddleware)
+        app.add_middleware(DBLoggingMiddleware)
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+
+async def run_load(app: FastAPI, requests: int, concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    remaining = iter(range(requests))
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def worker():
+            for _ in remaining:
+                started = time.perf_counter()
+                response = await client.get("/ping")
+                latencies.append(time.perf_counter() - started)
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "requests_per_second": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+async def main_async(args) -> Dict[str, Any]:
+    db_logger.enabled = False
+    results = {}
+    for stack in ("none", "legacy", "asgi"):
+        app = build_app(stack)
+        # Warm up imports and routing before timing
+        await run_load(app, min(200, args.requests), args.concurrency)
+        results[stack] = await run_load(app, args.requests, args.concurrency)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Micro-benchmark for decoding Ollama's NDJSON stream
+
+Compares the per-token parse cost of NDJSONDecoder against the previous
+"json.loads the chunk, buffer and retry on failure" approach across several
+ways the transport can split the stream into chunks.
+
+Run from the backend directory:
+    python -m benchmarks.ndjson_decoder
+"""
+import json
+import random
+import time
+from typing import Callable, Dict, List
+
+from app.utils.ndjson import NDJSONDecoder
+
+TOKENS = 1000
+ROUNDS = 20
+REPEATS = 5
+
+
+def build_stream(tokens: int) -> bytes:
+    """Build a /api/chat style NDJSON body with one record per token"""
+    lines = [
+        json.dumps({
+            "model": "llama3.1",
+            "created_at": "2024-01-01T00:00:00Z",
+            "message": {"role": "assistant", "content": f" token{i}"},
+            "done": False,
+        })
+        for i in range(tokens)
+    ]
+    lines.append(json.dumps({"model": "llama3.1", "done": True, "eval_count": tokens, "eval_duration": 1}))
+    return ("\n".join(lines) + "\n").encode()
+
+
+def split_per_line(body: bytes) -> List[bytes]:
+    return [line + b"\n" for line in body.split(b"\n") if line]
+
+
+def split_mid_line(body: bytes) -> List[bytes]:
+    chunks = []
+    for line in split_per_line(body):
+        middle = len(line) // 2
+        chunks.extend([line[:middle], line[middle:]])
+    return chunks
+
+
+def split_batched(body: bytes) -> List[bytes]:
+    lines = split_per_line(body)
+    return [b"".join(lines[i:i + 8]) for i in range(0, len(lines), 8)]
+
+
+def split_random(body: bytes) -> List[bytes]:
+    rng = random.Random(42)
+    chunks, position = [], 0
+    while position < len(body):
+        size = rng.randint(16, 512)
+        chunks.append(body[position:position + size])
+        position += size
+    return chunks
+
+
+def decode_legacy(chunks: List[bytes]) -> int:
+    """The decoding loop previously used by OllamaService.generate_stream"""
+    tokens = 0
+    buffer = ""
+    for raw in chunks:
+        chunk = raw.decode()
+        try:
+            if chunk.strip():
+                chunk_data = json.loads(chunk)
+                if "message" in chunk_data and "content" in chunk_data["message"]:
+                    tokens += 1
+                elif "done" in chunk_data and chunk_data["done"]:
+                    break
+        except json.JSONDecodeError:
+            buffer += chunk
+            try:
+                chunk_data = json.loads(buffer)
+                buffer = ""
+                if "message" in chunk_data and "content" in chunk_data["message"]:
+                    tokens += 1
+                elif "done" in chunk_data and chunk_data["done"]:
+                    break
+            except json.JSONDecodeError:
+                continue
+    return tokens
+
+
+def decode_incremental(chunks: List[bytes]) -> int:
+    tokens = 0
+    decoder = NDJSONDecoder()
+    for chunk in chunks:
+        for record in decoder.feed(chunk):
+            if record.get("message", {}).get("content"):
+                tokens += 1
+    return tokens
+
+
+def measure(decode: Callable[[List[bytes]], int], chunks: List[bytes]) -> Dict[str, float]:
+    """Best of REPEATS runs of ROUNDS decodes, to keep scheduler noise out"""
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            tokens = decode(chunks)
+        best = min(best, time.perf_counter() - start)
+    return {"tokens": tokens, "us_per_token": best / ROUNDS / TOKENS * 1e6}
+
+
+def main():
+    body = build_stream(TOKENS)
+    patterns = {
+        "one line per chunk": split_per_line(body),
+        "lines split in half": split_mid_line(body),
+        "8 lines per chunk": split_batched(body),
+        "random 16-512 byte chunks": split_random(body),
+    }
+    print(f"{'pattern':<28}{'decoder':<14}{'tokens':>8}{'us/token':>12}")
+    for name, chunks in patterns.items():
+        for label, decode in (("legacy", decode_legacy), ("incremental", decode_incremental)):
+            result = measure(decode, chunks)
+            print(f"{name:<28}{label:<14}{result['tokens']:>8}{result['us_per_token']:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
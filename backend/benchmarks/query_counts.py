@@ -0,0 +1,142 @@
+"""
+Statements-per-request check for N+1 regressions
+
+Boots the real app on a throwaway SQLite database (see app_latency),
+counts the SQL statements each endpoint issues, then adds more rows
+(users with profiles, pets, mood entries, resources, chat messages) and
+counts again. An endpoint fails if its count grows with the data, which
+is what a lazy load per row looks like, or if it exceeds its budget.
+Exits non-zero on any failure, so it can run as a pre-merge check.
+
+The principal cache is off by default so the auth dependency's own
+queries are counted. Run from the backend directory:
+    python -m benchmarks.query_counts
+    python -m benchmarks.query_counts --mode sync --auth-loader selectin --list-loader joined
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from typing import Any, Dict, List
+
+import httpx
+
+from benchmarks.app_latency import configure, login
+
+# (path, statement budget); budgets allow for the selectin strategy's extra SELECT
+CHECKS = [
+    ("/api/users/?limit=100", 2),
+    ("/api/users/{user_id}", 2),
+    ("/api/profiles/me", 2),
+    ("/api/profiles/me/mood-history", 1),
+    ("/api/virtual-pets/list", 1),
+    ("/api/resources/", 2),
+    ("/api/chat/history", 1),
+]
+
+
+def seed(user_id: int, start: int, count: int) -> None:
+    """Add ``count`` other users with profiles, plus as many rows of each kind owned by ``user_id``"""
+    from app.database import SessionLocal
+    from app.models.chat import ChatMessage
+    from app.models.mood_history import MoodHistory
+    from app.models.resource import ResourceLink
+    from app.models.user import User
+    from app.models.user_profile import UserProfile
+    from app.models.virtual_pet import VirtualPet
+
+    with SessionLocal() as db:
+        for i in range(start, start + count):
+            user = User(email=f"user{i}@example.com", username=f"user{i}", hashed_password="x")
+            user.profile = UserProfile(current_mood="calm")
+            db.add(user)
+            db.add(VirtualPet(user_id=user_id, animal_type="cat", name=f"Pet {i}"))
+            db.add(MoodHistory(user_id=user_id, mood="calm"))
+            db.add(ResourceLink(user_id=user_id, domain="example.com", path=f"/{i}", title=f"Resource {i}"))
+            db.add(ChatMessage(user_id=user_id, message=f"Message {i}", response="Reply"))
+        db.commit()
+
+
+def make_superuser(user_id: int) -> None:
+    from app.database import SessionLocal
+    from app.models.user import User
+
+    with SessionLocal() as db:
+        db.get(User, user_id).is_superuser = True
+        db.commit()
+
+
+async def count_statements(client: httpx.AsyncClient, path: str, headers: Dict[str, str], statements: List[str]) -> Dict[str, Any]:
+    statements.clear()
+    response = await client.get(path, headers=headers)
+    return {"status": response.status_code, "statements": list(statements)}
+
+
+async def main_async(args) -> Dict[str, Any]:
+    from sqlalchemy import event
+    from main import app
+    from app.database import request_engine
+
+    statements: List[str] = []
+    event.listen(request_engine, "before_cursor_execute", lambda conn, cursor, statement, *rest: statements.append(statement))
+
+    await app.router.startup()
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://check") as client:
+            user = await login(client)
+            make_superuser(user["id"])
+            # Log in again so the token carries the superuser claim
+            user = await login(client, create=False)
+            checks = [(path.format(user_id=user["id"]), budget) for path, budget in CHECKS]
+
+            seed(user["id"], 0, args.small)
+            small = {path: await count_statements(client, path, user["headers"], statements) for path, _ in checks}
+            seed(user["id"], args.small, args.large - args.small)
+            large = {path: await count_statements(client, path, user["headers"], statements) for path, _ in checks}
+    finally:
+        await app.router.shutdown()
+
+    results: Dict[str, Any] = {}
+    for path, budget in checks:
+        counts = (len(small[path]["statements"]), len(large[path]["statements"]))
+        status = large[path]["status"]
+        ok = status < 400 and counts[0] == counts[1] and counts[1] <= budget
+        results[path] = {"status": status, f"rows_{args.small}": counts[0], f"rows_{args.large}": counts[1], "budget": budget, "ok": ok}
+        if not ok or args.verbose:
+            results[path]["statements"] = large[path]["statements"]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=("async", "sync"), default="async", help="DB_MODE to run the app in")
+    parser.add_argument("--auth-loader", choices=("joined", "selectin"), help="AUTH_PROFILE_LOADER to use")
+    parser.add_argument("--list-loader", choices=("joined", "selectin"), help="USER_LIST_PROFILE_LOADER to use")
+    parser.add_argument("--small", type=int, default=2, help="rows of each kind for the first count")
+    parser.add_argument("--large", type=int, default=30, help="rows of each kind for the second count")
+    parser.add_argument("--principal-cache", action="store_true", help="leave the principal cache on")
+    parser.add_argument("--verbose", action="store_true", help="print the statements for every endpoint")
+    parser.add_argument("--db", help="SQLite file to use (default: a new temporary file)")
+    args = parser.parse_args()
+    args.log_sink = False
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.db is None:
+            args.db = os.path.join(tmp, "query_counts.db")
+        configure(args)
+        if not args.principal_cache:
+            os.environ["PRINCIPAL_CACHE_TTL"] = "0"
+        if args.auth_loader:
+            os.environ["AUTH_PROFILE_LOADER"] = args.auth_loader
+        if args.list_loader:
+            os.environ["USER_LIST_PROFILE_LOADER"] = args.list_loader
+        results = asyncio.run(main_async(args))
+    print(json.dumps(results, indent=2))
+    if not all(result["ok"] for result in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Run the backend with the fake Gemini provider installed
+
+Point OLLAMA_API_URLS at one or more benchmarks.fake_ollama instances to
+run the whole stack offline:
+    OLLAMA_API_URLS=http://127.0.0.1:11500 python -m benchmarks.serve_app --port 8000
+
+Rate limiting is off unless --rate-limits is given, since every load test
+user logs in from the same address and would exhaust the per-IP login
+bucket.
+"""
+import argparse
+import os
+
+import uvicorn
+
+from benchmarks.fake_gemini import install
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--gemini-latency", type=float, default=0.5)
+    parser.add_argument("--rate-limits", action="store_true", help="keep the rate limiter on")
+    args = parser.parse_args()
+
+    if not args.rate_limits:
+        os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+    install(args.gemini_latency)
+    from main import app
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+End-to-end load generator for the websocket chat
+
+Registers (or reuses) N users, logs them in, opens one authenticated
+websocket per user on /api/chat/ws/{token} and sends M messages on each.
+Reports p50/p95/p99 time-to-first-token, token throughput and error
+rates, and exits non-zero when the configured gates are exceeded so the
+run can fail a regression check.
+
+Run from the backend directory against a running server:
+    python -m benchmarks.ws_load --base-url http://127.0.0.1:8000 --users 50 --messages 3
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+import websockets
+
+PASSWORD = "loadtest-password"
+
+
+class SessionResult:
+    def __init__(self):
+        self.ttfts: List[float] = []
+        self.greeting_ttft: Optional[float] = None
+        self.tokens = 0
+        self.stream_seconds = 0.0
+        self.replies = 0
+        self.errors: List[str] = []
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def login(client: httpx.AsyncClient, index: int, prefix: str) -> str:
+    """Create the load-test user if needed and return an access token"""
+    username = f"{prefix}{index}"
+    await client.post("/api/users/", json={
+        "email": f"{username}@example.com",
+        "username": username,
+        "password": PASSWORD,
+    })
+    response = await client.post("/api/auth/token", data={"username": username, "password": PASSWORD})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def read_reply(websocket, result: SessionResult, sent_at: float, timeout: float) -> Optional[float]:
+    """Consume frames until the end of one reply; returns its TTFT"""
+    ttft = None
+    while True:
+        frame = json.loads(await asyncio.wait_for(websocket.recv(), timeout))
+        kind = frame.get("type")
+        if kind == "chunk" and ttft is None:
+            ttft = time.perf_counter() - sent_at
+        elif kind == "end":
+            result.replies += 1
+            result.tokens += frame.get("tokens", 0)
+            result.stream_seconds += time.perf_counter() - sent_at - (ttft or 0)
+            return ttft
+        elif kind == "error" or ("error" in frame and kind is None):
+            result.errors.append(frame.get("error", "unknown error"))
+            return None
+
+
+async def run_session(ws_url: str, token: str, messages: int, message: str, timeout: float) -> SessionResult:
+    result = SessionResult()
+    try:
+        started = time.perf_counter()
+        async with websockets.connect(f"{ws_url}/api/chat/ws/{token}", max_size=None) as websocket:
+            result.greeting_ttft = await read_reply(websocket, result, started, timeout)
+            for _ in range(messages):
+                sent_at = time.perf_counter()
+                await websocket.send(json.dumps({"message": message}))
+                ttft = await read_reply(websocket, result, sent_at, timeout)
+                if ttft is not None:
+                    result.ttfts.append(ttft)
+    except Exception as e:
+        result.errors.append(f"{type(e).__name__}: {e}")
+    return result
+
+
+def summarize(results: List[SessionResult], elapsed: float) -> Dict[str, Any]:
+    ttfts = [t for r in results for t in r.ttfts]
+    greetings = [r.greeting_ttft for r in results if r.greeting_ttft is not None]
+    tokens = sum(r.tokens for r in results)
+    stream_seconds = sum(r.stream_seconds for r in results)
+    attempted = sum(r.replies + len(r.errors) for r in results)
+    errors = sum(len(r.errors) for r in results)
+    return {
+        "sessions": len(results),
+        "replies": sum(r.replies for r in results),
+        "errors": errors,
+        "error_rate": errors / attempted if attempted else 0.0,
+        "ttft_p50": percentile(ttfts, 50),
+        "ttft_p95": percentile(ttfts, 95),
+        "ttft_p99": percentile(ttfts, 99),
+        "greeting_ttft_p50": percentile(greetings, 50),
+        "greeting_ttft_p95": percentile(greetings, 95),
+        "tokens": tokens,
+        "tokens_per_second": tokens / elapsed if elapsed else 0.0,
+        "tokens_per_second_per_stream": tokens / stream_seconds if stream_seconds else 0.0,
+        "ttft_mean": statistics.mean(ttfts) if ttfts else None,
+        "elapsed_seconds": elapsed,
+        "sample_errors": sorted({e for r in results for e in r.errors})[:5],
+    }
+
+
+async def run(args) -> Dict[str, Any]:
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as client:
+        semaphore = asyncio.Semaphore(20)
+
+        async def limited_login(index: int) -> str:
+            async with semaphore:
+                return await login(client, index, args.user_prefix)
+
+        tokens = await asyncio.gather(*(limited_login(i) for i in range(args.users)))
+
+    ws_url = args.base_url.replace("http://", "ws://").replace("https://", "wss://")
+    started = time.perf_counter()
+    results = await asyncio.gather(*(
+        run_session(ws_url, token, args.messages, args.message, args.timeout)
+        for token in tokens
+    ))
+    return summarize(results, time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=10, help="Concurrent websocket sessions")
+    parser.add_argument("--messages", type=int, default=3, help="Messages sent per session")
+    parser.add_argument("--message", default="I have been feeling anxious about work lately.")
+    parser.add_argument("--user-prefix", default="loadtest")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Seconds to wait for any frame")
+    parser.add_argument("--max-p95-ttft", type=float, help="Fail if p95 TTFT exceeds this many seconds")
+    parser.add_argument("--max-error-rate", type=float, help="Fail if the error rate exceeds this fraction")
+    args = parser.parse_args()
+
+    summary = asyncio.run(run(args))
+    print(json.dumps(summary, indent=2))
+
+    failed = False
+    if args.max_p95_ttft is not None and (summary["ttft_p95"] is None or summary["ttft_p95"] > args.max_p95_ttft):
+        print(f"FAIL: p95 TTFT {summary['ttft_p95']} > {args.max_p95_ttft}", file=sys.stderr)
+        failed = True
+    if args.max_error_rate is not None and summary["error_rate"] > args.max_error_rate:
+        print(f"FAIL: error rate {summary['error_rate']:.3f} > {args.max_error_rate}", file=sys.stderr)
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,16 @@
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from app.routes import api_router
-from app.database import Base, engine
+from app.database import async_engine
+from app.migrations import check_schema
 from app.middleware import DBLoggingMiddleware, DBSessionMiddleware
-from app.logger import logger
-
-# Create database tables
-Base.metadata.create_all(bind=engine)
+from app.logger import logger, db_logger
+from app.services.ollama import OllamaService
+from app.services.passwords import password_service
+from app.auth.token_versions import token_versions
+from app.services.rate_limiter import rate_limiter
+from app.services.votes import vote_counter
 
 app = FastAPI(
     title="FastAPI Backend",
@@ -35,6 +39,34 @@ app.add_middleware(DBLoggingMiddleware)
 # Include API router
 app.include_router(api_router, prefix="/api")
 
+@app.on_event("startup")
+async def startup_event():
+    # Bring the schema up to date (or refuse to start) before serving anything
+    await run_in_threadpool(check_schema)
+    # Load the token revocation map before accepting requests, then keep it current
+    await token_versions.start()
+    # Periodically write vote counter increments buffered for hot items
+    vote_counter.start()
+    # Start the background writer for database log rows
+    db_logger.start()
+    # Open the shared Ollama connection pool
+    await OllamaService.startup()
+    # Preload chat models and keep them resident
+    await OllamaService.start_keeper()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await OllamaService.shutdown()
+    await token_versions.stop()
+    password_service.shutdown()
+    await rate_limiter.close()
+    # Before disposing the engine, so buffered vote counts are written
+    await vote_counter.stop()
+    # Write any log rows still queued
+    await db_logger.stop()
+    if async_engine is not None:
+        await async_engine.dispose()
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to FastAPI Backend"} 
\ No newline at end of file